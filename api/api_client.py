@@ -1,17 +1,21 @@
 """API 客户端 - 对接后端 API"""
 import os
+import threading
 import time
 import requests
-from typing import Dict
+from collections import OrderedDict
+from typing import Dict, List
 from loguru import logger
 
 # 导入数据模型
 import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
+from backend.json_codec import dumps as json_dumps, loads as json_loads
 from models.data_models import (
     ReportData,
     VerificationData,
+    VerificationMatch,
     TimelineData,
     TimelineItem,
     TimelineEvent,
@@ -22,6 +26,9 @@ from models.data_models import (
 class APIClient:
     """Query Engine API 客户端"""
     
+    # 条件请求缓存最多保留的响应数
+    ETAG_CACHE_SIZE = 64
+    
     def __init__(self, base_url: str = None):
         """
         初始化 API 客户端
@@ -30,14 +37,68 @@ class APIClient:
             base_url: API 服务器地址，默认从环境变量读取或使用 http://localhost:6001
         """
         self.base_url = base_url or os.getenv("QUERY_API_BASE_URL", "http://localhost:6001")
+        # 复用连接；requests 默认发送 Accept-Encoding: gzip, deflate 并自动解压
+        self.session = requests.Session()
+        self._etag_cache: "OrderedDict[str, requests.Response]" = OrderedDict()
+        self._etag_lock = threading.Lock()
         logger.info(f"QueryAPIClient 初始化，连接到: {self.base_url}")
     
-    def get_task_status(self, task_id: str) -> Dict:
+    def _get(self, url: str, params: Dict = None, timeout: float = 10) -> requests.Response:
+        """
+        发送条件 GET 请求
+        
+        自动携带上次响应的 ETag（If-None-Match），服务器返回 304 时直接复用缓存的响应
+        
+        Args:
+            url: 请求地址
+            params: 查询参数
+            timeout: 超时时间（秒）
+            
+        Returns:
+            响应对象
+        """
+        key = requests.Request('GET', url, params=params).prepare().url
+        with self._etag_lock:
+            cached = self._etag_cache.get(key)
+        headers = {'If-None-Match': cached.headers['ETag']} if cached is not None else None
+        
+        response = self.session.get(url, params=params, headers=headers, timeout=timeout)
+        
+        if response.status_code == 304 and cached is not None:
+            with self._etag_lock:
+                if key in self._etag_cache:
+                    self._etag_cache.move_to_end(key)
+            return cached
+        
+        if response.status_code == 200 and response.headers.get('ETag'):
+            with self._etag_lock:
+                self._etag_cache[key] = response
+                self._etag_cache.move_to_end(key)
+                while len(self._etag_cache) > self.ETAG_CACHE_SIZE:
+                    self._etag_cache.popitem(last=False)
+        return response
+    
+    def _post(self, url: str, payload: Dict, timeout: float = 30) -> requests.Response:
+        """发送 JSON POST 请求（使用 json_codec 序列化请求体）"""
+        return self.session.post(
+            url,
+            data=json_dumps(payload),
+            headers={'Content-Type': 'application/json'},
+            timeout=timeout
+        )
+    
+    @staticmethod
+    def _parse_json(response: requests.Response):
+        """解析响应体 JSON（使用 json_codec）"""
+        return json_loads(response.content)
+    
+    def get_task_status(self, task_id: str, fields: str = None) -> Dict:
         """
         获取任务状态
         
         Args:
             task_id: 任务ID
+            fields: 只返回指定字段（如 "task.status,task.progress"），不提供时返回全部
             
         Returns:
             包含任务状态的字典
@@ -45,14 +106,14 @@ class APIClient:
         try:
             url = f"{self.base_url}/api/query/{task_id}/status"
             
-            response = requests.get(url, timeout=10)
+            response = self._get(url, params={'fields': fields} if fields else None, timeout=10)
             
             if response.status_code != 200:
                 error_msg = f"获取状态失败: HTTP {response.status_code}"
                 logger.error(error_msg)
                 raise Exception(error_msg)
             
-            data = response.json()
+            data = self._parse_json(response)
             
             if not data.get('success'):
                 error_msg = data.get('error', '未知错误')
@@ -66,12 +127,13 @@ class APIClient:
             logger.error(error_msg)
             raise Exception(error_msg)
     
-    def get_task_result(self, task_id: str) -> Dict:
+    def get_task_result(self, task_id: str, fields: str = None) -> Dict:
         """
         获取任务结果
         
         Args:
             task_id: 任务ID
+            fields: 只返回指定字段（如 "verification.verdict"），不提供时返回全部
             
         Returns:
             包含任务结果和报告的字典
@@ -82,14 +144,14 @@ class APIClient:
         try:
             url = f"{self.base_url}/api/query/{task_id}"
             
-            response = requests.get(url, timeout=10)
+            response = self._get(url, params={'fields': fields} if fields else None, timeout=10)
             
             if response.status_code != 200:
                 error_msg = f"获取结果失败: HTTP {response.status_code}"
                 logger.error(error_msg)
                 raise Exception(error_msg)
             
-            data = response.json()
+            data = self._parse_json(response)
             
             if not data.get('success'):
                 error_msg = data.get('error', '未知错误')
@@ -121,18 +183,14 @@ class APIClient:
             url = f"{self.base_url}/api/query"
             logger.info(f"创建查询任务: {query}, 模式: {mode}")
             
-            response = requests.post(
-                url,
-                json={"query": query, "mode": mode},
-                timeout=30
-            )
+            response = self._post(url, {"query": query, "mode": mode}, timeout=30)
             
             if response.status_code != 200:
                 error_msg = f"创建任务失败: HTTP {response.status_code}"
                 logger.error(error_msg)
                 raise Exception(error_msg)
             
-            data = response.json()
+            data = self._parse_json(response)
             
             if not data.get('success'):
                 error_msg = data.get('error', '未知错误')
@@ -181,7 +239,8 @@ class APIClient:
             
             # 获取任务状态
             try:
-                task = self.get_task_status(task_id)
+                # 轮询时只取状态相关字段
+                task = self.get_task_status(task_id, fields="task.status,task.progress,task.error_message")
                 status = task.get('status')
                 progress = task.get('progress', 0)
                 
@@ -216,14 +275,19 @@ class APIClient:
                 logger.error(f"等待任务结果时出错: {str(e)}")
                 raise
 
-    def create_verification(self, task_id: str = None, query: str = None, report: str = None) -> VerificationData:
+    def create_verification(self, task_id: str = None, query: str = None, report: str = None,
+                            refresh: bool = False, ensemble: bool = None) -> VerificationData:
         """
         创建判罚任务（同步执行并返回结果）
         
+        同一份报告已经判罚过时服务端直接返回已有结果
+        
         Args:
             task_id: 任务ID（如果提供，则从该任务获取query和report）
             query: 原始查询内容（如果不提供task_id则必须）
             report: 研究报告内容（如果不提供task_id则必须）
+            refresh: 是否忽略已有结果重新判罚
+            ensemble: 是否使用多模型集成判别（None 时由服务端配置决定）
             
         Returns:
             VerificationData 对象
@@ -242,17 +306,21 @@ class APIClient:
                     raise Exception("必须提供 task_id 或 (query + report)")
                 payload['query'] = query
                 payload['report'] = report
+            if refresh:
+                payload['refresh'] = True
+            if ensemble is not None:
+                payload['ensemble'] = ensemble
             
             logger.info(f"创建判罚任务: task_id={task_id}")
             
-            response = requests.post(url, json=payload, timeout=60)
+            response = self._post(url, payload, timeout=60)
             
             if response.status_code != 200:
                 error_msg = f"判罚失败: HTTP {response.status_code}"
                 logger.error(error_msg)
                 raise Exception(error_msg)
             
-            data = response.json()
+            data = self._parse_json(response)
             
             if not data.get('success'):
                 error_msg = data.get('error', '未知错误')
@@ -265,7 +333,9 @@ class APIClient:
             return VerificationData(
                 verdict=result_data.get('verdict', '无法确定'),
                 summary=result_data.get('summary', ''),
-                timestamp=result_data.get('timestamp')
+                timestamp=result_data.get('timestamp'),
+                ensemble=result_data.get('ensemble'),
+                evidence=result_data.get('evidence')
             )
             
         except requests.exceptions.RequestException as e:
@@ -273,12 +343,13 @@ class APIClient:
             logger.error(error_msg)
             raise Exception(error_msg)
     
-    def get_verification_by_task(self, task_id: str) -> VerificationData:
+    def get_verification_by_task(self, task_id: str, fields: str = "verification") -> VerificationData:
         """
         根据任务ID获取判罚结果
         
         Args:
             task_id: 任务ID
+            fields: 只返回指定字段，默认只取判罚结果（不附带任务信息）
             
         Returns:
             VerificationData 对象
@@ -291,14 +362,14 @@ class APIClient:
             
             logger.info(f"获取判罚结果: task_id={task_id}")
             
-            response = requests.get(url, timeout=10)
+            response = self._get(url, params={'fields': fields} if fields else None, timeout=10)
             
             if response.status_code != 200:
                 error_msg = f"获取判罚结果失败: HTTP {response.status_code}"
                 logger.error(error_msg)
                 raise Exception(error_msg)
             
-            data = response.json()
+            data = self._parse_json(response)
             
             if not data.get('success'):
                 error_msg = data.get('error', '未知错误')
@@ -319,6 +390,66 @@ class APIClient:
             logger.error(error_msg)
             raise Exception(error_msg)
 
+    def search_verifications(self, q: str = None, verdict: str = None, start: str = None, end: str = None,
+                             limit: int = 10, min_score: float = None) -> List[VerificationMatch]:
+        """
+        检索已有的判别结果（发起新的查询前可先确认是否已经判别过）
+        
+        Args:
+            q: 检索文本（如新闻内容）
+            verdict: 只返回该结论的结果
+            start: 起始日期（YYYY-MM-DD）
+            end: 结束日期（YYYY-MM-DD）
+            limit: 最多返回的结果数
+            min_score: 最低匹配度（0 到 1）
+            
+        Returns:
+            VerificationMatch 列表（查询完全相同的结果排在最前）
+            
+        Raises:
+            Exception: 如果检索失败
+        """
+        try:
+            url = f"{self.base_url}/api/verification/search"
+            
+            params = {'q': q, 'verdict': verdict, 'start': start, 'end': end, 'limit': limit, 'min_score': min_score}
+            params = {key: value for key, value in params.items() if value is not None}
+            
+            response = self._get(url, params=params, timeout=10)
+            
+            if response.status_code != 200:
+                error_msg = self._extract_error_message(
+                    response,
+                    default=f"检索判别结果失败: HTTP {response.status_code}"
+                )
+                logger.error(error_msg)
+                raise Exception(error_msg)
+            
+            data = self._parse_json(response)
+            
+            if not data.get('success'):
+                error_msg = data.get('error', '未知错误')
+                logger.error(f"检索判别结果失败: {error_msg}")
+                raise Exception(error_msg)
+            
+            return [
+                VerificationMatch(
+                    query=item.get('query', ''),
+                    verdict=item.get('verdict', '无法确定'),
+                    summary=item.get('summary', ''),
+                    timestamp=item.get('timestamp'),
+                    task_id=item.get('task_id'),
+                    score=item.get('score'),
+                    exact=bool(item.get('exact'))
+                )
+                for item in data.get('results', [])
+            ]
+            
+        except requests.exceptions.RequestException as e:
+            error_msg = f"网络请求失败: {str(e)}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+
     def create_timeline(self, task_id: str = None, state_data: Dict = None) -> TimelineData:
         """
         创建时间线（同步执行并返回结果）
@@ -346,7 +477,7 @@ class APIClient:
             
             logger.info(f"创建时间线: task_id={task_id}")
             
-            response = requests.post(url, json=payload, timeout=60)
+            response = self._post(url, payload, timeout=60)
             
             if response.status_code != 200:
                 error_msg = self._extract_error_message(
@@ -356,7 +487,7 @@ class APIClient:
                 logger.error(error_msg)
                 raise Exception(error_msg)
             
-            data = response.json()
+            data = self._parse_json(response)
             
             if not data.get('success'):
                 error_msg = data.get('error', '未知错误')
@@ -371,15 +502,22 @@ class APIClient:
             logger.error(error_msg)
             raise Exception(error_msg)
     
-    def get_timeline_by_task(self, task_id: str) -> TimelineData:
+    def get_timeline_by_task(self, task_id: str, start: str = None, end: str = None, top_k: int = None,
+                             limit: int = None, cursor: str = None, fields: str = None) -> TimelineData:
         """
-        根据任务ID获取时间线
+        根据任务ID获取时间线（可按日期范围过滤并分页）
         
         Args:
             task_id: 任务ID
+            start: 起始日期（YYYY-MM-DD，含）
+            end: 结束日期（YYYY-MM-DD，含）
+            top_k: 每个日期最多保留的搜索结果数
+            limit: 每页最多返回的事件数，不提供时返回全部
+            cursor: 上一页的 next_cursor（沿用其中的过滤条件）
+            fields: 只返回指定字段（如 "timeline.date,timeline.source_count"），未返回的字段取默认值
             
         Returns:
-            TimelineData 对象
+            TimelineData 对象（has_more 为 True 时可用 load_more_timeline 获取后续页）
             
         Raises:
             Exception: 如果获取失败
@@ -387,16 +525,23 @@ class APIClient:
         try:
             url = f"{self.base_url}/api/timeline/query/{task_id}"
             
-            logger.info(f"获取时间线: task_id={task_id}")
+            params = {
+                key: value for key, value in (
+                    ('start', start), ('end', end), ('top_k', top_k), ('limit', limit), ('cursor', cursor),
+                    ('fields', fields)
+                ) if value is not None
+            }
+            
+            logger.info(f"获取时间线: task_id={task_id}, params={params}")
             
-            response = requests.get(url, timeout=10)
+            response = self._get(url, params=params, timeout=10)
             
             if response.status_code != 200:
                 error_msg = f"获取时间线失败: HTTP {response.status_code}"
                 logger.error(error_msg)
                 raise Exception(error_msg)
             
-            data = response.json()
+            data = self._parse_json(response)
             
             if not data.get('success'):
                 error_msg = data.get('error', '未知错误')
@@ -412,6 +557,42 @@ class APIClient:
             raise Exception(error_msg)
     
     
+    def load_more_timeline(self, task_id: str, timeline_data: TimelineData, limit: int = None) -> TimelineData:
+        """
+        获取时间线的下一页并与已有数据合并
+        
+        Args:
+            task_id: 任务ID
+            timeline_data: 已获取的时间线（包含 next_cursor）
+            limit: 本页最多返回的事件数，不提供时沿用上一页的设置
+            
+        Returns:
+            合并后的 TimelineData 对象（没有更多数据时原样返回）
+        """
+        if not timeline_data.has_more or not timeline_data.next_cursor:
+            return timeline_data
+        
+        next_page = self.get_timeline_by_task(task_id, limit=limit, cursor=timeline_data.next_cursor)
+        
+        items = {item.date_key: item for item in timeline_data.timeline}
+        merged = list(timeline_data.timeline)
+        for item in next_page.timeline:
+            existing = items.get(item.date_key)
+            if existing:
+                # 同一日期跨页时，把后续事件接在已有事件之后
+                existing.events.extend(item.events)
+            else:
+                merged.append(item)
+        
+        return TimelineData(
+            timeline=merged,
+            total_sources=next_page.total_sources,
+            date_range=timeline_data.date_range,
+            total_events=next_page.total_events,
+            has_more=next_page.has_more,
+            next_cursor=next_page.next_cursor
+        )
+    
     def _build_timeline_data(self, timeline_dict: Dict) -> TimelineData:
         """
         将时间线字典转换为 TimelineData 对象
@@ -448,16 +629,21 @@ class APIClient:
                 date=item_dict.get('date', ''),
                 date_key=item_dict.get('date_key', ''),
                 events=events,
-                source_count=item_dict.get('source_count', 0)
+                source_count=item_dict.get('source_count', 0),
+                event_count=item_dict.get('event_count')
             ))
         
         return TimelineData(
             timeline=timeline_items,
             total_sources=timeline_dict.get('total_sources', 0),
-            date_range=timeline_dict.get('date_range')
+            date_range=timeline_dict.get('date_range'),
+            total_events=timeline_dict.get('total_events'),
+            has_more=timeline_dict.get('has_more', False),
+            next_cursor=timeline_dict.get('next_cursor')
         )
 
-    def create_mermaid_timeline(self, task_id: str = None, query: str = None, report: str = None) -> str:
+    def create_mermaid_timeline(self, task_id: str = None, query: str = None, report: str = None,
+                                mode: str = None) -> str:
         """
         创建 Mermaid Timeline（同步执行并返回结果）
         
@@ -465,6 +651,7 @@ class APIClient:
             task_id: 任务ID（如果提供，则从该任务获取query和report）
             query: 原始查询内容（如果不提供task_id则必须）
             report: 研究报告内容（如果不提供task_id则必须）
+            mode: "local"（由结构化时间线本地渲染，服务端默认）或 "narrative"（调用 LLM 撰写）
             
         Returns:
             Mermaid Timeline 格式的字符串
@@ -483,10 +670,12 @@ class APIClient:
                     raise Exception("必须提供 task_id 或 (query + report)")
                 payload['query'] = query
                 payload['report'] = report
+            if mode:
+                payload['mode'] = mode
             
-            logger.info(f"创建 Mermaid Timeline: task_id={task_id}")
+            logger.info(f"创建 Mermaid Timeline: task_id={task_id}, mode={mode}")
             
-            response = requests.post(url, json=payload, timeout=60)
+            response = self._post(url, payload, timeout=60)
             
             if response.status_code != 200:
                 error_msg = self._extract_error_message(
@@ -496,7 +685,7 @@ class APIClient:
                 logger.error(error_msg)
                 raise Exception(error_msg)
             
-            data = response.json()
+            data = self._parse_json(response)
             
             if not data.get('success'):
                 error_msg = data.get('error', '未知错误')
@@ -504,6 +693,9 @@ class APIClient:
                 raise Exception(error_msg)
             
             timeline_content = data.get('timeline', '')
+            validation = data.get('validation') or {}
+            if validation.get('repaired'):
+                logger.warning(f"Mermaid Timeline 语法有误，服务端已修复: {validation.get('errors', [])[:3]}")
             logger.info(f"Mermaid Timeline 生成成功，长度: {len(timeline_content)}")
             
             return timeline_content
@@ -519,7 +711,7 @@ class APIClient:
         尝试从响应体中解析错误信息
         """
         try:
-            data = response.json()
+            data = APIClient._parse_json(response)
             return data.get('error', default)
         except ValueError:
             return default
@@ -3,7 +3,7 @@ import time
 from typing import List, Dict
 from models.data_models import (
     HistoryItem, Recommendation, ExternalDiscussion,
-    VerificationData, TimelineData
+    VerificationData, VerificationMatch, TimelineData
 )
 from mock_data.sample_data import (
     MOCK_HISTORY, MOCK_RECOMMENDATIONS, MOCK_REPORT,
@@ -113,12 +113,13 @@ class MockAPI:
         }
     
     @staticmethod
-    def get_task_status(task_id: str) -> Dict:
+    def get_task_status(task_id: str, fields: str = None) -> Dict:
         """
         获取任务状态
         
         Args:
             task_id: 任务ID
+            fields: 只返回指定字段（模拟数据忽略该参数）
             
         Returns:
             任务状态字典
@@ -135,12 +136,13 @@ class MockAPI:
         }
     
     @staticmethod
-    def get_task_result(task_id: str) -> Dict:
+    def get_task_result(task_id: str, fields: str = None) -> Dict:
         """
         获取任务结果
         
         Args:
             task_id: 任务ID
+            fields: 只返回指定字段（模拟数据忽略该参数）
             
         Returns:
             {"success": True, "task": {...}, "report": "...", "verification": {...}}
@@ -166,7 +168,8 @@ class MockAPI:
     # ==================== Verification 任务接口 ====================
     
     @staticmethod
-    def create_verification(query: str = None, report: str = None, task_id: str = None) -> VerificationData:
+    def create_verification(query: str = None, report: str = None, task_id: str = None,
+                            refresh: bool = False, ensemble: bool = None) -> VerificationData:
         """
         创建判罚任务（同步执行并返回结果）
         
@@ -174,6 +177,8 @@ class MockAPI:
             query: 原始查询内容
             report: 研究报告内容
             task_id: 可选的查询任务ID
+            refresh: 是否忽略已有结果重新判罚（模拟数据忽略该参数）
+            ensemble: 是否使用多模型集成判别（模拟数据忽略该参数）
             
         Returns:
             VerificationData 对象
@@ -182,12 +187,13 @@ class MockAPI:
         return MOCK_VERIFICATION
     
     @staticmethod
-    def get_verification_by_task(task_id: str) -> VerificationData:
+    def get_verification_by_task(task_id: str, fields: str = "verification") -> VerificationData:
         """
         根据任务ID获取判罚结果
         
         Args:
             task_id: 任务ID
+            fields: 只返回指定字段（模拟数据忽略该参数）
             
         Returns:
             VerificationData 对象
@@ -195,6 +201,33 @@ class MockAPI:
         time.sleep(0.1)
         return MOCK_VERIFICATION
     
+    @staticmethod
+    def search_verifications(q: str = None, verdict: str = None, start: str = None, end: str = None,
+                             limit: int = 10, min_score: float = None) -> List[VerificationMatch]:
+        """
+        检索已有的判别结果（模拟数据只包含一条判别，过滤参数被忽略）
+        
+        Args:
+            q: 检索文本
+            verdict: 只返回该结论的结果
+            start: 起始日期
+            end: 结束日期
+            limit: 最多返回的结果数
+            min_score: 最低匹配度
+            
+        Returns:
+            VerificationMatch 列表
+        """
+        time.sleep(0.05)
+        return [VerificationMatch(
+            query=q or "",
+            verdict=MOCK_VERIFICATION.verdict,
+            summary=MOCK_VERIFICATION.summary,
+            timestamp=MOCK_VERIFICATION.timestamp,
+            score=1.0 if q else None,
+            exact=bool(q)
+        )][:limit]
+    
     # ==================== Timeline 任务接口 ====================
     
     @staticmethod
@@ -213,12 +246,19 @@ class MockAPI:
         return MOCK_TIMELINE
     
     @staticmethod
-    def get_timeline_by_task(task_id: str) -> TimelineData:
+    def get_timeline_by_task(task_id: str, start: str = None, end: str = None, top_k: int = None,
+                             limit: int = None, cursor: str = None, fields: str = None) -> TimelineData:
         """
-        根据任务ID获取时间线
+        根据任务ID获取时间线（模拟数据不分页，过滤与字段参数被忽略）
         
         Args:
             task_id: 任务ID
+            start: 起始日期
+            end: 结束日期
+            top_k: 每个日期最多保留的搜索结果数
+            limit: 每页最多返回的事件数
+            cursor: 上一页的游标
+            fields: 只返回指定字段
             
         Returns:
             TimelineData 对象
@@ -229,7 +269,7 @@ class MockAPI:
     # ==================== Mermaid Timeline 任务接口 ====================
     
     @staticmethod
-    def create_mermaid_timeline(query: str = None, report: str = None, task_id: str = None) -> str:
+    def create_mermaid_timeline(query: str = None, report: str = None, task_id: str = None, mode: str = None) -> str:
         """
         创建 Mermaid Timeline（同步执行并返回结果）
         
@@ -237,6 +277,7 @@ class MockAPI:
             query: 原始查询内容
             report: 研究报告内容
             task_id: 可选的查询任务ID
+            mode: 生成模式（模拟数据忽略该参数）
             
         Returns:
             Mermaid Timeline 格式的字符串
@@ -3,15 +3,20 @@
 提供 POST 接口接收查询并返回报告
 """
 
+import hashlib
 import os
 import sys
 import threading
 import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
 from loguru import logger
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 
 # 设置UTF-8编码环境
 os.environ['PYTHONIOENCODING'] = 'utf-8'
@@ -32,18 +37,101 @@ from src import DeepSearchAgent as QuickSearchAgent
 from src import TimelineSearchAgent
 
 # 导入判罚服务
-from verification_service import VerificationService, create_verification_service
+from verification_service import (
+    VerificationService,
+    create_verification_service,
+    create_verification_ensemble,
+    parse_ensemble_spec,
+    LONG_REPORT_THRESHOLD
+)
 
 # 导入时间线服务
 from timeline_service import TimelineService, create_timeline_service
+from timeline_index import TimelineIndex, create_timeline_index, parse_date_param, encode_cursor, decode_cursor
+from research_monitor import create_research_monitor
+from incremental_verification import IncrementalVerifier, create_incremental_verifier
+
+# 导入响应字段投影（fields= 参数）
+from field_projection import parse_fields, project
+
+# 导入 Mermaid Timeline 本地渲染
+from mermaid_timeline import render_mermaid_timeline, ensure_valid_mermaid_timeline
+
+# 导入响应压缩与 ETag 条件请求
+from http_cache import install_response_compression, make_etag, is_not_modified, not_modified_response, with_etag
+
+# 导入 JSON 编解码（优先使用 orjson）
+from json_codec import dumps as json_dumps
+from json_provider import install_json_provider
+
+# 导入 LLM 并发限制器（并行的 LLM 调用共享）
+from concurrency import llm_limiter
+
+# 导入陈述级判别缓存
+from claim_cache import get_claim_cache
+
+# 导入判别结果存储（带倒排索引，支持检索已有的判别）
+from verification_store import get_verification_store, DEFAULT_MIN_SCORE, MAX_SEARCH_LIMIT
+from verification_service import KNOWN_VERDICTS, UNKNOWN_VERDICT
+
+# 导入产物日志（判别结果与报告由后台线程批量写入只追加的压缩段文件）
+from artifact_log import ARTIFACT_LEGACY_FILES, artifact_key, get_artifact_log
+
+# 导入证据压缩（下游 LLM 输入超出 token 预算时按 BM25 选取最相关的证据）
+from evidence_compaction import compact_for_prompt
+
+# 导入链接规范化与文章缓存（链接查询按规范化 URL + 正文摘要复用已有结果）
+from url_utils import canonicalize_url, clean_url, is_url_query
+from article_cache import ARTICLE_FETCH_TIMEOUT, get_article_cache
+
+# 导入内存诊断
+from memory_diagnostics import create_memory_diagnostics, estimate_size, get_process_rss, lru_cache_stats
+
+# 导入调用成本统计（统计 LLM 与搜索调用的 token、次数、字节与耗时）
+from usage_tracker import (
+    UsageTracker,
+    bind_context,
+    track_usage,
+    usage_stage,
+    summarize_stages,
+    unattributed_usage,
+    install_instrumentation
+)
+
+install_instrumentation()
+
+# 导入上游请求录制与回放（通过 UPSTREAM_CASSETTE_MODE 启用）
+from upstream_cassette import install_cassettes_from_env, use_cassette, cassette_name_for, rewind_cassette
+
+install_cassettes_from_env()
 
 app = Flask(__name__, static_folder='static')
 CORS(app)  # 允许跨域请求
+install_json_provider(app)  # jsonify 与 request.get_json 使用快速 JSON 编解码
+install_response_compression(app)  # 按 Accept-Encoding 压缩较大的响应
+
+# Mermaid Timeline 生成模式：local 由结构化时间线本地渲染，narrative 调用 LLM 撰写
+MERMAID_TIMELINE_MODES = ("local", "narrative")
+MERMAID_TIMELINE_MODE = os.getenv("MERMAID_TIMELINE_MODE", "local")
 
 # 全局变量：存储任务
 tasks: Dict[str, 'QueryTask'] = {}
 task_lock = threading.Lock()
 
+# 全局变量：判罚结果缓存，按（任务、报告哈希、模型）去重，同一份报告不会重复判罚
+VERIFICATION_CACHE_SIZE = int(os.getenv("VERIFICATION_CACHE_SIZE", "256"))
+verification_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+verification_locks: Dict[str, List[Any]] = {}  # 缓存键 -> [锁, 持有或等待的请求数]
+verification_cache_lock = threading.Lock()
+
+# 全局变量：链接查询的文章抓取在后台进行，不阻塞研究
+article_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="article")
+
+# 全局变量：内存诊断（设置 MEMORY_TRACE=1 时启动即开始追踪）
+memory_diagnostics = create_memory_diagnostics()
+if os.getenv("MEMORY_TRACE", "").lower() in ("1", "true", "yes"):
+    memory_diagnostics.start()
+
 
 def extract_state_data(agent: Any) -> Optional[Dict[str, Any]]:
     """
@@ -78,10 +166,123 @@ def extract_state_data(agent: Any) -> Optional[Dict[str, Any]]:
     return None
 
 
+def get_request_fields(data: Optional[Dict[str, Any]] = None):
+    """
+    读取 fields 参数（查询参数优先，POST 请求也可以放在请求体中）
+    
+    Raises:
+        ValueError: 字段路径无效
+    """
+    value = request.args.get('fields')
+    if value is None and data:
+        value = data.get('fields')
+    return parse_fields(value)
+
+
+def invalid_fields_response(error: ValueError):
+    """fields 参数无效时的响应"""
+    return jsonify({
+        'success': False,
+        'error': str(error)
+    }), 400
+
+
+def verification_model_name() -> str:
+    """判罚使用的模型名称"""
+    return global_settings.QUERY_ENGINE_MODEL_NAME or "deepseek-chat"
+
+
+def verification_ensemble_members() -> List[Tuple[str, str, str]]:
+    """
+    集成判别的成员（VERIFICATION_ENSEMBLE 中已配置 API 密钥的模型）
+    
+    Returns:
+        (provider, model_name, api_key) 列表；deepseek 使用 QUERY_ENGINE_API_KEY，openai 使用 OPENAI_API_KEY
+    """
+    api_keys = {
+        "deepseek": global_settings.QUERY_ENGINE_API_KEY,
+        "openai": os.getenv("OPENAI_API_KEY")
+    }
+    return [
+        (provider, model_name, api_keys[provider])
+        for provider, model_name in parse_ensemble_spec()
+        if api_keys.get(provider)
+    ]
+
+
+def verification_cache_key(task_id: Optional[str], query: str, report: str, model: str) -> str:
+    """判罚结果的缓存键：任务、查询与报告内容的哈希、模型"""
+    digest = hashlib.sha256(f"{query}\0{report}".encode("utf-8")).hexdigest()
+    return f"{task_id or '-'}:{digest}:{model}"
+
+
+def prompt_evidence(query: str, report: str, state_data: Optional[Dict[str, Any]],
+                    purpose: str, max_chars: Optional[int] = None) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    下游 LLM 的输入：报告超出证据预算时压缩为报告摘录与去重后的来源原文
+
+    Args:
+        max_chars: 报告超过该长度（字符）时原样返回，由下游分段处理；判别的长报告需要完整报告才能分段并行判别，
+            压缩后的证据不会超过分段阈值
+    """
+    if max_chars is not None and len(report) > max_chars:
+        return report, None
+    text, stats = compact_for_prompt(query, report, state_data)
+    if stats is not None:
+        logger.info(
+            f"{purpose}输入已压缩: {stats['original_tokens']} -> {stats['tokens']} tokens，"
+            f"{stats['passages']}/{stats['candidates']} 段，来源 {stats['sources']} 个（去重 {stats['duplicates']} 个）"
+        )
+    return text, stats
+
+
+def get_cached_verification(key: str) -> Optional[Dict[str, Any]]:
+    """读取缓存的判罚结果"""
+    with verification_cache_lock:
+        result = verification_cache.get(key)
+        if result is not None:
+            verification_cache.move_to_end(key)
+        return result
+
+
+def cache_verification(key: str, result: Dict[str, Any]):
+    """缓存判罚结果（判罚出错的结果不缓存，下次请求会重新判罚）"""
+    if result.get('error'):
+        return
+    with verification_cache_lock:
+        verification_cache[key] = result
+        verification_cache.move_to_end(key)
+        while len(verification_cache) > VERIFICATION_CACHE_SIZE:
+            verification_cache.popitem(last=False)
+
+
+@contextmanager
+def verification_lock(key: str) -> Iterator[None]:
+    """
+    同一缓存键的判罚串行执行，并发的重复请求等待第一个完成后直接使用其结果
+
+    锁按持有与等待的请求计数，最后一个请求离开时删除（判罚出错不会缓存，锁也不会残留）
+    """
+    with verification_cache_lock:
+        entry = verification_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with verification_cache_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                verification_locks.pop(key, None)
+
+
 class QueryTask:
     """查询任务类"""
     
-    def __init__(self, query: str, task_id: str, mode: str = "deep"):
+    # 每个任务最多缓存的序列化响应数（不同 fields / 分页参数对应不同的表示）
+    SERIALIZED_CACHE_SIZE = 16
+    
+    def __init__(self, query: str, task_id: str, mode: str = "deep", usage: Optional[UsageTracker] = None):
         self.task_id = task_id
         self.query = query
         self.mode = mode  # "deep" 深度思考 或 "quick" 浅度思考
@@ -90,12 +291,20 @@ class QueryTask:
         self.report = None
         self.verification_result = None  # 判罚结果
         self.state_data = None  # 保存状态数据，用于生成时间线
+        self.timeline_index = create_timeline_index()  # 增量时间线索引，研究过程中持续更新
         self.error_message = ""
+        self.usage = usage or UsageTracker()  # LLM 与搜索调用成本统计
         self.created_at = datetime.now()
         self.updated_at = datetime.now()
+        self.version = 0  # 任务内容版本号，任务变化时递增，用于生成 ETag
+        self.serialized_responses: "OrderedDict[str, bytes]" = OrderedDict()  # 已完成任务的响应字节，按 ETag 缓存
+        self.mermaid_timelines: Dict[str, Dict[str, Any]] = {}  # 按生成模式保存的 Mermaid Timeline 及其校验结果
+        self.article_url = None  # 链接查询的规范化 URL
+        self.cached_from = None  # 直接复用已有链接结果时，产生该结果的任务ID
     
     def update_status(self, status: str, progress: int = None, error_message: str = ""):
         """更新任务状态"""
+        self.version += 1
         self.status = status
         if progress is not None:
             self.progress = progress
@@ -116,8 +325,47 @@ class QueryTask:
             'updated_at': self.updated_at.isoformat(),
             'has_result': bool(self.report),
             'has_verification': bool(self.verification_result),
-            'has_timeline': bool(self.state_data)
+            'has_timeline': bool(self.state_data) or len(self.timeline_index) > 0,
+            'cached_from': self.cached_from,
+            'usage': self.usage.to_dict()
+        }
+    
+    def memory_usage(self) -> Dict[str, int]:
+        """估算任务持有的大对象占用的内存（字节）"""
+        usage = {
+            'report': estimate_size(self.report),
+            'verification_result': estimate_size(self.verification_result),
+            'state_data': estimate_size(self.state_data),
+            'timeline_index': estimate_size(self.timeline_index),
+            'serialized_responses': sum(len(body) for body in list(self.serialized_responses.values())),
+            'mermaid_timelines': estimate_size(self.mermaid_timelines)
         }
+        usage['total'] = sum(usage.values())
+        return usage
+
+
+def task_json_response(task: QueryTask, etag: str, build):
+    """
+    构造带 ETag 的任务 JSON 响应
+    
+    已完成任务的内容不再变化，序列化后的字节按 ETag 缓存在任务上，重复请求直接复用
+    
+    Args:
+        task: 查询任务
+        etag: 该表示的 ETag
+        build: 构造响应字典的无参函数
+    """
+    if task.status != "completed":
+        return with_etag(jsonify(build()), etag)
+    
+    body = task.serialized_responses.get(etag)
+    if body is None:
+        body = json_dumps(build())
+        with task_lock:
+            task.serialized_responses[etag] = body
+            while len(task.serialized_responses) > task.SERIALIZED_CACHE_SIZE:
+                task.serialized_responses.popitem(last=False)
+    return with_etag(app.response_class(body, mimetype='application/json'), etag)
 
 
 @app.route('/')
@@ -126,6 +374,69 @@ def index():
     return send_from_directory('static', 'query_frontend.html')
 
 
+def cached_url_task(url: str, query: str) -> Optional[QueryTask]:
+    """
+    链接对应的文章（按缓存中的正文摘要）已有研究与判别结果时，创建一个直接完成的任务
+    
+    Args:
+        url: 规范化 URL（缓存键）
+        query: 任务的查询内容（去掉跟踪参数后的链接）
+        
+    Returns:
+        已完成的任务；文章未缓存（或已过期）、没有结果时返回 None
+    """
+    cache = get_article_cache()
+    article = cache.get_article(url) if cache else None
+    entry = cache.get_result(url, article.content_hash) if article else None
+    if entry is None:
+        return None
+    
+    task_id = f"query_{int(time.time())}_{uuid.uuid4().hex[:6]}"
+    task = QueryTask(query, task_id, mode=entry.get('mode') or "quick")
+    task.article_url = url
+    task.cached_from = entry.get('task_id')
+    task.report = entry.get('report')
+    task.verification_result = entry.get('verification')
+    task.state_data = entry.get('state_data')
+    if task.state_data:
+        task.timeline_index.ingest_state(task.state_data)
+    task.update_status("completed", 100)
+    
+    with task_lock:
+        tasks[task_id] = task
+    logger.info(f"链接 {url} 的文章未变化，复用任务 {task.cached_from} 的结果: {task_id}")
+    return task
+
+
+def start_article_fetch(task: QueryTask) -> Optional[Future]:
+    """链接查询在后台抓取（或从缓存读取）文章，用于计算正文摘要；抓取任务的查询链接，按规范化 URL 缓存"""
+    cache = get_article_cache()
+    if not task.article_url or cache is None:
+        return None
+    return article_executor.submit(bind_context(cache.article), task.article_url, task.query)
+
+
+def remember_url_result(task: QueryTask, article_fetch: Optional[Future]):
+    """以规范化 URL + 正文摘要为键保存链接查询的结果（判别失败或无法获取文章时不保存）"""
+    verification = task.verification_result or {}
+    if article_fetch is None or not task.report or not verification or verification.get('error'):
+        return
+    try:
+        article = article_fetch.result(timeout=ARTICLE_FETCH_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"等待文章抓取失败，不保存链接结果: {str(e)}")
+        return
+    if article is None:
+        return
+    get_article_cache().put_result(task.article_url, article.content_hash, {
+        'mode': task.mode,
+        'report': task.report,
+        'verification': verification,
+        'state_data': task.state_data
+    }, task_id=task.task_id)
+    logger.info(f"已保存链接结果: {task.article_url}（正文摘要 {article.content_hash[:12]}）")
+
+
 def determine_query_mode(query: str) -> str:
     """
     使用 LLM 判断查询应该使用深度思考还是浅度思考模式
@@ -202,6 +513,39 @@ def determine_query_mode(query: str) -> str:
 
 def run_query_task(task: QueryTask, query_text: str):
     """在后台线程中运行查询任务"""
+    # 任务内的 LLM 与搜索调用都计入该任务，默认归入 research 阶段
+    # 启用 cassette 时，同一查询的上游请求录制到（或回放自）同一个文件
+    with track_usage(task.usage, "research"), use_cassette(cassette_name_for(query_text)):
+        _run_query_task(task, query_text)
+
+
+def run_agent_research(task: QueryTask, agent: Any, query_text: str,
+                       verifier: Optional[IncrementalVerifier] = None) -> str:
+    """
+    执行 Agent 研究，同时在后台把新产生的搜索结果同步到任务的时间线索引，
+    并把已完成的段落交给增量判别器（如果提供）
+    """
+    monitor = create_research_monitor(lambda: extract_state_data(agent), task.timeline_index, verifier=verifier)
+    artifact_log = get_artifact_log()
+    try:
+        # 启用产物日志时报告写入日志，Agent 不再逐个保存报告文件（ARTIFACT_LEGACY_FILES=1 时仍然保存）
+        report = agent.research(query_text, save_report=artifact_log is None or ARTIFACT_LEGACY_FILES)
+    finally:
+        monitor.stop()
+    if artifact_log is not None:
+        artifact_log.append("report", artifact_key("report", query_text), {
+            "task_id": task.task_id,
+            "mode": task.mode,
+            "query": query_text,
+            "report": report,
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        })
+    return report
+
+
+def _run_query_task(task: QueryTask, query_text: str):
+    """执行查询任务的具体流程"""
+    verifier = None
     try:
         task.update_status("running", 10)
         
@@ -212,6 +556,24 @@ def run_query_task(task: QueryTask, query_text: str):
         
         report = None
         
+        # 链接查询：研究的同时在后台获取文章，完成后按正文摘要保存结果
+        article_fetch = start_article_fetch(task)
+        
+        # 判别服务在研究开始前创建，研究过程中即可逐段判别已完成的段落
+        verification_service = None
+        if global_settings.QUERY_ENGINE_API_KEY:
+            try:
+                verification_service = create_verification_service(
+                    api_key=global_settings.QUERY_ENGINE_API_KEY,
+                    provider="deepseek",
+                    model_name=verification_model_name(),
+                    output_dir="query_engine_streamlit_reports"
+                )
+                with usage_stage("verification"):
+                    verifier = create_incremental_verifier(verification_service, query_text)
+            except Exception as e:
+                logger.warning(f"创建判别服务失败，将在报告完成后重试: {str(e)}")
+        
         if task.mode == "deep":
             # 深度思考模式 - 使用 QueryEngine
             if not global_settings.QUERY_ENGINE_API_KEY:
@@ -238,13 +600,14 @@ def run_query_task(task: QueryTask, query_text: str):
             
             logger.info("正在生成报告...")
             task.update_status("running", 30)
-            report = agent.research(query_text, save_report=True)
+            report = run_agent_research(task, agent, query_text, verifier)
             
             # 保存状态数据用于生成时间线
             try:
                 state_dict = extract_state_data(agent)
                 if state_dict:
                     task.state_data = state_dict
+                    task.timeline_index.ingest_state(state_dict)
                     paragraphs_num = len(state_dict.get('paragraphs', [])) if isinstance(state_dict, dict) else 0
                     logger.info(f"深度模式：状态数据已保存，paragraphs数量: {paragraphs_num}")
                 else:
@@ -292,13 +655,14 @@ def run_query_task(task: QueryTask, query_text: str):
             
             logger.info("正在生成报告...")
             task.update_status("running", 30)
-            report = agent.research(query_text, save_report=True)
+            report = run_agent_research(task, agent, query_text, verifier)
             
             # 保存状态数据用于生成时间线（如果存在）
             try:
                 state_dict = extract_state_data(agent)
                 if state_dict:
                     task.state_data = state_dict
+                    task.timeline_index.ingest_state(state_dict)
                     paragraphs_num = len(state_dict.get('paragraphs', [])) if isinstance(state_dict, dict) else 0
                     logger.info(f"浅度模式：状态数据已保存，paragraphs数量: {paragraphs_num}")
                 else:
@@ -316,22 +680,43 @@ def run_query_task(task: QueryTask, query_text: str):
         logger.info("正在进行新闻真假判别...")
         try:
             # 创建判罚服务
-            verification_service = create_verification_service(
-                api_key=global_settings.QUERY_ENGINE_API_KEY,
-                provider="deepseek",
-                model_name=global_settings.QUERY_ENGINE_MODEL_NAME or "deepseek-chat",
-                output_dir="query_engine_streamlit_reports"
-            )
+            if verification_service is None:
+                verification_service = create_verification_service(
+                    api_key=global_settings.QUERY_ENGINE_API_KEY,
+                    provider="deepseek",
+                    model_name=verification_model_name(),
+                    output_dir="query_engine_streamlit_reports"
+                )
             
-            # 执行判罚
-            verification_result = verification_service.verify_news(
-                query=query_text,
-                final_report=report,
-                save_result=True,
-                output_dir="query_engine_streamlit_reports"
-            )
+            # 执行判罚：增量判别时只需汇总研究过程中已完成的段落判别
+            with usage_stage("verification"):
+                if verifier is not None:
+                    verification_result = verifier.finalize(
+                        task.state_data,
+                        report,
+                        save_result=True,
+                        output_dir="query_engine_streamlit_reports",
+                        task_id=task.task_id
+                    )
+                else:
+                    evidence, evidence_stats = prompt_evidence(
+                        query_text, report, task.state_data, "判罚", max_chars=LONG_REPORT_THRESHOLD
+                    )
+                    verification_result = verification_service.verify_news(
+                        query=query_text,
+                        final_report=evidence,
+                        save_result=True,
+                        output_dir="query_engine_streamlit_reports",
+                        task_id=task.task_id
+                    )
+                    if evidence_stats is not None:
+                        verification_result['evidence'] = evidence_stats
             
             task.verification_result = verification_result
+            cache_verification(
+                verification_cache_key(task.task_id, query_text, report, verification_model_name()),
+                verification_result
+            )
             logger.info(f"判罚完成: {verification_result.get('verdict', '未知')}")
             
         except Exception as e:
@@ -343,6 +728,7 @@ def run_query_task(task: QueryTask, query_text: str):
                 "error": str(e)
             }
         
+        remember_url_result(task, article_fetch)
         task.update_status("completed", 100)
         logger.info("任务完成")
         
@@ -351,6 +737,10 @@ def run_query_task(task: QueryTask, query_text: str):
         error_traceback = traceback.format_exc()
         logger.error(f"查询任务执行失败: {str(e)}\n{error_traceback}")
         task.update_status("error", 0, str(e))
+    finally:
+        # 提前返回（配置缺失）或研究出错时也要释放增量判别的后台线程
+        if verifier is not None:
+            verifier.close()
 
 
 @app.route('/api/query', methods=['POST'])
@@ -361,11 +751,15 @@ def create_query():
     请求格式:
     {
         "query": "你的问题",
-        "mode": "deep" | "quick" | "auto"  // 可选，默认为 "auto"（自动判断）
-                                          // "auto" 表示使用 LLM 自动判断使用深度还是浅度思考
-                                          // 只有明确指定 "deep" 或 "quick" 时才使用指定模式
+        "mode": "deep" | "quick" | "auto",  // 可选，默认为 "auto"（自动判断）
+                                           // "auto" 表示使用 LLM 自动判断使用深度还是浅度思考
+                                           // 只有明确指定 "deep" 或 "quick" 时才使用指定模式
+        "refresh": false  // 可选，为 true 时链接查询不复用已有结果
     }
     
+    查询内容是链接时先规范化（去掉跟踪参数、展开已知的跳转链接），同一篇文章（正文未变化）已有结果时
+    直接返回已完成的任务（task.cached_from 为产生该结果的任务）
+    
     返回格式:
     {
         "success": true,
@@ -390,24 +784,52 @@ def create_query():
                 'error': '查询内容不能为空'
             }), 400
         
+        # 链接查询在展开跳转、去掉跟踪参数后的链接上研究（规范化 URL 只作缓存键，不一定能访问），
+        # 同一篇文章已有结果时直接返回
+        article_url = None
+        if is_url_query(query_text):
+            fetch_url = clean_url(query_text)
+            if fetch_url != query_text:
+                logger.info(f"链接已清理: {query_text} -> {fetch_url}")
+            query_text = fetch_url
+            article_url = canonicalize_url(fetch_url)
+            cached_task = None if data.get('refresh') else cached_url_task(article_url, query_text)
+            if cached_task is not None:
+                return jsonify({
+                    'success': True,
+                    'task_id': cached_task.task_id,
+                    'message': '该链接已有研究结果',
+                    'task': cached_task.to_dict()
+                })
+        
         # 获取思考模式，默认为自动判断
         mode = data.get('mode', 'auto').lower()
         
+        # 模式判断的 LLM 调用也计入该任务
+        usage = UsageTracker()
+        
+        # 回放模式下，同一查询再次执行时从头回放
+        rewind_cassette(cassette_name_for(query_text))
+        
         # 如果模式是 "auto"，使用 LLM 自动判断
         if mode == 'auto':
             logger.info(f"收到查询请求: {query_text}, 模式: auto (将自动判断)")
-            mode = determine_query_mode(query_text)
+            with track_usage(usage, "mode_detection"), use_cassette(cassette_name_for(query_text)):
+                mode = determine_query_mode(query_text)
             logger.info(f"自动判断结果: {mode}")
         elif mode not in ['deep', 'quick']:
             # 如果提供了无效的模式，默认使用自动判断
             logger.warning(f"无效的模式: {mode}，使用自动判断")
-            mode = determine_query_mode(query_text)
+            with track_usage(usage, "mode_detection"), use_cassette(cassette_name_for(query_text)):
+                mode = determine_query_mode(query_text)
         
         logger.info(f"收到查询请求: {query_text}, 最终模式: {mode}")
         
         # 创建新任务
-        task_id = f"query_{int(time.time())}"
-        task = QueryTask(query_text, task_id, mode=mode)
+        # 同一秒内可能创建多个任务，追加随机后缀避免任务ID冲突
+        task_id = f"query_{int(time.time())}_{uuid.uuid4().hex[:6]}"
+        task = QueryTask(query_text, task_id, mode=mode, usage=usage)
+        task.article_url = article_url
         
         with task_lock:
             tasks[task_id] = task
@@ -443,6 +865,9 @@ def get_query_result(task_id: str):
     """
     获取查询结果
     
+    查询参数:
+        fields: 只返回指定字段（可选），如 task.status,verification.verdict
+    
     返回格式:
     {
         "success": true,
@@ -451,6 +876,11 @@ def get_query_result(task_id: str):
     }
     """
     try:
+        try:
+            fields = get_request_fields()
+        except ValueError as e:
+            return invalid_fields_response(e)
+        
         with task_lock:
             task = tasks.get(task_id)
         
@@ -474,13 +904,17 @@ def get_query_result(task_id: str):
                 'task': task.to_dict()
             }), 500
         
-        # 任务完成，返回结果
-        return jsonify({
+        etag = make_etag(task.task_id, "result", task.version, task.usage.version)
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+        
+        # 任务完成，返回结果（未请求的字段不会被计算和序列化）
+        return task_json_response(task, etag, lambda: project({
             'success': True,
-            'task': task.to_dict(),
-            'report': task.report,
-            'verification': task.verification_result
-        })
+            'task': task.to_dict,
+            'report': lambda: task.report,
+            'verification': lambda: task.verification_result
+        }, fields))
         
     except Exception as e:
         logger.exception(f"获取查询结果失败: {str(e)}")
@@ -495,6 +929,9 @@ def get_query_status(task_id: str):
     """
     获取查询任务状态
     
+    查询参数:
+        fields: 只返回指定字段（可选），如 task.status,task.progress
+    
     返回格式:
     {
         "success": true,
@@ -502,6 +939,11 @@ def get_query_status(task_id: str):
     }
     """
     try:
+        try:
+            fields = get_request_fields()
+        except ValueError as e:
+            return invalid_fields_response(e)
+        
         with task_lock:
             task = tasks.get(task_id)
         
@@ -511,10 +953,15 @@ def get_query_status(task_id: str):
                 'error': '任务不存在'
             }), 404
         
-        return jsonify({
+        # 任务未变化时返回 304
+        etag = make_etag(task.task_id, "status", task.version, task.usage.version)
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+        
+        return task_json_response(task, etag, lambda: project({
             'success': True,
-            'task': task.to_dict()
-        })
+            'task': task.to_dict
+        }, fields))
         
     except Exception as e:
         logger.exception(f"获取查询任务状态失败: {str(e)}")
@@ -533,15 +980,24 @@ def create_verification():
     {
         "query": "原始查询/新闻内容",
         "report": "研究报告内容（可选，如果不提供则需要提供task_id）",
-        "task_id": "任务ID（可选，如果不提供report则需要提供task_id）"
+        "task_id": "任务ID（可选，如果不提供report则需要提供task_id）",
+        "fields": "verification.verdict",  // 可选，只返回指定字段（也可作为查询参数）
+        "refresh": false,  // 可选，为 true 时忽略已有结果重新判罚
+        "ensemble": true  // 可选，是否使用多模型集成判别；默认在 VERIFICATION_ENSEMBLE 配置了至少两个模型时使用
     }
     
+    报告超出 EVIDENCE_TOKEN_BUDGET 时，判别输入为按查询选取的报告摘录与任务中去重后的来源原文，
+    verification.evidence 给出压缩前后的 token 数；超过 VERIFICATION_LONG_REPORT_CHARS 的长报告不压缩，分段并行判别
+    
+    同一（任务、报告、模型）只判罚一次：任务流水线已经判罚过或缓存中已有结果时直接返回
+    集成判别并发调用多个模型，达到法定数量的模型结论一致时立即返回，verification.ensemble 给出各模型的结论
+    
     返回格式:
     {
         "success": true,
-        "verification_id": "verification_1234567890",
-        "message": "判罚任务已创建",
-        "verification": {...}
+        "message": "判罚完成",
+        "verification": {...},
+        "cached": false
     }
     """
     try:
@@ -552,14 +1008,37 @@ def create_verification():
                 'error': '请提供请求数据'
             }), 400
         
+        try:
+            fields = get_request_fields(data)
+        except ValueError as e:
+            return invalid_fields_response(e)
+        
         query = data.get('query', '').strip()
         report = data.get('report', '').strip()
         task_id = data.get('task_id', '').strip()
+        refresh = bool(data.get('refresh'))
         
-        # 如果没有提供report，尝试从task_id获取
-        if not report and task_id:
+        ensemble_members = verification_ensemble_members()
+        use_ensemble = data.get('ensemble')
+        if use_ensemble is None:
+            use_ensemble = len(ensemble_members) >= 2
+        elif use_ensemble and len(ensemble_members) < 2:
+            return jsonify({
+                'success': False,
+                'error': '集成判别需要在 VERIFICATION_ENSEMBLE 中配置至少两个已设置 API 密钥的模型'
+            }), 400
+        model_name = (
+            "ensemble:" + ",".join(f"{provider}:{model}" for provider, model, _ in ensemble_members)
+            if use_ensemble else verification_model_name()
+        )
+        
+        task = None
+        if task_id:
             with task_lock:
                 task = tasks.get(task_id)
+        
+        # 如果没有提供report，尝试从task_id获取
+        if not report and task_id:
             if task and task.report:
                 report = task.report
                 if not query:
@@ -585,6 +1064,32 @@ def create_verification():
         
         logger.info(f"收到独立判罚请求: query={query[:50]}..., report_length={len(report)}")
         
+        cache_key = verification_cache_key(task.task_id if task else None, query, report, model_name)
+        
+        def cached_response():
+            """已有判罚结果时直接返回"""
+            if refresh:
+                return None
+            verification_result = get_cached_verification(cache_key)
+            if (verification_result is None and not use_ensemble and task and task.verification_result
+                    and not task.verification_result.get('error')
+                    and report == task.report and query == task.query):
+                # 任务流水线中已经判罚过同一份报告
+                verification_result = task.verification_result
+            if verification_result is None:
+                return None
+            logger.info(f"复用已有的判罚结果: {verification_result.get('verdict', '未知')}")
+            return jsonify(project({
+                'success': True,
+                'verification': verification_result,
+                'message': '判罚完成',
+                'cached': True
+            }, fields))
+        
+        response = cached_response()
+        if response is not None:
+            return response
+        
         # 检查必要的配置
         if not global_settings.QUERY_ENGINE_API_KEY:
             return jsonify({
@@ -592,30 +1097,51 @@ def create_verification():
                 'error': '请在环境变量中设置 QUERY_ENGINE_API_KEY'
             }), 500
         
-        # 创建判罚服务并立即执行
+        # 创建判罚服务（或多模型集成）并立即执行
         try:
-            verification_service = create_verification_service(
-                api_key=global_settings.QUERY_ENGINE_API_KEY,
-                provider="deepseek",
-                model_name=global_settings.QUERY_ENGINE_MODEL_NAME or "deepseek-chat",
-                output_dir="query_engine_streamlit_reports"
-            )
+            if use_ensemble:
+                verification_service = create_verification_ensemble(
+                    ensemble_members,
+                    output_dir="query_engine_streamlit_reports"
+                )
+            else:
+                verification_service = create_verification_service(
+                    api_key=global_settings.QUERY_ENGINE_API_KEY,
+                    provider="deepseek",
+                    model_name=verification_model_name(),
+                    output_dir="query_engine_streamlit_reports"
+                )
             
-            # 执行判罚
-            verification_result = verification_service.verify_news(
-                query=query,
-                final_report=report,
-                save_result=True,
-                output_dir="query_engine_streamlit_reports"
-            )
+            with verification_lock(cache_key):
+                # 等待期间其他请求可能已经完成了同一判罚
+                response = cached_response()
+                if response is not None:
+                    return response
+                
+                # 执行判罚（关联任务时计入该任务的调用成本；报告过长时先压缩证据）
+                evidence, evidence_stats = prompt_evidence(
+                    query, report, task.state_data if task else None, "判罚", max_chars=LONG_REPORT_THRESHOLD
+                )
+                with track_usage(task.usage if task else None, "verification"), use_cassette(cassette_name_for(query)):
+                    verification_result = verification_service.verify_news(
+                        query=query,
+                        final_report=evidence,
+                        save_result=True,
+                        output_dir="query_engine_streamlit_reports",
+                        task_id=task.task_id if task else None
+                    )
+                if evidence_stats is not None:
+                    verification_result['evidence'] = evidence_stats
+                cache_verification(cache_key, verification_result)
             
             logger.info(f"判罚完成: {verification_result.get('verdict', '未知')}")
             
-            return jsonify({
+            return jsonify(project({
                 'success': True,
                 'verification': verification_result,
-                'message': '判罚完成'
-            })
+                'message': '判罚完成',
+                'cached': False
+            }, fields))
             
         except Exception as e:
             logger.error(f"判罚过程出错: {str(e)}")
@@ -644,11 +1170,98 @@ def create_verification():
         }), 500
 
 
+def parse_verification_search_args(args) -> Dict[str, Any]:
+    """
+    解析判别结果检索参数
+    
+    Raises:
+        ValueError: 参数无效
+    """
+    search_args = {
+        'text': args.get('q', '').strip() or None,
+        'verdict': args.get('verdict', '').strip() or None,
+        'start': parse_date_param(args.get('start')),
+        'end': parse_date_param(args.get('end')),
+        'limit': args.get('limit', 10, type=int),
+        'min_score': args.get('min_score', DEFAULT_MIN_SCORE, type=float)
+    }
+    if search_args['verdict'] and search_args['verdict'] not in KNOWN_VERDICTS + (UNKNOWN_VERDICT,):
+        raise ValueError(f"verdict 必须为 {'、'.join(KNOWN_VERDICTS + (UNKNOWN_VERDICT,))} 之一")
+    if not isinstance(search_args['limit'], int) or not 1 <= search_args['limit'] <= MAX_SEARCH_LIMIT:
+        raise ValueError(f'limit 必须为 1 到 {MAX_SEARCH_LIMIT} 之间的整数')
+    if not isinstance(search_args['min_score'], float) or not 0 <= search_args['min_score'] <= 1:
+        raise ValueError('min_score 必须为 0 到 1 之间的数')
+    if search_args['start'] and search_args['end'] and search_args['start'] > search_args['end']:
+        raise ValueError('start 不能晚于 end')
+    return search_args
+
+
+@app.route('/api/verification/search', methods=['GET'])
+def search_verifications():
+    """
+    检索已有的判别结果（回答“这条新闻是否已经判别过”）
+    
+    查询参数:
+        q: 检索文本（如新闻内容；为空时按时间倒序列出）
+        verdict: 只返回该结论的结果（真/假/部分真实/无法确定）
+        start / end: 判别日期范围（YYYY-MM-DD，含）
+        limit: 最多返回的结果数（默认 10，最多 100）
+        min_score: 最低匹配度（命中的检索词占比，默认 0.5）
+        fields: 只返回指定字段（可选），如 results.query,results.verdict
+    
+    返回格式:
+    {
+        "success": true,
+        "results": [{"id": 1, "task_id": "...", "query": "...", "verdict": "真", "summary": "...",
+                     "timestamp": "...", "score": 0.92, "exact": false}],
+        "count": 1,
+        "took_ms": 1.2
+    }
+    """
+    try:
+        try:
+            search_args = parse_verification_search_args(request.args)
+            fields = get_request_fields()
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        store = get_verification_store()
+        if store is None:
+            return jsonify({
+                'success': False,
+                'error': '判别结果存储未启用（VERIFICATION_STORE_PATH 为空）'
+            }), 503
+        
+        started = time.perf_counter()
+        results = store.search(**search_args)
+        took_ms = round((time.perf_counter() - started) * 1000, 2)
+        
+        return jsonify(project({
+            'success': True,
+            'results': results,
+            'count': len(results),
+            'took_ms': took_ms
+        }, fields))
+        
+    except Exception as e:
+        logger.exception(f"检索判别结果失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @app.route('/api/verification/query/<task_id>', methods=['GET'])
 def get_verification_by_task(task_id: str):
     """
     根据任务ID获取判罚结果
     
+    查询参数:
+        fields: 只返回指定字段（可选），如 verification.verdict
+    
     返回格式:
     {
         "success": true,
@@ -656,6 +1269,11 @@ def get_verification_by_task(task_id: str):
     }
     """
     try:
+        try:
+            fields = get_request_fields()
+        except ValueError as e:
+            return invalid_fields_response(e)
+        
         with task_lock:
             task = tasks.get(task_id)
         
@@ -671,11 +1289,15 @@ def get_verification_by_task(task_id: str):
                 'error': '该任务还没有判罚结果'
             }), 404
         
-        return jsonify({
+        etag = make_etag(task.task_id, "verification", task.version, task.usage.version)
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+        
+        return task_json_response(task, etag, lambda: project({
             'success': True,
-            'verification': task.verification_result,
-            'task': task.to_dict()
-        })
+            'verification': lambda: task.verification_result,
+            'task': task.to_dict
+        }, fields))
         
     except Exception as e:
         logger.exception(f"获取判罚结果失败: {str(e)}")
@@ -685,6 +1307,46 @@ def get_verification_by_task(task_id: str):
         }), 500
 
 
+def task_timeline_snapshot(task: QueryTask) -> Dict[str, Any]:
+    """获取任务当前的时间线快照（任务未完成时标记为 live）"""
+    if task.state_data:
+        # 已经处理过的搜索结果不会重复加入
+        task.timeline_index.ingest_state(task.state_data)
+    return {
+        **task.timeline_index.snapshot(),
+        'live': task.status in ("pending", "running")
+    }
+
+
+def parse_timeline_page_args(args) -> Dict[str, Any]:
+    """
+    解析时间线分页参数（提供 cursor 时沿用游标中的过滤条件）
+    
+    Raises:
+        ValueError: 参数无效
+    """
+    cursor = args.get('cursor', '').strip()
+    if cursor:
+        state = decode_cursor(cursor)
+    else:
+        state = {
+            'offset': 0,
+            'start': parse_date_param(args.get('start')),
+            'end': parse_date_param(args.get('end')),
+            'top_k': args.get('top_k', type=int),
+            'limit': None
+        }
+    if 'limit' in args:
+        state['limit'] = args.get('limit', type=int)
+    
+    for name in ('top_k', 'limit'):
+        if state.get(name) is not None and (not isinstance(state[name], int) or state[name] < 1):
+            raise ValueError(f'{name} 必须为正整数')
+    if state.get('start') and state.get('end') and state['start'] > state['end']:
+        raise ValueError('start 不能晚于 end')
+    return state
+
+
 @app.route('/api/timeline/generate', methods=['POST'])
 def generate_timeline():
     """
@@ -693,7 +1355,8 @@ def generate_timeline():
     请求格式:
     {
         "task_id": "任务ID"  // 可选，如果不提供则需要提供state_data
-        "state_data": {...}  // 可选，状态数据
+        "state_data": {...},  // 可选，状态数据
+        "fields": "timeline.date,timeline.source_count"  // 可选，只返回指定字段（也可作为查询参数）
     }
     
     返回格式:
@@ -712,20 +1375,28 @@ def generate_timeline():
                 'error': '请提供请求数据'
             }), 400
         
+        try:
+            fields = get_request_fields(data)
+        except ValueError as e:
+            return invalid_fields_response(e)
+        
         task_id = data.get('task_id', '').strip()
         state_data = data.get('state_data')
         
-        # 如果没有提供state_data，尝试从task_id获取
+        # 如果没有提供state_data，直接使用任务的增量时间线索引
         if not state_data and task_id:
             with task_lock:
                 task = tasks.get(task_id)
-            if task and task.state_data:
-                state_data = task.state_data
-            else:
-                return jsonify({
-                    'success': False,
-                    'error': f'任务 {task_id} 不存在或没有状态数据'
-                }), 404
+            if task and (task.state_data or len(task.timeline_index)):
+                return jsonify(project({
+                    'success': True,
+                    'task_status': task.status,
+                    **task_timeline_snapshot(task)
+                }, fields))
+            return jsonify({
+                'success': False,
+                'error': f'任务 {task_id} 不存在或没有状态数据'
+            }), 404
         
         if not state_data:
             return jsonify({
@@ -746,10 +1417,10 @@ def generate_timeline():
                 'timeline': timeline_result
             }), 500
         
-        return jsonify({
+        return jsonify(project({
             'success': True,
             **timeline_result
-        })
+        }, fields))
         
     except Exception as e:
         import traceback
@@ -767,13 +1438,33 @@ def get_timeline_by_task(task_id: str):
     """
     根据任务ID获取时间线
     
+    查询参数（均为可选）:
+        start / end: 日期范围（YYYY-MM-DD，含两端；指定时不包含未知日期）
+        top_k: 每个日期最多保留的搜索结果数（按相关度）
+        limit: 每页最多返回的事件数
+        cursor: 上一页返回的 next_cursor（沿用其中的过滤条件）
+        fields: 只返回指定字段，如 timeline.date,timeline.source_count,total_events
+    
     返回格式:
     {
         "success": true,
-        "timeline": [...]
+        "timeline": [...],
+        "total_events": 120,
+        "total_days": 30,
+        "has_more": true,
+        "next_cursor": "..."
     }
     """
     try:
+        try:
+            page_args = parse_timeline_page_args(request.args)
+            fields = get_request_fields()
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
         logger.info(f"收到时间线请求，task_id: {task_id}")
         
         with task_lock:
@@ -790,7 +1481,7 @@ def get_timeline_by_task(task_id: str):
         
         logger.info(f"任务状态: status={task.status}, has_state_data={bool(task.state_data)}, has_report={bool(task.report)}")
         
-        if not task.state_data:
+        if not task.state_data and not len(task.timeline_index):
             logger.warning(f"任务没有状态数据: {task_id}, status={task.status}")
             return jsonify({
                 'success': False,
@@ -799,20 +1490,33 @@ def get_timeline_by_task(task_id: str):
                 'has_report': bool(task.report)
             }), 404
         
-        # 生成时间线
-        timeline_service = create_timeline_service()
-        timeline_result = timeline_service.generate_timeline(task.state_data)
+        # 时间线由增量索引维护，研究进行中返回当前已有的部分
+        if task.state_data:
+            task.timeline_index.ingest_state(task.state_data)
+        
+        # 时间线与任务状态都未变化时返回 304
+        etag = make_etag(task.task_id, "timeline", task.version, task.timeline_index.version)
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+        
+        def build_page():
+            page = task.timeline_index.page(
+                start=page_args['start'],
+                end=page_args['end'],
+                top_k=page_args['top_k'],
+                offset=page_args['offset'],
+                limit=page_args['limit']
+            )
+            next_offset = page.pop('next_offset')
+            page['next_cursor'] = encode_cursor({**page_args, 'offset': next_offset}) if next_offset is not None else None
+            return project({
+                'success': True,
+                'task_status': task.status,
+                'live': task.status in ("pending", "running"),
+                **page
+            }, fields)
         
-        if timeline_result.get("error"):
-            return jsonify({
-                'success': False,
-                'error': timeline_result.get("error")
-            }), 500
-        
-        return jsonify({
-            'success': True,
-            **timeline_result
-        })
+        return task_json_response(task, etag, build_page)
         
     except Exception as e:
         logger.exception(f"获取时间线失败: {str(e)}")
@@ -822,24 +1526,64 @@ def get_timeline_by_task(task_id: str):
         }), 500
 
 
+def stored_mermaid_timeline(task: Optional[QueryTask], mode: str, source_key: str) -> Optional[Dict[str, Any]]:
+    """任务上已保存的、由相同输入生成的 Mermaid Timeline"""
+    if task is None:
+        return None
+    stored = task.mermaid_timelines.get(mode)
+    if stored and stored['source_key'] == source_key:
+        logger.info(f"复用已保存的 Mermaid Timeline: task_id={task.task_id}, mode={mode}")
+        return stored
+    return None
+
+
+def store_mermaid_timeline(task: Optional[QueryTask], mode: str, source_key: str, content: str) -> Dict[str, Any]:
+    """
+    校验 Mermaid Timeline，无法渲染时在本地修复，并把结果与校验信息保存到任务上
+    
+    Returns:
+        {"timeline": 可以渲染的代码, "validation": 校验结果, "source_key": 输入标识}
+    """
+    timeline_content, validation = ensure_valid_mermaid_timeline(content)
+    if validation['repaired']:
+        logger.warning(f"Mermaid Timeline 语法有误，已在本地修复: {validation['errors'][:5]}")
+    stored = {
+        'timeline': timeline_content,
+        'validation': validation,
+        'source_key': source_key
+    }
+    if task is not None:
+        with task_lock:
+            task.mermaid_timelines[mode] = stored
+    return stored
+
+
 @app.route('/api/timeline/mermaid', methods=['POST'])
 def generate_mermaid_timeline():
     """
     生成 Mermaid Timeline 格式的时间线
     
+    默认（local 模式）直接由结构化时间线在本地渲染；narrative 模式调用 LLM 根据报告撰写
+    
     请求格式:
     {
         "query": "原始查询",
         "report": "研究报告内容"  // 可选，如果不提供则需要提供task_id
         "task_id": "任务ID"  // 可选，如果不提供report则需要提供task_id
+        "state_data": {...},  // 可选，local 模式下没有任务时使用的状态数据
+        "mode": "local"  // 可选，"local"（默认）或 "narrative"
     }
     
     返回格式:
     {
         "success": true,
         "timeline": "mermaid timeline代码",
-        "query": "原始查询"
+        "query": "原始查询",
+        "mode": "local",
+        "validation": {"valid": true, "errors": [], "repaired": false, "remaining_errors": []}
     }
+    
+    生成结果经过语法校验（有误时在本地修复）后保存在任务上，相同输入再次请求时直接返回
     """
     try:
         data = request.get_json()
@@ -852,20 +1596,57 @@ def generate_mermaid_timeline():
         query = data.get('query', '').strip()
         report = data.get('report', '').strip()
         task_id = data.get('task_id', '').strip()
+        state_data = data.get('state_data')
+        mode = (data.get('mode') or MERMAID_TIMELINE_MODE).strip().lower()
         
-        # 如果没有提供report，尝试从task_id获取
-        if not report and task_id:
+        if mode not in MERMAID_TIMELINE_MODES:
+            return jsonify({
+                'success': False,
+                'error': f'不支持的模式: {mode}，可选值: {", ".join(MERMAID_TIMELINE_MODES)}'
+            }), 400
+        
+        task = None
+        if task_id:
             with task_lock:
                 task = tasks.get(task_id)
-            if task and task.report:
-                report = task.report
-                if not query:
-                    query = task.query
-            else:
+            if task:
+                query = query or task.query
+                report = report or task.report or ''
+        
+        # local 模式：由结构化时间线直接渲染，不调用 LLM
+        if mode == "local":
+            timeline_data = None
+            owner = None  # 由任务的时间线生成时把结果保存在任务上
+            if task and (task.state_data or len(task.timeline_index)):
+                timeline_data = task_timeline_snapshot(task)
+                owner = task
+            elif state_data:
+                timeline_data = create_timeline_service().generate_timeline(state_data)
+            
+            if timeline_data is not None:
+                source_key = f"{timeline_data.get('version')}:{query}"
+                stored = stored_mermaid_timeline(owner, mode, source_key)
+                if stored is None:
+                    stored = store_mermaid_timeline(
+                        owner, mode, source_key, render_mermaid_timeline(timeline_data, title=query)
+                    )
+                    logger.info(f"本地生成 Mermaid Timeline，长度: {len(stored['timeline'])}")
                 return jsonify({
-                    'success': False,
-                    'error': f'任务 {task_id} 不存在或没有报告内容'
-                }), 404
+                    'success': True,
+                    'timeline': stored['timeline'],
+                    'query': query,
+                    'mode': mode,
+                    'validation': stored['validation']
+                })
+            
+            logger.info("没有可用的结构化时间线，改用 narrative 模式生成 Mermaid Timeline")
+            mode = "narrative"
+        
+        if task_id and not report:
+            return jsonify({
+                'success': False,
+                'error': f'任务 {task_id} 不存在或没有报告内容'
+            }), 404
         
         # 验证必需参数
         if not query:
@@ -882,6 +1663,17 @@ def generate_mermaid_timeline():
         
         logger.info(f"收到 Mermaid Timeline 生成请求: query={query[:50]}..., report_length={len(report)}")
         
+        source_key = hashlib.sha1(f"{query}\0{report}".encode("utf-8")).hexdigest()
+        stored = stored_mermaid_timeline(task, mode, source_key)
+        if stored is not None:
+            return jsonify({
+                'success': True,
+                'timeline': stored['timeline'],
+                'query': query,
+                'mode': mode,
+                'validation': stored['validation']
+            })
+        
         # 检查必要的配置
         if not global_settings.QUERY_ENGINE_API_KEY:
             return jsonify({
@@ -929,21 +1721,30 @@ def generate_mermaid_timeline():
         from src.nodes import TimelineFormattingNode
         timeline_node = TimelineFormattingNode(agent.llm_client)
         
-        # 准备输入数据
+        # 准备输入数据（报告过长时压缩为最相关的证据）
+        timeline_report, _ = prompt_evidence(
+            query, report, (task.state_data if task else None) or state_data, "Mermaid Timeline "
+        )
         timeline_input = {
-            "report": report,
+            "report": timeline_report,
             "query": query
         }
         
-        # 生成 Timeline
-        timeline_content = timeline_node.run(timeline_input, query=query)
+        # 生成 Timeline（关联任务时计入该任务的调用成本）
+        with track_usage(task.usage if task else None, "mermaid"), use_cassette(cassette_name_for(query)):
+            timeline_content = timeline_node.run(timeline_input, query=query)
         
         logger.info(f"Mermaid Timeline 生成成功，长度: {len(timeline_content)}")
         
+        # 语法有误时在本地修复，不重新调用 LLM
+        stored = store_mermaid_timeline(task, mode, source_key, timeline_content)
+        
         return jsonify({
             'success': True,
-            'timeline': timeline_content,
-            'query': query
+            'timeline': stored['timeline'],
+            'query': query,
+            'mode': mode,
+            'validation': stored['validation']
         })
         
     except Exception as e:
@@ -957,6 +1758,253 @@ def generate_mermaid_timeline():
         }), 500
 
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """
+    获取汇总指标（任务数量与 LLM / 搜索调用成本）
+    
+    返回格式:
+    {
+        "success": true,
+        "task_counts": {"pending": 0, "running": 1, "completed": 5, "error": 0},
+        "usage": {"totals": {...}, "stages": {...}},
+        "usage_by_mode": {"deep": {"tasks": 3, "totals": {...}, "per_task": {...}}, "quick": {...}},
+        "unattributed_usage": {"totals": {...}, "stages": {...}},
+        "llm_concurrency": {"name": "llm", "limit": 4, "active": 0, "waiting": 0},
+        "claim_cache": {"path": "...", "claims": 120, "fresh": 100, "hits": 30, "misses": 12},
+        "artifact_log": {"directory": "...", "segments": 1, "bytes": 40960, "pending": 0, ...},
+        "article_cache": {"path": "...", "articles": 12, "results": 8}
+    }
+    """
+    try:
+        with task_lock:
+            task_list = list(tasks.values())
+        
+        task_counts: Dict[str, int] = {}
+        all_stages: Dict[str, Dict[str, float]] = {}
+        mode_stages: Dict[str, Dict[str, Dict[str, float]]] = {}
+        mode_counts: Dict[str, int] = {}
+        
+        for task in task_list:
+            task_counts[task.status] = task_counts.get(task.status, 0) + 1
+            task.usage.merge_into(all_stages)
+            # 按模式统计已完成任务的平均成本，用于调整反思次数、段落数等参数（复用链接结果的任务不计入）
+            if task.status == "completed" and task.cached_from is None:
+                mode_counts[task.mode] = mode_counts.get(task.mode, 0) + 1
+                task.usage.merge_into(mode_stages.setdefault(task.mode, {}))
+        
+        claim_cache = get_claim_cache()
+        artifact_log = get_artifact_log()
+        article_cache = get_article_cache()
+        
+        usage_by_mode = {}
+        for mode, stages in mode_stages.items():
+            totals = summarize_stages(stages)['totals']
+            usage_by_mode[mode] = {
+                'tasks': mode_counts[mode],
+                'totals': totals,
+                'per_task': {key: round(value / mode_counts[mode], 3) for key, value in totals.items()}
+            }
+        
+        return jsonify({
+            'success': True,
+            'task_counts': task_counts,
+            'usage': summarize_stages(all_stages),
+            'usage_by_mode': usage_by_mode,
+            'unattributed_usage': unattributed_usage.to_dict(),
+            'llm_concurrency': llm_limiter.to_dict(),
+            'claim_cache': claim_cache.to_dict() if claim_cache else None,
+            'artifact_log': artifact_log.to_dict() if artifact_log else None,
+            'article_cache': article_cache.to_dict() if article_cache else None
+        })
+        
+    except Exception as e:
+        logger.exception(f"获取指标失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/diagnostics/memory', methods=['GET'])
+def get_memory_diagnostics():
+    """
+    获取内存诊断信息（进程 RSS、每个任务的内存占用与进程内缓存的大小）
+    
+    查询参数:
+        limit: 返回占用最大的前 N 个任务（默认 20）
+    
+    返回格式:
+    {
+        "success": true,
+        "rss": 123456789,
+        "task_count": 3,
+        "task_totals": {"report": ..., "verification_result": ..., "state_data": ..., "timeline_index": ..., "total": ...},
+        "tasks": [{"task_id": "...", "status": "...", "memory": {...}}],
+        "caches": {
+            "lru": {"date_normalizer": {"entries": ..., "maxsize": ..., "hits": ..., "misses": ...}, "canonicalize_url": {...}},
+            "verification": {"entries": 12, "maxsize": 256, "bytes": ..., "locks": 0},
+            "tasks": {"entries": 3, "serialized_responses": 5, "serialized_bytes": ..., "timeline_sources": ..., "timeline_bytes": ...}
+        },
+        "tracemalloc": {"tracing": false, "snapshots": [...]}
+    }
+    """
+    try:
+        limit = request.args.get('limit', 20, type=int)
+        
+        with task_lock:
+            task_list = list(tasks.values())
+        
+        task_entries = []
+        task_totals = {key: 0 for key in ('report', 'verification_result', 'state_data', 'timeline_index',
+                                          'serialized_responses', 'mermaid_timelines', 'total')}
+        for task in task_list:
+            usage = task.memory_usage()
+            for key in task_totals:
+                task_totals[key] += usage[key]
+            task_entries.append({
+                'task_id': task.task_id,
+                'status': task.status,
+                'mode': task.mode,
+                'created_at': task.created_at.isoformat(),
+                'memory': usage
+            })
+        
+        task_entries.sort(key=lambda entry: entry['memory']['total'], reverse=True)
+        
+        with verification_cache_lock:
+            verification_results = list(verification_cache.values())
+            verification_lock_count = len(verification_locks)
+        caches = {
+            'lru': lru_cache_stats(),
+            'verification': {
+                'entries': len(verification_results),
+                'maxsize': VERIFICATION_CACHE_SIZE,
+                'bytes': estimate_size(verification_results),
+                'locks': verification_lock_count
+            },
+            'tasks': {
+                'entries': len(task_list),
+                'serialized_responses': sum(len(task.serialized_responses) for task in task_list),
+                'serialized_bytes': task_totals['serialized_responses'],
+                'timeline_sources': sum(len(task.timeline_index) for task in task_list),
+                'timeline_bytes': task_totals['timeline_index']
+            }
+        }
+        
+        return jsonify({
+            'success': True,
+            'rss': get_process_rss(),
+            'task_count': len(task_list),
+            'task_totals': task_totals,
+            'tasks': task_entries[:limit],
+            'caches': caches,
+            'tracemalloc': {
+                'tracing': memory_diagnostics.is_tracing(),
+                'snapshots': memory_diagnostics.list_snapshots()
+            }
+        })
+        
+    except Exception as e:
+        logger.exception(f"获取内存诊断信息失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/diagnostics/memory/snapshot', methods=['POST'])
+def create_memory_snapshot():
+    """
+    拍摄 tracemalloc 内存快照（未追踪时自动开始追踪）
+    
+    请求格式:
+    {
+        "label": "快照标签"  // 可选
+    }
+    
+    返回格式:
+    {
+        "success": true,
+        "snapshot": {"snapshot_id": "snapshot_1", "label": "...", "traced_current": ..., "rss": ...}
+    }
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        snapshot_info = memory_diagnostics.take_snapshot(label=data.get('label', ''))
+        
+        return jsonify({
+            'success': True,
+            'snapshot': snapshot_info
+        })
+        
+    except Exception as e:
+        logger.exception(f"创建内存快照失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/diagnostics/memory/diff', methods=['GET'])
+def get_memory_diff():
+    """
+    比较两个内存快照，返回增长最多的分配位置
+    
+    查询参数:
+        from: 起始快照ID（必需）
+        to: 结束快照ID（可选，不提供时即时拍摄新快照）
+        limit: 返回的分配位置数量（默认 20）
+        group_by: lineno | filename | traceback（默认 lineno）
+    
+    返回格式:
+    {
+        "success": true,
+        "diff": {
+            "total_size_diff": 1024,
+            "category_size_diff": {"agent": ..., "service": ..., "library": ...},
+            "top_sites": [{"file": "...", "line": 10, "category": "agent", "size_diff": ..., "count_diff": ...}]
+        }
+    }
+    """
+    try:
+        from_id = request.args.get('from', '').strip()
+        if not from_id:
+            return jsonify({
+                'success': False,
+                'error': '请提供起始快照ID (from 参数)'
+            }), 400
+        
+        diff_result = memory_diagnostics.diff(
+            from_id,
+            to_id=request.args.get('to', '').strip() or None,
+            limit=request.args.get('limit', 20, type=int),
+            group_by=request.args.get('group_by', 'lineno')
+        )
+        
+        return jsonify({
+            'success': True,
+            'diff': diff_result
+        })
+        
+    except KeyError as e:
+        return jsonify({
+            'success': False,
+            'error': f'快照不存在: {str(e)}'
+        }), 404
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        logger.exception(f"比较内存快照失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 if __name__ == '__main__':
     logger.info("启动 API 服务器...")
     app.run(
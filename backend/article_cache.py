@@ -0,0 +1,297 @@
+"""
+链接文章缓存
+查询内容是链接时，按规范化 URL 缓存抽取出的文章正文（抓取使用仅去掉跟踪参数的原始链接）（SQLite，进程与任务间共享），
+并以“规范化 URL + 正文摘要”为键保存该文章的研究与判别结果：同一篇文章的分享链接（带不同的跟踪参数）
+再次查询时直接返回已有结果；文章内容变化后摘要不同，会重新研究
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass, asdict, replace
+from html.parser import HTMLParser
+from typing import Dict, Any, List, Optional
+from loguru import logger
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from evidence_compaction import content_hash
+
+
+# 缓存文件路径，设置为空字符串时不缓存文章与链接结果
+ARTICLE_CACHE_PATH = os.getenv(
+    "ARTICLE_CACHE_PATH", os.path.join("query_engine_streamlit_reports", "article_cache.db")
+)
+
+# 文章正文的有效期（小时），过期后重新抓取以发现内容变化
+ARTICLE_TTL_HOURS = float(os.getenv("ARTICLE_CACHE_TTL_HOURS", "24"))
+
+# 链接结果的有效期（小时）
+URL_RESULT_TTL_HOURS = float(os.getenv("URL_RESULT_TTL_HOURS", "72"))
+
+# 抓取文章的超时时间（秒）
+ARTICLE_FETCH_TIMEOUT = float(os.getenv("ARTICLE_FETCH_TIMEOUT", "10"))
+
+# 保存的正文长度上限（字符）
+MAX_ARTICLE_CHARS = 20000
+
+USER_AGENT = "Mozilla/5.0 (compatible; VerumBot/1.0)"
+
+_TEXT_TAGS = {"p", "h1", "h2", "h3", "h4", "li", "blockquote", "pre"}
+_SKIP_TAGS = {"script", "style", "noscript", "nav", "header", "footer", "aside", "form", "svg", "iframe"}
+_TITLE_METAS = ("og:title", "twitter:title")
+
+
+class _ArticleParser(HTMLParser):
+    """从 HTML 中抽取标题与正文段落"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self.meta_title = ""
+        self.blocks: List[str] = []
+        self._skip = 0
+        self._in_title = False
+        self._text_depth = 0
+        self._buffer: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag == "meta" and not self.meta_title:
+            attributes = dict(attrs)
+            if (attributes.get("property") or attributes.get("name")) in _TITLE_METAS:
+                self.meta_title = (attributes.get("content") or "").strip()
+        elif tag in _TEXT_TAGS:
+            self._text_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag == "title":
+            self._in_title = False
+        elif tag in _TEXT_TAGS and self._text_depth:
+            self._text_depth -= 1
+            if not self._text_depth:
+                text = " ".join("".join(self._buffer).split())
+                if text:
+                    self.blocks.append(text)
+                self._buffer = []
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif self._text_depth and not self._skip:
+            self._buffer.append(data)
+
+
+def extract_article(html: str) -> Dict[str, str]:
+    """
+    抽取文章的标题与正文
+
+    Args:
+        html: 页面 HTML
+
+    Returns:
+        {"title": 标题, "text": 正文（段落以空行分隔）}
+    """
+    parser = _ArticleParser()
+    try:
+        parser.feed(html or "")
+        parser.close()
+    except Exception as e:
+        logger.debug(f"解析页面 HTML 出错，使用已抽取的部分: {str(e)}")
+    title = parser.meta_title or " ".join(parser.title.split())
+    return {"title": title, "text": "\n\n".join(parser.blocks)[:MAX_ARTICLE_CHARS]}
+
+
+@dataclass
+class Article:
+    """抽取出的文章"""
+    url: str  # 规范化 URL
+    title: str
+    text: str
+    content_hash: str
+    fetched_at: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def fetch_article(url: str, timeout: float = ARTICLE_FETCH_TIMEOUT) -> Article:
+    """
+    抓取并抽取文章
+
+    Args:
+        url: 要抓取的 URL
+        timeout: 超时时间（秒）
+
+    Returns:
+        Article实例（正文为空时摘要基于标题）
+
+    Raises:
+        requests.RequestException: 抓取失败
+    """
+    import requests
+
+    response = requests.get(url, timeout=timeout, headers={"User-Agent": USER_AGENT})
+    response.raise_for_status()
+    if response.encoding is None or response.encoding.lower() == "iso-8859-1":
+        # 未声明编码时 requests 默认为 ISO-8859-1，中文页面需要按内容推断
+        response.encoding = response.apparent_encoding
+    extracted = extract_article(response.text)
+    return Article(
+        url=url,
+        title=extracted["title"],
+        text=extracted["text"],
+        content_hash=content_hash(extracted["text"] or extracted["title"]),
+        fetched_at=time.time()
+    )
+
+
+class ArticleCache:
+    """文章正文与链接结果缓存（SQLite，线程安全）"""
+
+    def __init__(self, path: str):
+        """
+        初始化
+
+        Args:
+            path: SQLite 文件路径（":memory:" 表示仅在内存中）
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and path != ":memory:":
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS articles ("
+                "url TEXT PRIMARY KEY, title TEXT, text TEXT, content_hash TEXT NOT NULL, fetched_at REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS url_results ("
+                "url TEXT NOT NULL, content_hash TEXT NOT NULL, task_id TEXT, result TEXT NOT NULL, "
+                "created_at REAL NOT NULL, PRIMARY KEY (url, content_hash))"
+            )
+
+    def get_article(self, url: str, max_age: Optional[float] = None,
+                    now: Optional[float] = None) -> Optional[Article]:
+        """
+        读取缓存的文章
+
+        Args:
+            url: 规范化 URL
+            max_age: 最长缓存时间（秒），默认使用 ARTICLE_CACHE_TTL_HOURS；None 以外的负数表示不限
+            now: 当前时间（秒）
+
+        Returns:
+            Article实例；未缓存或已过期时返回 None
+        """
+        max_age = ARTICLE_TTL_HOURS * 3600 if max_age is None else max_age
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT url, title, text, content_hash, fetched_at FROM articles WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        article = Article(*row)
+        if max_age >= 0 and (now or time.time()) - article.fetched_at > max_age:
+            return None
+        return article
+
+    def put_article(self, article: Article):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO articles (url, title, text, content_hash, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (article.url, article.title, article.text, article.content_hash, article.fetched_at)
+            )
+
+    def article(self, url: str, fetch_url: Optional[str] = None) -> Optional[Article]:
+        """
+        获取文章：缓存未过期时直接返回，否则抓取并更新缓存（抓取失败时退回过期的缓存）
+
+        Args:
+            url: 规范化 URL（缓存键）
+            fetch_url: 实际抓取的 URL（展开跳转、去掉跟踪参数后的原始链接），默认与 url 相同
+
+        Returns:
+            Article实例；无法获取时返回 None
+        """
+        cached = self.get_article(url)
+        if cached is not None:
+            return cached
+        try:
+            article = replace(fetch_article(fetch_url or url), url=url)
+        except Exception as e:
+            logger.warning(f"抓取文章失败 {fetch_url or url}: {str(e)}")
+            return self.get_article(url, max_age=-1)
+        self.put_article(article)
+        logger.info(f"已抓取并缓存文章: {url}（{len(article.text)} 字）")
+        return article
+
+    def get_result(self, url: str, digest: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        读取链接（及其正文摘要）对应的研究与判别结果
+
+        Returns:
+            保存时的结果字典，外加 task_id；不存在或已过期时返回 None
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT task_id, result, created_at FROM url_results WHERE url = ? AND content_hash = ?", (url, digest)
+            ).fetchone()
+        if row is None or (now or time.time()) - row[2] > URL_RESULT_TTL_HOURS * 3600:
+            return None
+        return {**json.loads(row[1]), "task_id": row[0]}
+
+    def put_result(self, url: str, digest: str, result: Dict[str, Any], task_id: Optional[str] = None):
+        """保存链接（及其正文摘要）对应的研究与判别结果"""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO url_results (url, content_hash, task_id, result, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (url, digest, task_id, json.dumps(result, ensure_ascii=False, default=str), time.time())
+            )
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            articles = self._connection.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+            results = self._connection.execute("SELECT COUNT(*) FROM url_results").fetchone()[0]
+        return {"path": self.path, "articles": articles, "results": results}
+
+
+_shared_cache: Optional[ArticleCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_article_cache(path: Optional[str] = None) -> Optional[ArticleCache]:
+    """
+    获取进程内共享的文章缓存（首次调用时打开）
+
+    Args:
+        path: 缓存文件路径，默认使用 ARTICLE_CACHE_PATH
+
+    Returns:
+        ArticleCache实例；路径为空或无法打开时返回 None
+    """
+    global _shared_cache
+    path = ARTICLE_CACHE_PATH if path is None else path
+    if not path:
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None or _shared_cache.path != path:
+            try:
+                _shared_cache = ArticleCache(path)
+                logger.info(f"文章缓存: {path}")
+            except sqlite3.Error as e:
+                logger.warning(f"无法打开文章缓存 {path}: {str(e)}")
+                return None
+        return _shared_cache
@@ -0,0 +1,397 @@
+"""
+产物日志（write-behind、只追加）
+判别结果与研究报告先放入内存队列，由后台线程批量写入滚动的只追加段文件，请求线程不再等待磁盘 I/O：
+- 每批记录压缩为一个 gzip member 追加到当前段文件（artifacts-000001.log.gz，多个 member 串接仍是合法的 gzip 文件）
+- 每个段文件旁有偏移索引（artifacts-000001.idx，每行一条 JSON：key、kind、member 偏移与长度、行号），
+  可按 key 直接定位到所在的 member 读取单条记录
+- 段文件超过 ARTIFACT_SEGMENT_BYTES 时滚动到新段，超过 ARTIFACT_MAX_SEGMENTS 个段时删除最旧的段
+- 打开段文件时若其尾部有未写完的 member（进程中途退出），或某批写入失败，之后的记录写入新段
+
+通过环境变量配置:
+    ARTIFACT_LOG_DIR=query_engine_streamlit_reports/artifacts   段文件目录（设为空字符串关闭）
+    ARTIFACT_SEGMENT_BYTES=16777216                              单个段文件的大小上限
+    ARTIFACT_MAX_SEGMENTS=0                                      最多保留的段数（0 表示不限）
+    ARTIFACT_FSYNC=interval                                      always（每批）| interval | never
+    ARTIFACT_FSYNC_INTERVAL=1.0                                  interval 策略的 fsync 间隔（秒）
+    ARTIFACT_FLUSH_INTERVAL=0.2                                  攒批的最长等待时间（秒）
+    ARTIFACT_LEGACY_FILES=0                                      是否仍然输出逐个的 JSON / Markdown 文件
+"""
+
+import atexit
+import glob
+import gzip
+import hashlib
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
+from loguru import logger
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from json_codec import dumps, loads
+
+
+ARTIFACT_LOG_DIR = os.getenv("ARTIFACT_LOG_DIR", os.path.join("query_engine_streamlit_reports", "artifacts"))
+ARTIFACT_SEGMENT_BYTES = int(os.getenv("ARTIFACT_SEGMENT_BYTES", str(16 * 1024 * 1024)))
+ARTIFACT_MAX_SEGMENTS = int(os.getenv("ARTIFACT_MAX_SEGMENTS", "0"))
+ARTIFACT_FSYNC = os.getenv("ARTIFACT_FSYNC", "interval")
+ARTIFACT_FSYNC_INTERVAL = float(os.getenv("ARTIFACT_FSYNC_INTERVAL", "1.0"))
+ARTIFACT_FLUSH_INTERVAL = float(os.getenv("ARTIFACT_FLUSH_INTERVAL", "0.2"))
+ARTIFACT_LEGACY_FILES = os.getenv("ARTIFACT_LEGACY_FILES", "0").lower() in ("1", "true", "yes")
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+# 每批最多写入的记录数
+MAX_BATCH_RECORDS = 256
+
+_SEGMENT_NAME = re.compile(r"artifacts-(\d{6})\.log\.gz$")
+
+
+def artifact_key(kind: str, query: str) -> str:
+    """生成记录的唯一键：类型/时间_查询摘要_随机后缀"""
+    digest = hashlib.sha1((query or "").encode("utf-8")).hexdigest()[:12]
+    return f"{kind}/{datetime.now().strftime('%Y%m%d_%H%M%S')}_{digest}_{uuid.uuid4().hex[:8]}"
+
+
+class ArtifactLog:
+    """write-behind 的只追加产物日志"""
+
+    def __init__(self, directory: str, segment_bytes: int = ARTIFACT_SEGMENT_BYTES,
+                 max_segments: int = ARTIFACT_MAX_SEGMENTS, fsync: str = ARTIFACT_FSYNC,
+                 fsync_interval: float = ARTIFACT_FSYNC_INTERVAL, flush_interval: float = ARTIFACT_FLUSH_INTERVAL):
+        """
+        初始化并启动后台写入线程
+
+        Args:
+            directory: 段文件目录
+            segment_bytes: 单个段文件的大小上限（字节）
+            max_segments: 最多保留的段数（0 表示不限）
+            fsync: fsync 策略（always / interval / never）
+            fsync_interval: interval 策略的 fsync 间隔（秒）
+            flush_interval: 攒批的最长等待时间（秒）
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"不支持的 fsync 策略: {fsync}，应为 {' / '.join(FSYNC_POLICIES)}")
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self._queue: "queue.Queue[Optional[Tuple[Dict[str, Any], Optional[Callable[[], Any]]]]]" = queue.Queue()
+        self._lock = threading.Lock()  # 保护段文件切换与索引
+        self._index: Optional[Dict[str, Tuple[int, int, int, int]]] = None  # key -> (段序号, 偏移, 长度, 行号)
+        self._segment_seq = max(self._segment_numbers(), default=1)
+        self._segment = None
+        self._index_file = None
+        self._last_fsync = time.monotonic()
+        self._dirty = False  # 是否有尚未 fsync 的写入
+        self.written = 0
+        self.batches = 0
+
+        self._thread = threading.Thread(target=self._run, name="artifact-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ---------- 写入 ----------
+
+    def append(self, kind: str, key: str, record: Dict[str, Any],
+               on_written: Optional[Callable[[], Any]] = None):
+        """
+        追加一条记录（立即返回，由后台线程写入）
+
+        Args:
+            kind: 记录类型（如 verification、report）
+            key: 记录的唯一键（用于读取）
+            record: 记录内容
+            on_written: 记录落盘后在后台线程中调用的函数（如写入检索索引）
+        """
+        self._queue.put(({"kind": kind, "key": key, "written_at": time.time(), "record": record}, on_written))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待队列中的记录全部写入
+
+        Returns:
+            是否在超时前写完
+        """
+        done = threading.Event()
+        self._queue.put(({"kind": "_flush"}, done.set))
+        return done.wait(timeout)
+
+    def close(self):
+        """写完队列中的记录并关闭文件"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        with self._lock:
+            self._close_segment()
+
+    def _run(self):
+        while True:
+            try:
+                # interval 策略下空闲时也按间隔 fsync 最后写入的数据
+                wait = self.fsync_interval if self._dirty and self.fsync == "interval" else None
+                item = self._queue.get(timeout=wait)
+            except queue.Empty:
+                with self._lock:
+                    self._maybe_fsync()
+                continue
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < MAX_BATCH_RECORDS:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                logger.error(f"写入产物日志失败（{len(batch)} 条记录）: {str(e)}")
+            if stop:
+                return
+
+    def _write_batch(self, batch: List[Tuple[Dict[str, Any], Optional[Callable[[], Any]]]]):
+        entries = [entry for entry, _ in batch if entry["kind"] != "_flush"]
+        written = False
+        try:
+            if entries:
+                member = gzip.compress(b"".join(dumps(entry) + b"\n" for entry in entries))
+                with self._lock:
+                    try:
+                        segment = self._current_segment(len(member))
+                        offset = segment.tell()
+                        segment.write(member)
+                        segment.flush()
+                        self._index_file.write("".join(
+                            json.dumps({"key": entry["key"], "kind": entry["kind"], "offset": offset,
+                                        "length": len(member), "line": line}, ensure_ascii=False) + "\n"
+                            for line, entry in enumerate(entries)
+                        ))
+                        self._index_file.flush()
+                    except Exception:
+                        # 段尾部可能留下半个 member，之后的批次改写到新段
+                        self._abandon_segment()
+                        raise
+                    if self._index is not None:
+                        for line, entry in enumerate(entries):
+                            self._index[entry["key"]] = (self._segment_seq, offset, len(member), line)
+                    self.written += len(entries)
+                    self.batches += 1
+                    self._maybe_fsync()
+            written = True
+        except Exception:
+            logger.error(f"产物日志丢弃了 {len(entries)} 条记录: {', '.join(entry['key'] for entry in entries)}")
+            raise
+        finally:
+            # 写入失败时只跳过记录的回调，flush 的等待方仍会被唤醒
+            for entry, on_written in batch:
+                if on_written is None or (not written and entry["kind"] != "_flush"):
+                    continue
+                try:
+                    on_written()
+                except Exception as e:
+                    logger.warning(f"产物写入后的回调失败: {str(e)}")
+
+    def _maybe_fsync(self):
+        """按 fsync 策略同步（调用方需持有锁）"""
+        self._dirty = self.fsync != "never"
+        now = time.monotonic()
+        if self._segment is None:
+            self._dirty = False
+        elif self.fsync == "always" or (self.fsync == "interval" and now - self._last_fsync >= self.fsync_interval):
+            os.fsync(self._segment.fileno())
+            os.fsync(self._index_file.fileno())
+            self._last_fsync = now
+            self._dirty = False
+
+    # ---------- 段文件 ----------
+
+    def _segment_path(self, seq: int, suffix: str = "log.gz") -> str:
+        return os.path.join(self.directory, f"artifacts-{seq:06d}.{suffix}")
+
+    def _segment_numbers(self) -> List[int]:
+        numbers = []
+        for path in glob.glob(os.path.join(self.directory, "artifacts-*.log.gz")):
+            match = _SEGMENT_NAME.search(path)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def _current_segment(self, incoming: int):
+        """当前段文件（写入后会超过大小上限且当前段非空时滚动到新段）"""
+        if self._segment is None:
+            self._open_segment()
+        if self._segment.tell() and self._segment.tell() + incoming > self.segment_bytes:
+            self._close_segment()
+            self._segment_seq += 1
+            self._open_segment()
+            self._apply_retention()
+        return self._segment
+
+    def _open_segment(self):
+        path = self._segment_path(self._segment_seq)
+        if os.path.exists(path) and os.path.getsize(path) != self._indexed_bytes(self._segment_seq):
+            # 上次进程在写入中途退出，段尾部是不完整的 member，追加在其后会让后续记录无法顺序读取
+            logger.warning(f"产物日志段 {self._segment_seq} 尾部不完整，改写到新段")
+            self._segment_seq += 1
+            path = self._segment_path(self._segment_seq)
+        self._segment = open(path, "ab")
+        self._index_file = open(self._segment_path(self._segment_seq, "idx"), "a", encoding="utf-8")
+
+    def _close_segment(self):
+        if self._segment is not None:
+            if self.fsync != "never":
+                os.fsync(self._segment.fileno())
+                os.fsync(self._index_file.fileno())
+            self._segment.close()
+            self._index_file.close()
+            self._segment = None
+            self._index_file = None
+
+    def _abandon_segment(self):
+        """写入失败后关闭当前段，下一批写入新段（调用方需持有锁）"""
+        try:
+            self._close_segment()
+        except OSError as e:
+            logger.warning(f"关闭产物日志段 {self._segment_seq} 失败: {str(e)}")
+            self._segment = None
+            self._index_file = None
+        self._segment_seq += 1
+
+    def _indexed_bytes(self, seq: int) -> int:
+        """索引中记录的段内容长度（最后一个完整 member 的结束位置）"""
+        end = 0
+        try:
+            with open(self._segment_path(seq, "idx"), "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    end = max(end, entry["offset"] + entry["length"])
+        except OSError:
+            pass
+        return end
+
+    def _apply_retention(self):
+        if self.max_segments <= 0:
+            return
+        numbers = self._segment_numbers()
+        for seq in numbers[:max(0, len(numbers) - self.max_segments)]:
+            for suffix in ("log.gz", "idx"):
+                try:
+                    os.remove(self._segment_path(seq, suffix))
+                except OSError:
+                    pass
+            if self._index is not None:
+                self._index = {key: location for key, location in self._index.items() if location[0] != seq}
+            logger.info(f"产物日志超过 {self.max_segments} 个段，已删除段 {seq}")
+
+    # ---------- 读取 ----------
+
+    def _load_index(self) -> Dict[str, Tuple[int, int, int, int]]:
+        """读取全部段的索引（调用方需持有锁）"""
+        if self._index is None:
+            index = {}
+            for seq in self._segment_numbers():
+                try:
+                    with open(self._segment_path(seq, "idx"), "r", encoding="utf-8") as f:
+                        for line in f:
+                            try:
+                                entry = json.loads(line)
+                            except ValueError:
+                                continue  # 写入中断留下的不完整行
+                            index[entry["key"]] = (seq, entry["offset"], entry["length"], entry["line"])
+                except OSError:
+                    continue
+            self._index = index
+        return self._index
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        按 key 读取记录（尚在队列中未写入的记录读不到）
+
+        Returns:
+            {"kind", "key", "written_at", "record"}，不存在时返回 None
+        """
+        with self._lock:
+            location = self._load_index().get(key)
+        if location is None:
+            return None
+        seq, offset, length, line = location
+        with open(self._segment_path(seq), "rb") as f:
+            f.seek(offset)
+            member = f.read(length)
+        return loads(gzip.decompress(member).splitlines()[line])
+
+    def iter_records(self, kind: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """按写入顺序遍历所有段中的记录"""
+        for seq in self._segment_numbers():
+            try:
+                with gzip.open(self._segment_path(seq), "rb") as f:
+                    for line in f:
+                        entry = loads(line)
+                        if kind is None or entry["kind"] == kind:
+                            yield entry
+            except (OSError, EOFError) as e:
+                # 段尾部的 member 可能因进程中断而不完整
+                logger.debug(f"读取段 {seq} 时中断: {str(e)}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        numbers = self._segment_numbers()
+        size = sum(os.path.getsize(self._segment_path(seq)) for seq in numbers
+                   if os.path.exists(self._segment_path(seq)))
+        return {
+            "directory": self.directory,
+            "segments": len(numbers),
+            "bytes": size,
+            "pending": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "fsync": self.fsync
+        }
+
+
+_shared_log: Optional[ArtifactLog] = None
+_shared_log_lock = threading.Lock()
+
+
+def get_artifact_log(directory: Optional[str] = None) -> Optional[ArtifactLog]:
+    """
+    获取进程内共享的产物日志（首次调用时启动后台写入线程）
+
+    Args:
+        directory: 段文件目录，默认使用 ARTIFACT_LOG_DIR
+
+    Returns:
+        ArtifactLog实例；目录为空或无法创建时返回 None
+    """
+    global _shared_log
+    directory = ARTIFACT_LOG_DIR if directory is None else directory
+    if not directory:
+        return None
+    with _shared_log_lock:
+        if _shared_log is None or _shared_log.directory != directory:
+            try:
+                _shared_log = ArtifactLog(directory)
+            except (OSError, ValueError) as e:
+                logger.warning(f"无法启用产物日志 {directory}: {str(e)}")
+                return None
+        return _shared_log
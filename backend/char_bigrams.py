@@ -0,0 +1,78 @@
+"""
+字符二元组
+把一批文本一次性转换为字符二元组编码（在 NumPy 码位数组上完成），供近似重复检测（SimHash）与故事线聚类共用
+"""
+
+from typing import Sequence, Tuple
+
+import numpy as np
+
+
+# 二元组编码为 (前一字符码位 << 21) | 后一字符码位
+CODEPOINT_BITS = np.uint64(21)
+
+# splitmix64 终混常数
+_MIX_SHIFTS = (np.uint64(30), np.uint64(27), np.uint64(31))
+_MIX_MULTIPLIERS = (np.uint64(0xBF58476D1CE4E5B9), np.uint64(0x94D049BB133111EB))
+
+# 2^64 / 黄金分割比（乘法哈希常数）
+_FIBONACCI_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def word_mask(codepoints: np.ndarray) -> np.ndarray:
+    """字母、数字与汉字为 True，空白、标点和分隔符为 False"""
+    return (
+        ((codepoints >= 0x30) & (codepoints <= 0x39))
+        | ((codepoints >= 0x61) & (codepoints <= 0x7A))
+        | ((codepoints >= 0xC0) & (codepoints <= 0x24F))
+        | ((codepoints >= 0x3400) & (codepoints <= 0x9FFF))
+        | ((codepoints >= 0xF900) & (codepoints <= 0xFAFF))
+    )
+
+
+def bigram_codes(texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    提取一批文本（小写后）的字符二元组，二元组不跨越空白与标点
+
+    Args:
+        texts: 文本列表
+
+    Returns:
+        (每个二元组所属的文本下标, 二元组编码)，按文本顺序排列
+    """
+    # 所有文本用 \0 连接后一次性转换为码位数组，\0 不是词字符，二元组不会跨越文本
+    joined = "\0".join(texts)
+    if joined.count("\0") != max(len(texts) - 1, 0):
+        joined = "\0".join(text.replace("\0", " ") for text in texts)
+    codepoints = np.frombuffer(joined.lower().encode("utf-32-le"), dtype=np.uint32)
+    word = word_mask(codepoints)
+    valid = np.flatnonzero(word[:-1] & word[1:])
+    # 文本分隔符之间的二元组属于同一个文本
+    boundaries = np.searchsorted(valid, np.flatnonzero(codepoints == 0))
+    docs = np.repeat(np.arange(len(texts)), np.diff(boundaries, prepend=0, append=valid.size)) if texts else valid
+    codes = (codepoints[valid].astype(np.uint64) << CODEPOINT_BITS) | codepoints[valid + 1]
+    return docs, codes
+
+
+def hash_codes(codes: np.ndarray, bits: int) -> np.ndarray:
+    """
+    把二元组编码哈希为 bits 位的整数（乘以 64 位黄金分割常数后取高位，只需一次乘法）
+
+    Args:
+        codes: uint64 编码数组
+        bits: 哈希位数（1~64）
+
+    Returns:
+        uint64 数组，取值范围 [0, 2^bits)
+    """
+    with np.errstate(over="ignore"):
+        return (codes * _FIBONACCI_MULTIPLIER) >> np.uint64(64 - bits)
+
+
+def mix64(values: np.ndarray) -> np.ndarray:
+    """splitmix64 终混函数：把整数编码打散为均匀分布的 64 位哈希"""
+    values = values.astype(np.uint64)
+    with np.errstate(over="ignore"):
+        values = (values ^ (values >> _MIX_SHIFTS[0])) * _MIX_MULTIPLIERS[0]
+        values = (values ^ (values >> _MIX_SHIFTS[1])) * _MIX_MULTIPLIERS[1]
+    return values ^ (values >> _MIX_SHIFTS[2])
@@ -0,0 +1,359 @@
+"""
+陈述级判别缓存
+把待判别的新闻拆分为原子陈述（如“OpenAI 投资 AMD 一千亿美元”），规范化后作为键，
+在 SQLite 中持久保存每条陈述的判别结果、证据链接与判别时间，不同任务之间共享；
+新的判别先查缓存，只把未知（或已过期）的陈述交给 LLM
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Any, List, Optional
+from loguru import logger
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from concurrency import llm_limiter
+
+
+# 缓存文件路径，设置为空字符串时不使用陈述级缓存
+CLAIM_CACHE_PATH = os.getenv("CLAIM_CACHE_PATH", os.path.join("query_engine_streamlit_reports", "claim_cache.db"))
+
+# 新鲜度策略：确定的结论（真 / 假）保留较久，不确定的结论（部分真实 / 无法确定）随事件进展很快过时
+CLAIM_TTL_HOURS = float(os.getenv("CLAIM_CACHE_TTL_HOURS", "72"))
+CLAIM_UNCERTAIN_TTL_HOURS = float(os.getenv("CLAIM_CACHE_UNCERTAIN_TTL_HOURS", "6"))
+
+# 每条新闻最多拆分的陈述数
+MAX_CLAIMS = 8
+
+# 判别时提供给 LLM 的证据长度（字符）
+MAX_EVIDENCE_CHARS = 12000
+
+DEFINITE_VERDICTS = ("真", "假")
+CLAIM_VERDICTS = ("真", "假", "部分真实", "无法确定")
+
+_PUNCTUATION = re.compile(r"[\W_]+")
+_SENTENCE_END = re.compile(r"[。！？!?；;\n]+")
+_URL = re.compile(r"https?://[^\s)\]}>\"'，。、；）】]+")
+_JSON_ARRAY = re.compile(r"\[.*\]", re.DOTALL)
+
+
+def normalize_claim(text: str) -> str:
+    """规范化陈述文本：全角转半角、小写，去掉空白与标点"""
+    return _PUNCTUATION.sub("", unicodedata.normalize("NFKC", text or "").lower())
+
+
+def claim_key(text: str) -> str:
+    """陈述的缓存键（规范化文本的 SHA-1）"""
+    return hashlib.sha1(normalize_claim(text).encode("utf-8")).hexdigest()
+
+
+def freshness_ttl(verdict: str) -> float:
+    """按结论确定缓存有效期（秒）"""
+    hours = CLAIM_TTL_HOURS if verdict in DEFINITE_VERDICTS else CLAIM_UNCERTAIN_TTL_HOURS
+    return hours * 3600
+
+
+@dataclass
+class ClaimVerdict:
+    """一条陈述的判别结果"""
+    claim: str
+    verdict: str
+    reason: str = ""
+    evidence: List[str] = field(default_factory=list)
+    verified_at: float = 0.0
+    expires_at: float = 0.0
+    cached: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class ClaimCache:
+    """持久化的陈述判别缓存（SQLite，线程安全）"""
+
+    def __init__(self, path: str):
+        """
+        初始化
+
+        Args:
+            path: SQLite 文件路径（":memory:" 表示仅在内存中）
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and path != ":memory:":
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS claims ("
+                "key TEXT PRIMARY KEY, claim TEXT NOT NULL, verdict TEXT NOT NULL, reason TEXT, "
+                "evidence TEXT, verified_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS claims_expires ON claims (expires_at)")
+            # 新闻（查询）拆分出的陈述，相同的新闻不再重复拆分
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS claim_sets (key TEXT PRIMARY KEY, claims TEXT NOT NULL)"
+            )
+        self.hits = 0
+        self.misses = 0
+
+    def get_claims(self, query: str) -> Optional[List[str]]:
+        """获取已拆分的陈述，没有记录时返回 None"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT claims FROM claim_sets WHERE key = ?", (claim_key(query),)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_claims(self, query: str, claims: List[str]):
+        """保存新闻拆分出的陈述"""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO claim_sets (key, claims) VALUES (?, ?)",
+                (claim_key(query), json.dumps(claims, ensure_ascii=False))
+            )
+
+    def lookup(self, claims: List[str], now: Optional[float] = None) -> Dict[str, ClaimVerdict]:
+        """
+        查找未过期的判别结果
+
+        Args:
+            claims: 陈述列表
+            now: 当前时间戳（默认 time.time()）
+
+        Returns:
+            陈述的缓存键 -> 判别结果（cached 为 True）
+        """
+        now = time.time() if now is None else now
+        keys = list(dict.fromkeys(claim_key(claim) for claim in claims))
+        if not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT key, claim, verdict, reason, evidence, verified_at, expires_at FROM claims "
+                f"WHERE key IN ({placeholders}) AND expires_at > ?",
+                (*keys, now)
+            ).fetchall()
+            self.hits += len(rows)
+            self.misses += len(keys) - len(rows)
+        return {
+            key: ClaimVerdict(claim, verdict, reason or "", json.loads(evidence or "[]"), verified_at, expires_at, True)
+            for key, claim, verdict, reason, evidence, verified_at, expires_at in rows
+        }
+
+    def store(self, verdicts: List[ClaimVerdict]):
+        """保存判别结果（有效期按 freshness_ttl 计算）"""
+        rows = []
+        for verdict in verdicts:
+            verdict.expires_at = verdict.verified_at + freshness_ttl(verdict.verdict)
+            rows.append((
+                claim_key(verdict.claim), verdict.claim, verdict.verdict, verdict.reason,
+                json.dumps(verdict.evidence, ensure_ascii=False), verdict.verified_at, verdict.expires_at
+            ))
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO claims VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """删除过期的判别结果，返回删除的条数"""
+        now = time.time() if now is None else now
+        with self._lock, self._connection:
+            return self._connection.execute("DELETE FROM claims WHERE expires_at <= ?", (now,)).rowcount
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            total, fresh = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(expires_at > ?), 0) FROM claims", (time.time(),)
+            ).fetchone()
+            return {"path": self.path, "claims": total, "fresh": fresh, "hits": self.hits, "misses": self.misses}
+
+
+def aggregate_claims(verdicts: List[ClaimVerdict]) -> str:
+    """
+    由各陈述的结论得出新闻整体的结论
+
+    全部为真时为真，全部为假时为假，没有确定结论时无法确定，其余情况为部分真实
+    """
+    known = [verdict.verdict for verdict in verdicts if verdict.verdict != "无法确定"]
+    if not known:
+        return "无法确定"
+    if all(verdict == "真" for verdict in known) and len(known) == len(verdicts):
+        return "真"
+    if all(verdict == "假" for verdict in known):
+        return "假"
+    return "部分真实"
+
+
+def _parse_json_array(response: str) -> List[Any]:
+    """从 LLM 的回复中解析 JSON 数组（允许代码块标记与前后说明文字）"""
+    match = _JSON_ARRAY.search(response or "")
+    if not match:
+        raise ValueError("回复中没有 JSON 数组")
+    parsed = json.loads(match.group(0))
+    if not isinstance(parsed, list):
+        raise ValueError("回复不是 JSON 数组")
+    return parsed
+
+
+EXTRACT_SYSTEM_PROMPT = f"""你是一个新闻事实核查助手。请把用户给出的新闻拆分为可以独立核查的原子陈述。
+
+要求：
+1. 每条陈述只包含一个事实，写成“主体 + 行为 + 对象（+ 数量 / 时间 / 地点）”的简短陈述句
+2. 使用简体中文，数字统一使用阿拉伯数字，机构与人名使用最常见的写法，不要添加修饰语与评价
+3. 只保留可以核查的事实，最多 {MAX_CLAIMS} 条
+4. 只返回 JSON 字符串数组，例如 ["OpenAI 投资 AMD 1000亿美元"]，不要返回其他内容"""
+
+JUDGE_SYSTEM_PROMPT = """你是一个新闻事实核查助手。请根据给出的研究材料，逐条判断陈述的真假。
+
+结论只能是以下四种之一：真、假、部分真实、无法确定（材料不足以判断时选择无法确定）。
+
+只返回 JSON 数组，每条陈述一个对象，格式为：
+[{"id": 1, "verdict": "真", "reason": "一句话理由", "evidence": ["材料中支持该结论的链接"]}]
+不要返回其他内容。"""
+
+
+class ClaimVerifier:
+    """陈述级判别：拆分陈述、查询缓存、批量判别未知陈述并写回缓存"""
+
+    def __init__(self, llm_client: Any, cache: ClaimCache):
+        """
+        初始化
+
+        Args:
+            llm_client: LLM 客户端（提供 invoke(system_prompt, user_prompt, **kwargs)）
+            cache: 陈述判别缓存
+        """
+        self.llm_client = llm_client
+        self.cache = cache
+
+    def extract_claims(self, query: str) -> List[str]:
+        """
+        把新闻拆分为原子陈述（结果按新闻内容缓存），LLM 调用失败时按句子拆分
+
+        Args:
+            query: 原始查询/新闻内容
+
+        Returns:
+            陈述列表
+        """
+        claims = self.cache.get_claims(query)
+        if claims is not None:
+            return claims
+        try:
+            with llm_limiter:
+                response = self.llm_client.invoke(EXTRACT_SYSTEM_PROMPT, f"新闻：{query}", temperature=0)
+            claims = [str(claim).strip() for claim in _parse_json_array(response)]
+        except Exception as e:
+            logger.warning(f"拆分陈述失败，按句子拆分: {str(e)}")
+            return [sentence.strip() for sentence in _SENTENCE_END.split(query) if sentence.strip()][:MAX_CLAIMS]
+        claims = list(dict.fromkeys(claim for claim in claims if normalize_claim(claim)))[:MAX_CLAIMS]
+        if claims:
+            self.cache.put_claims(query, claims)
+        return claims
+
+    def judge(self, query: str, claims: List[str], evidence: str) -> List[ClaimVerdict]:
+        """
+        在一次 LLM 调用中判别多条陈述
+
+        Args:
+            query: 原始查询/新闻内容
+            claims: 待判别的陈述
+            evidence: 研究材料（报告或各段判别结论）
+
+        Returns:
+            与 claims 一一对应的判别结果
+        """
+        numbered = "\n".join(f"{index}. {claim}" for index, claim in enumerate(claims, start=1))
+        user_prompt = f"新闻：{query}\n\n待核查的陈述：\n{numbered}\n\n研究材料：\n{evidence[:MAX_EVIDENCE_CHARS]}"
+        with llm_limiter:
+            response = self.llm_client.invoke(JUDGE_SYSTEM_PROMPT, user_prompt, temperature=0)
+
+        # 证据只保留材料中确实出现的链接
+        known_urls = set(_URL.findall(evidence))
+        by_id = {}
+        for item in _parse_json_array(response):
+            if isinstance(item, dict) and str(item.get("id", "")).isdigit():
+                by_id[int(item["id"])] = item
+
+        now = time.time()
+        verdicts = []
+        for index, claim in enumerate(claims, start=1):
+            item = by_id.get(index, {})
+            verdict = item.get("verdict") if item.get("verdict") in CLAIM_VERDICTS else "无法确定"
+            urls = [url for url in item.get("evidence") or [] if isinstance(url, str) and url in known_urls]
+            verdicts.append(ClaimVerdict(claim, verdict, str(item.get("reason") or ""), urls, now))
+        return verdicts
+
+    def verify(self, query: str, evidence: str) -> Optional[Dict[str, Any]]:
+        """
+        陈述级判别：已缓存的陈述直接使用缓存结果，只判别未知的陈述
+
+        Args:
+            query: 原始查询/新闻内容
+            evidence: 研究材料
+
+        Returns:
+            {"verdict": ..., "summary": ..., "claims": [...]}；无法拆分出陈述时返回 None
+        """
+        claims = self.extract_claims(query)
+        if not claims:
+            return None
+
+        known = self.cache.lookup(claims)
+        unknown = [claim for claim in claims if claim_key(claim) not in known]
+        logger.info(f"共 {len(claims)} 条陈述，命中缓存 {len(claims) - len(unknown)} 条，判别 {len(unknown)} 条")
+        if unknown:
+            judged = self.judge(query, unknown, evidence)
+            # 无法确定的结论也缓存（有效期较短），避免材料不足时反复判别
+            self.cache.store(judged)
+            known.update((claim_key(verdict.claim), verdict) for verdict in judged)
+
+        verdicts = [known[claim_key(claim)] for claim in claims]
+        summary = "\n".join(
+            f"- {verdict.claim}：{verdict.verdict}" + (f"（{verdict.reason}）" if verdict.reason else "")
+            for verdict in verdicts
+        )
+        return {
+            "verdict": aggregate_claims(verdicts),
+            "summary": summary,
+            "claims": [verdict.to_dict() for verdict in verdicts]
+        }
+
+
+_shared_cache: Optional[ClaimCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_claim_cache(path: Optional[str] = None) -> Optional[ClaimCache]:
+    """
+    获取进程内共享的陈述判别缓存（首次调用时打开）
+
+    Args:
+        path: 缓存文件路径，默认使用 CLAIM_CACHE_PATH
+
+    Returns:
+        ClaimCache实例；路径为空或无法打开时返回 None
+    """
+    global _shared_cache
+    path = CLAIM_CACHE_PATH if path is None else path
+    if not path:
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None or _shared_cache.path != path:
+            try:
+                _shared_cache = ClaimCache(path)
+                logger.info(f"陈述判别缓存: {path}（清理过期记录 {_shared_cache.purge_expired()} 条）")
+            except sqlite3.Error as e:
+                logger.warning(f"无法打开陈述判别缓存 {path}: {str(e)}")
+                return None
+        return _shared_cache
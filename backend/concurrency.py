@@ -0,0 +1,137 @@
+"""
+并发工具
+- 进程内共享的 LLM 并发限制器（LLM_MAX_CONCURRENCY），避免并行调用超过服务商的速率限制
+- 可取消的调用：上下文绑定取消信号后，信号一旦设置，经过限制器的调用不再开始（正在等待的也会退出）
+- 在线程池中并行执行并保持结果顺序，任务继承调用方的统计上下文
+"""
+
+import os
+import sys
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterable, Iterator, List, Optional, TypeVar
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from usage_tracker import bind_context
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# 等待限制器时检查取消信号的间隔（秒）
+CANCEL_POLL_INTERVAL = 0.05
+
+# 当前调用的取消信号（线程池中的任务通过 bind_context 继承）
+_cancel_event: ContextVar[Optional[threading.Event]] = ContextVar("cancel_event", default=None)
+
+
+@contextmanager
+def cancellable(event: threading.Event) -> Iterator[None]:
+    """
+    在上下文内绑定取消信号：event 设置后，上下文内（包括继承上下文的线程池任务）经过限制器的调用
+    不再获取名额，抛出 CancelledError；已经开始的调用不受影响
+
+    Args:
+        event: 取消信号
+    """
+    token = _cancel_event.set(event)
+    try:
+        yield
+    finally:
+        _cancel_event.reset(token)
+
+
+class ConcurrencyLimiter:
+    """限制同时进行的调用数量（可作为上下文管理器使用）"""
+
+    def __init__(self, limit: int, name: str = "limiter"):
+        """
+        初始化
+
+        Args:
+            limit: 最大并发数
+            name: 名称（用于日志与诊断）
+        """
+        self.limit = max(1, limit)
+        self.name = name
+        self._semaphore = threading.BoundedSemaphore(self.limit)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+
+    def __enter__(self) -> "ConcurrencyLimiter":
+        cancel = _cancel_event.get()
+        with self._lock:
+            self.waiting += 1
+        acquired = False
+        try:
+            # 绑定了取消信号时按间隔等待，以便在排队期间响应取消
+            while not acquired:
+                if cancel is not None and cancel.is_set():
+                    raise CancelledError(f"{self.name} 调用已取消")
+                acquired = self._semaphore.acquire(timeout=CANCEL_POLL_INTERVAL if cancel is not None else None)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+                if acquired:
+                    self.active += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        with self._lock:
+            self.active -= 1
+        self._semaphore.release()
+
+    def wrap(self, func: Callable[..., R]) -> Callable[..., R]:
+        """返回在限制器内执行的函数"""
+        def limited(*args, **kwargs):
+            with self:
+                return func(*args, **kwargs)
+        return limited
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "limit": self.limit, "active": self.active, "waiting": self.waiting}
+
+
+# 所有并行 LLM 调用共享的限制器
+llm_limiter = ConcurrencyLimiter(int(os.getenv("LLM_MAX_CONCURRENCY", "4")), name="llm")
+
+
+def map_concurrently(func: Callable[[T], R], items: Iterable[T], limiter: Optional[ConcurrencyLimiter] = None,
+                     max_workers: Optional[int] = None, return_exceptions: bool = False) -> List[Any]:
+    """
+    在线程池中并行执行 func，结果与输入顺序一致
+
+    Args:
+        func: 对单个元素执行的函数
+        items: 输入
+        limiter: 并发限制器（如 llm_limiter），为 None 时只受线程数限制
+        max_workers: 线程数，默认与限制器的并发数相同
+        return_exceptions: 为 True 时把异常作为结果返回，否则抛出第一个异常
+
+    Returns:
+        结果列表
+    """
+    items = list(items)
+    if not items:
+        return []
+    if limiter is not None:
+        func = limiter.wrap(func)
+        max_workers = max_workers or limiter.limit
+    max_workers = min(max_workers or len(items), len(items))
+
+    task = bind_context(func)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="map") as executor:
+        futures = [executor.submit(task, item) for item in items]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+        return results
@@ -0,0 +1,187 @@
+"""
+日期时间标准化
+使用一个预编译的分派正则识别搜索结果中常见的日期格式（ISO 8601、RFC 2822、中文日期等），
+统一转换为 UTC 的 YYYY-MM-DDTHH:MM:SS，并对重复出现的字符串做 LRU 缓存
+"""
+
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Optional
+
+
+# 缓存的不同日期字符串数量上限
+CACHE_SIZE = int(os.getenv("DATE_NORMALIZER_CACHE_SIZE", "65536"))
+
+_MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+
+# 常见时区缩写（RFC 2822 中出现的）；数据来源以中文媒体为主，CST 按中国标准时间（+08:00）处理
+_TZ_ABBREVIATIONS = {
+    "UT": 0, "UTC": 0, "GMT": 0, "Z": 0,
+    "EST": -300, "EDT": -240, "CST": 480, "CDT": -300,
+    "MST": -420, "MDT": -360, "PST": -480, "PDT": -420,
+    "CET": 60, "CEST": 120, "BST": 60, "JST": 540, "KST": 540,
+}
+
+_MONTH_NAMES = r'(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\.?'
+_TIME = r'(?P<{p}H>\d{{1,2}})[:：时](?P<{p}M>\d{{2}})分?(?:[:：](?P<{p}S>\d{{2}})秒?)?(?:\.\d+)?'
+_TZ = r'\s*(?P<{p}tz>Z|[+-]\d{{2}}:?\d{{2}}|[+-]\d{{2}}\b|(?:UTC|GMT|UT)(?:[+-]\d{{1,2}}(?::?\d{{2}})?)?|[A-Z]{{3,4}}\b)?'
+
+# 分派正则：每个分支对应一类格式，分组名前缀区分分支
+_DISPATCH = re.compile(
+    # 纯数字时间戳（秒或毫秒）
+    r'^\s*(?P<epoch>\d{10}(?:\.\d+)?|\d{13})\s*$'
+    # ISO 8601 及 2025-11-10 / 2025/11/10 / 2025.11.10 等数字日期
+    r'|(?P<iY>\d{4})[-/.](?P<im>\d{1,2})[-/.](?P<id>\d{1,2})'
+    r'(?:(?:T|\s+)' + _TIME.format(p="i") + _TZ.format(p="i") + r')?'
+    # 中文日期：2025年11月10日 08:00
+    r'|(?P<cY>\d{4})\s*年\s*(?P<cm>\d{1,2})\s*月\s*(?P<cd>\d{1,2})\s*[日号]'
+    r'(?:\s*(?:凌晨|早上|上午|中午|下午|傍晚|晚上)?\s*' + _TIME.format(p="c") + r')?'
+    # RFC 2822：Mon, 10 Nov 2025 08:00:00 GMT
+    r'|(?P<rd>\d{1,2})\s+(?P<rmon>' + _MONTH_NAMES + r')\s+(?P<rY>\d{4})'
+    r'(?:\s+' + _TIME.format(p="r") + _TZ.format(p="r") + r')?'
+    # 英文月份在前：Nov 10, 2025 08:00 AM
+    r'|(?P<amon>' + _MONTH_NAMES + r')\s+(?P<ad>\d{1,2}),?\s+(?P<aY>\d{4})'
+    r'(?:\s+(?:at\s+)?' + _TIME.format(p="a") + r'(?:\s*(?P<aampm>[AaPp][Mm]))?' + _TZ.format(p="a") + r')?',
+    re.IGNORECASE
+)
+
+# 日期前可以出现的星期（RFC 2822 等格式）
+_WEEKDAY_PREFIX = re.compile(r'\s*(?:Mon|Tue|Wed|Thu|Fri|Sat|Sun)[a-z]*\.?,?\s*', re.IGNORECASE)
+
+# 中文时段：这些时段里 12 点以前的钟点数按下午计
+_AFTERNOON_MARKERS = ("下午", "傍晚", "晚上")
+
+
+def _is_ascii_word(char: str) -> bool:
+    return char.isascii() and char.isalnum()
+
+
+def _is_date_token(match: "re.Match", date_str: str) -> bool:
+    """
+    分派正则的匹配是否是一个完整的日期：位于字符串开头（可带星期）时接受各种格式；
+    嵌在文本中时前后不能紧挨英文字母或数字，并且只接受形态明确的日期（中文日期、英文月份、以 - 分隔的数字日期），
+    避免把 "version 2025.1.2" 之类的版本号当成日期
+    """
+    start, end = match.span()
+    if end < len(date_str) and _is_ascii_word(date_str[end]):
+        return False
+    if start == 0 or _WEEKDAY_PREFIX.fullmatch(date_str[:start]):
+        return True
+    if _is_ascii_word(date_str[start - 1]) or date_str[start - 1] in "./-":
+        return False
+    if match.group("iY"):
+        return date_str[match.end("iY")] == "-"
+    return True
+
+
+def _parse_offset(tz: Optional[str]) -> Optional[int]:
+    """把时区描述转换为相对 UTC 的分钟数，未知或未提供时返回 None"""
+    if not tz:
+        return None
+    tz = tz.strip().upper()
+    if tz in _TZ_ABBREVIATIONS:
+        return _TZ_ABBREVIATIONS[tz]
+    for prefix in ("UTC", "GMT", "UT"):
+        if tz.startswith(prefix):
+            tz = tz[len(prefix):]
+            break
+    match = re.fullmatch(r'([+-])(\d{1,2}):?(\d{2})?', tz)
+    if not match:
+        return None
+    sign = -1 if match.group(1) == "-" else 1
+    return sign * (int(match.group(2)) * 60 + int(match.group(3) or 0))
+
+
+def _to_utc_string(year: int, month: int, day: int, hour: int, minute: int, second: int,
+                   offset_minutes: Optional[int], default_offset_minutes: int) -> Optional[str]:
+    """组装为 UTC 字符串；日期非法时返回 None"""
+    if not 1900 <= year <= 2100:
+        return None
+    try:
+        dt = datetime(year, month, day, hour, minute, second)
+    except ValueError:
+        return None
+    offset = default_offset_minutes if offset_minutes is None else offset_minutes
+    if offset:
+        dt -= timedelta(minutes=offset)
+    return dt.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _normalize_string(date_str: str, default_offset_minutes: int) -> Optional[str]:
+    match = next((found for found in _DISPATCH.finditer(date_str) if _is_date_token(found, date_str)), None)
+    if not match:
+        return None
+    groups = match.groupdict()
+
+    if groups["epoch"]:
+        value = float(groups["epoch"])
+        if len(groups["epoch"]) == 13:
+            value /= 1000.0
+        return datetime.fromtimestamp(value, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+
+    for prefix, year_key in (("i", "iY"), ("c", "cY"), ("r", "rY"), ("a", "aY")):
+        if groups[year_key]:
+            break
+
+    if prefix == "r":
+        month = _MONTHS[groups["rmon"][:3].lower()]
+        day = int(groups["rd"])
+    elif prefix == "a":
+        month = _MONTHS[groups["amon"][:3].lower()]
+        day = int(groups["ad"])
+    else:
+        month = int(groups[f"{prefix}m"])
+        day = int(groups[f"{prefix}d"])
+
+    hour = int(groups[f"{prefix}H"] or 0)
+    minute = int(groups[f"{prefix}M"] or 0)
+    second = int(groups[f"{prefix}S"] or 0)
+
+    if prefix == "a" and groups["aampm"]:
+        is_pm = groups["aampm"].lower() == "pm"
+        hour = hour % 12 + (12 if is_pm else 0)
+    if prefix == "c" and hour < 12:
+        text = match.group(0)
+        if any(marker in text for marker in _AFTERNOON_MARKERS) or ("中午" in text and hour < 11):
+            hour += 12
+
+    # 只有日期没有时间的值不做时区换算，避免日期被移到前一天
+    has_time = groups[f"{prefix}H"] is not None
+    offset = _parse_offset(groups.get(f"{prefix}tz")) if has_time else 0
+    return _to_utc_string(int(groups[year_key]), month, day, hour, minute, second,
+                          offset, default_offset_minutes if has_time else 0)
+
+
+def normalize_datetime(value: Any, default_offset_minutes: int = 0) -> Optional[str]:
+    """
+    标准化日期时间为 UTC 的 YYYY-MM-DDTHH:MM:SS
+
+    Args:
+        value: 日期字符串、datetime 对象或 Unix 时间戳
+        default_offset_minutes: 没有时区信息的时间相对 UTC 的偏移（分钟），默认按 UTC 处理
+
+    Returns:
+        标准化后的字符串，无法识别时返回 None
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.strftime("%Y-%m-%dT%H:%M:%S")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str):
+        return None
+    return _normalize_string(value.strip(), default_offset_minutes)
+
+
+def cache_info():
+    """返回 LRU 缓存的命中统计"""
+    return _normalize_string.cache_info()
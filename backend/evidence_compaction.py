@@ -0,0 +1,283 @@
+"""
+证据压缩
+研究状态中的 search_history 在各段落间大量重复（同一链接、转载的同一内容），单条可达上万字。
+在调用判别、Mermaid 生成等下游 LLM 之前，按规范化 URL 与内容摘要去重，用本地 BM25 按查询给段落打分，
+把得分最高的证据装入可配置的 token 预算，缩短提示词（以及随之而来的延迟与成本）
+"""
+
+import hashlib
+import math
+import os
+import re
+import sys
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from claim_cache import normalize_claim
+from url_utils import canonicalize_url
+from usage_tracker import estimate_tokens
+from verification_store import normalize_text
+
+
+# 下游 LLM 输入的证据 token 预算，0 表示不压缩
+EVIDENCE_TOKEN_BUDGET = int(os.getenv("EVIDENCE_TOKEN_BUDGET", "4000"))
+
+# 切分证据段落的目标长度（字符）
+PASSAGE_TARGET_CHARS = int(os.getenv("EVIDENCE_PASSAGE_CHARS", "400"))
+
+# 每个来源最多选取的段落数（避免单一来源占满预算）
+MAX_PASSAGES_PER_SOURCE = int(os.getenv("EVIDENCE_MAX_PASSAGES_PER_SOURCE", "3"))
+
+# 来源存在时报告摘录最多占用的预算比例（其余留给来源原文）
+REPORT_BUDGET_SHARE = float(os.getenv("EVIDENCE_REPORT_SHARE", "0.5"))
+
+# BM25 参数
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TERMS = re.compile(r"[a-z0-9\u00c0-\u024f]+|[\u3400-\u9fff\uf900-\ufaff]+")
+_CJK = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]")
+_BLANK_LINES = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[。！？；!?;])|(?<=\.)\s")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    BM25 使用的词项（保留重复）：英文与数字按单词，中文按相邻字符二元组（单字时为该字）
+    """
+    terms = []
+    for run in _TERMS.findall(normalize_text(text)):
+        if _CJK.match(run) and len(run) > 1:
+            terms.extend(run[index:index + 2] for index in range(len(run) - 1))
+        else:
+            terms.append(run)
+    return terms
+
+
+def content_hash(text: Optional[str]) -> str:
+    """内容摘要（规范化文本的 SHA-1），用于识别不同链接下的相同内容"""
+    return hashlib.sha1(normalize_claim(text or "").encode("utf-8")).hexdigest()
+
+
+def split_passages(text: Optional[str], target_chars: int = PASSAGE_TARGET_CHARS) -> List[str]:
+    """
+    把文本切分为接近 target_chars 的段落：相邻的短段落合并，超长段落按句子切分
+
+    Args:
+        text: 文本
+        target_chars: 目标长度（字符）
+
+    Returns:
+        段落列表
+    """
+    pieces = []
+    for block in _BLANK_LINES.split(text or ""):
+        block = block.strip()
+        if not block:
+            continue
+        if len(block) <= target_chars:
+            pieces.append(block)
+            continue
+        sentence = ""
+        for part in _SENTENCE_END.split(block):
+            if sentence and len(sentence) + len(part) > target_chars:
+                pieces.append(sentence.strip())
+                sentence = ""
+            sentence += part
+            while len(sentence) > target_chars * 2:
+                # 没有句读的超长文本按长度硬切
+                pieces.append(sentence[:target_chars].strip())
+                sentence = sentence[target_chars:]
+        if sentence.strip():
+            pieces.append(sentence.strip())
+
+    passages, current = [], ""
+    for piece in pieces:
+        if current and len(current) + len(piece) > target_chars:
+            passages.append(current)
+            current = ""
+        current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        passages.append(current)
+    return passages
+
+
+def collect_sources(state_data: Optional[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int, int]:
+    """
+    从状态数据的 search_history 中收集来源，按规范化 URL 与内容摘要去重
+
+    Args:
+        state_data: Agent 状态数据（包含 paragraphs）
+
+    Returns:
+        (去重后的来源列表 [{"title", "url", "content"}], 去重前的来源数, 去重前的 token 数)
+    """
+    sources, seen_urls, seen_contents, total, tokens = [], set(), set(), 0, 0
+    for paragraph in (state_data or {}).get("paragraphs") or []:
+        for search in (paragraph.get("research") or {}).get("search_history") or []:
+            content = (search.get("content") or "").strip()
+            if not content:
+                continue
+            total += 1
+            tokens += estimate_tokens(content)
+            url = search.get("url") or ""
+            url_key = canonicalize_url(url) if url else ""
+            digest = content_hash(content)
+            if (url_key and url_key in seen_urls) or digest in seen_contents:
+                continue
+            if url_key:
+                seen_urls.add(url_key)
+            seen_contents.add(digest)
+            sources.append({"title": (search.get("title") or "").strip(), "url": url, "content": content})
+    return sources, total, tokens
+
+
+class BM25:
+    """对一组段落按查询打分的 Okapi BM25"""
+
+    def __init__(self, documents: List[List[str]], k1: float = BM25_K1, b: float = BM25_B):
+        """
+        初始化
+
+        Args:
+            documents: 各段落的词项列表
+            k1: 词频饱和参数
+            b: 长度归一化参数
+        """
+        self.k1 = k1
+        self.b = b
+        self._frequencies = [Counter(terms) for terms in documents]
+        self._lengths = [len(terms) for terms in documents]
+        self._average_length = (sum(self._lengths) / len(documents)) if documents else 0.0
+        document_frequency = Counter(term for frequencies in self._frequencies for term in frequencies)
+        count = len(documents)
+        self._idf = {
+            term: math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequency.items()
+        }
+
+    def scores(self, query_terms: List[str]) -> List[float]:
+        """各段落对查询的得分"""
+        terms = set(query_terms)
+        results = []
+        for frequencies, length in zip(self._frequencies, self._lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self._average_length) if self._average_length else self.k1
+            score = 0.0
+            for term in terms:
+                frequency = frequencies.get(term)
+                if frequency:
+                    score += self._idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            results.append(score)
+        return results
+
+
+def compact_evidence(query: str, report: str, state_data: Optional[Dict[str, Any]] = None,
+                     budget: Optional[int] = None) -> Dict[str, Any]:
+    """
+    把报告与研究来源压缩为不超过 token 预算的证据文本
+
+    报告与去重后的来源一起切分为段落，按 BM25 得分从高到低装入预算
+    （报告摘录最多占 REPORT_BUDGET_SHARE，每个来源最多 MAX_PASSAGES_PER_SOURCE 段），输出时报告摘录在前，来源按编号分组、段落保持原文顺序
+
+    Args:
+        query: 原始查询/新闻内容
+        report: 研究报告
+        state_data: Agent 状态数据（包含 search_history），可选
+        budget: token 预算，默认使用 EVIDENCE_TOKEN_BUDGET
+
+    Returns:
+        {"text": 证据文本, "tokens": 估算 token 数, "original_tokens": 压缩前的 token 数,
+         "passages": 选中段落数, "candidates": 候选段落数, "sources": 引用的来源数, "duplicates": 去掉的重复来源数}
+    """
+    budget = EVIDENCE_TOKEN_BUDGET if budget is None else budget
+    sources, total_sources, source_tokens = collect_sources(state_data)
+    original_tokens = estimate_tokens(report) + source_tokens
+
+    # 候选段落：(来源序号，0 表示报告；原文顺序；文本)，相同内容的段落只保留一次
+    candidates, seen = [], set()
+    for origin, text in [(0, report)] + [(number, source["content"]) for number, source in enumerate(sources, start=1)]:
+        for order, passage in enumerate(split_passages(text)):
+            digest = content_hash(passage)
+            if digest not in seen:
+                seen.add(digest)
+                candidates.append((origin, order, passage))
+
+    ranking = BM25([tokenize(passage) for _, _, passage in candidates]).scores(tokenize(query))
+    ranked = sorted(range(len(candidates)), key=lambda index: (-ranking[index], index))
+
+    header_tokens = {number: estimate_tokens(f"[{number}] {source['title']} ({source['url']})")
+                     for number, source in enumerate(sources, start=1)}
+    selected, chosen, per_source = [], set(), Counter()
+    used = report_used = 0
+    # 第一轮报告摘录最多占用 REPORT_BUDGET_SHARE 的预算，为来源原文留出空间；第二轮用剩余预算补足
+    report_cap = budget * REPORT_BUDGET_SHARE if sources else budget
+    for capped in (True, False):
+        for index in ranked:
+            origin, _, passage = candidates[index]
+            if index in chosen or (origin and per_source[origin] >= MAX_PASSAGES_PER_SOURCE):
+                continue
+            cost = estimate_tokens(passage) + (header_tokens[origin] if origin and not per_source[origin] else 0)
+            if budget > 0 and used + cost > budget:
+                continue
+            if capped and not origin and budget > 0 and report_used + cost > report_cap:
+                continue
+            selected.append(index)
+            chosen.add(index)
+            per_source[origin] += 1
+            used += cost
+            if not origin:
+                report_used += cost
+
+    groups: Dict[int, List[Tuple[int, str]]] = {}
+    for index in selected:
+        origin, order, passage = candidates[index]
+        groups.setdefault(origin, []).append((order, passage))
+
+    blocks = []
+    if groups.get(0):
+        blocks.append("## 研究报告摘录\n\n" + "\n\n".join(passage for _, passage in sorted(groups[0])))
+    cited = [origin for origin in sorted(groups) if origin]
+    if cited:
+        blocks.append("## 参考来源")
+        for origin in cited:
+            source = sources[origin - 1]
+            heading = f"[{origin}] {source['title'] or '无标题'}" + (f" ({source['url']})" if source["url"] else "")
+            blocks.append(heading + "\n" + "\n\n".join(passage for _, passage in sorted(groups[origin])))
+    text = "\n\n".join(blocks)
+
+    return {
+        "text": text,
+        "tokens": estimate_tokens(text),
+        "original_tokens": original_tokens,
+        "passages": len(selected),
+        "candidates": len(candidates),
+        "sources": len(cited),
+        "duplicates": total_sources - len(sources)
+    }
+
+
+def compact_for_prompt(query: str, report: str, state_data: Optional[Dict[str, Any]] = None,
+                       budget: Optional[int] = None) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    下游 LLM 调用的输入：报告未超出预算（或未启用压缩）时原样返回，否则返回压缩后的证据
+
+    Args:
+        query: 原始查询/新闻内容
+        report: 研究报告
+        state_data: Agent 状态数据，可选
+        budget: token 预算，默认使用 EVIDENCE_TOKEN_BUDGET
+
+    Returns:
+        (输入文本, 压缩统计；未压缩时为 None)
+    """
+    budget = EVIDENCE_TOKEN_BUDGET if budget is None else budget
+    if budget <= 0 or estimate_tokens(report) <= budget:
+        return report, None
+    evidence = compact_evidence(query, report, state_data, budget)
+    if not evidence["text"]:
+        return report, None
+    stats = {key: value for key, value in evidence.items() if key != "text"}
+    stats["budget"] = budget
+    return evidence["text"], stats
@@ -0,0 +1,79 @@
+"""
+响应字段投影
+解析 fields= 参数（逗号分隔的点路径，如 task.status,verification.verdict），
+只计算并序列化调用方需要的字段
+"""
+
+from typing import Dict, Any, Optional
+
+
+# 无论是否请求都会保留的顶层字段
+ALWAYS_INCLUDED = ("success", "error")
+
+FieldSpec = Dict[str, Any]
+
+
+def parse_fields(value: Optional[str]) -> Optional[FieldSpec]:
+    """
+    解析 fields 参数
+
+    Args:
+        value: 逗号分隔的字段路径，如 "task.status,timeline.date"；为空时表示不做投影
+
+    Returns:
+        嵌套的字段树（叶子为空字典），不做投影时返回 None
+
+    Raises:
+        ValueError: 字段路径无效
+    """
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        value = ",".join(value)
+    paths = [path.strip() for path in str(value).split(",") if path.strip()]
+    if not paths:
+        return None
+
+    spec: FieldSpec = {}
+    for path in paths:
+        parts = path.split(".")
+        if any(not part.strip() for part in parts):
+            raise ValueError(f"无效的字段路径: {path}")
+        node = spec
+        for part in parts:
+            node = node.setdefault(part.strip(), {})
+    return spec
+
+
+def _project_value(value: Any, spec: FieldSpec) -> Any:
+    """按字段树裁剪值（列表逐项裁剪，叶子节点保留完整的值）"""
+    if not spec:
+        return value
+    if isinstance(value, dict):
+        return {key: _project_value(value[key], child) for key, child in spec.items() if key in value}
+    if isinstance(value, list):
+        return [_project_value(item, spec) for item in value]
+    return value
+
+
+def project(data: Dict[str, Any], spec: Optional[FieldSpec]) -> Dict[str, Any]:
+    """
+    对响应字典做字段投影
+
+    顶层的值可以是无参函数，只有被请求时才会调用（用于跳过大字段的计算与序列化）
+
+    Args:
+        data: 响应字典
+        spec: parse_fields 返回的字段树，None 表示返回全部字段
+
+    Returns:
+        投影后的字典
+    """
+    result = {}
+    for key, value in data.items():
+        if spec is not None and key not in spec and key not in ALWAYS_INCLUDED:
+            continue
+        if callable(value):
+            value = value()
+        result[key] = _project_value(value, spec.get(key, {}) if spec is not None else {})
+    return result
@@ -0,0 +1,145 @@
+"""
+HTTP 响应优化
+- 按 Accept-Encoding 协商 gzip / brotli 压缩（超过大小阈值的文本与 JSON 响应）
+- 基于任务版本号的强 ETag，内容未变化时返回 304 Not Modified
+"""
+
+import gzip
+import hashlib
+import os
+from typing import Any
+
+from flask import Flask, Response, request
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，未安装时只使用 gzip
+    brotli = None
+
+
+# 小于该字节数的响应不压缩
+COMPRESSION_MIN_SIZE = int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", "1024"))
+
+GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "5"))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+# 压缩后的表示使用不同的强 ETag（在原 ETag 后追加编码名）
+_ENCODING_SUFFIXES = ("", "-gzip", "-br")
+
+
+def _accepted_encodings(header: str) -> dict:
+    """解析 Accept-Encoding，返回 {编码: q 值}"""
+    encodings = {}
+    for part in header.split(","):
+        pieces = part.strip().split(";")
+        name = pieces[0].strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in pieces[1:]:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        encodings[name] = quality
+    return encodings
+
+
+def choose_encoding(accept_encoding: str) -> str:
+    """
+    根据 Accept-Encoding 选择压缩方式
+
+    Returns:
+        "br"、"gzip"，或空字符串表示不压缩
+    """
+    if not accept_encoding:
+        return ""
+    encodings = _accepted_encodings(accept_encoding)
+    wildcard = encodings.get("*", 0.0)
+    if brotli is not None and encodings.get("br", wildcard) > 0:
+        return "br"
+    if encodings.get("gzip", wildcard) > 0:
+        return "gzip"
+    return ""
+
+
+def compress_response(response: Response) -> Response:
+    """after_request 钩子：按协商结果压缩响应体"""
+    if (response.direct_passthrough
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or "Content-Encoding" in response.headers
+            or not (response.mimetype or "").startswith(COMPRESSIBLE_TYPES)):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(request.headers.get("Accept-Encoding", ""))
+    if not encoding:
+        return response
+
+    body = response.get_data()
+    if len(body) < COMPRESSION_MIN_SIZE:
+        return response
+
+    if encoding == "br":
+        compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f"{etag}-{encoding}")
+    return response
+
+
+def install_response_compression(app: Flask):
+    """为 Flask 应用启用响应压缩"""
+    app.after_request(compress_response)
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    根据版本信息与请求参数生成强 ETag
+
+    同一资源的不同查询参数（fields、分页等）对应不同的表示，因此查询字符串也参与计算
+
+    Args:
+        parts: 资源标识与版本号
+
+    Returns:
+        ETag 值（不含引号）
+    """
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(request.query_string)
+    return digest.hexdigest()[:24]
+
+
+def is_not_modified(etag: str) -> bool:
+    """请求的 If-None-Match 是否与 ETag（任意压缩表示）匹配"""
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return False
+    return any(if_none_match.contains(f"{etag}{suffix}") for suffix in _ENCODING_SUFFIXES)
+
+
+def not_modified_response(etag: str) -> Response:
+    """构造 304 响应（回显客户端缓存的那个表示的 ETag）"""
+    response = Response(status=304)
+    matched = [f"{etag}{suffix}" for suffix in _ENCODING_SUFFIXES if request.if_none_match.contains(f"{etag}{suffix}")]
+    response.set_etag(matched[0] if matched else etag)
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def with_etag(response: Response, etag: str) -> Response:
+    """给响应加上 ETag"""
+    response.set_etag(etag)
+    return response
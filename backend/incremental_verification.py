@@ -0,0 +1,174 @@
+"""
+增量判别
+研究进行中由研究过程监视器把 Agent 状态送入判别器：每个段落完成（research.is_completed 且已有总结）后
+立即在后台判别该段落的结论，研究结束时只剩汇总一步，判别不再额外占用一次完整的 LLM 往返
+"""
+
+import hashlib
+import os
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, Any, List, Optional, Tuple
+from loguru import logger
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from concurrency import llm_limiter
+from usage_tracker import bind_context
+from verification_service import VerificationService, UNKNOWN_VERDICT
+
+
+# 是否在研究过程中增量判别（关闭时在报告完成后整体判别）
+INCREMENTAL_VERIFICATION = os.getenv("VERIFICATION_INCREMENTAL", "1").lower() not in ("0", "false", "no")
+
+
+def paragraph_text(paragraph: Dict[str, Any]) -> str:
+    """段落中参与判别的文本：标题 + 最新总结"""
+    research = paragraph.get("research") or {}
+    summary = (research.get("latest_summary") or "").strip()
+    if not summary:
+        return ""
+    title = (paragraph.get("title") or "").strip()
+    return f"## {title}\n\n{summary}" if title else summary
+
+
+def paragraph_completed(paragraph: Dict[str, Any]) -> bool:
+    """段落是否已完成研究（完成后总结不再变化）"""
+    return bool((paragraph.get("research") or {}).get("is_completed"))
+
+
+class IncrementalVerifier:
+    """随研究进度逐段判别，研究结束后汇总"""
+
+    def __init__(self, service: VerificationService, query: str):
+        """
+        初始化（应在需要计入判别阶段的统计上下文中创建，后台判别会沿用该上下文）
+
+        Args:
+            service: 判别服务
+            query: 原始查询/新闻内容
+        """
+        self.service = service
+        self.query = query
+        self._executor = ThreadPoolExecutor(max_workers=llm_limiter.limit, thread_name_prefix="verify")
+        self._verify = bind_context(service.verify_section)
+        self._lock = threading.Lock()
+        # 段落序号 -> (文本摘要, 判别任务)；段落文本变化后旧的结果作废
+        self._jobs: Dict[int, Tuple[str, Future]] = {}
+
+    def ingest_state(self, state_data: Dict[str, Any]) -> int:
+        """
+        提交已完成但尚未判别的段落
+
+        Args:
+            state_data: Agent 状态数据（包含 paragraphs）
+
+        Returns:
+            新提交的段落数
+        """
+        submitted = 0
+        for index, paragraph in enumerate(state_data.get("paragraphs") or []):
+            if paragraph_completed(paragraph) and self._submit(index, paragraph_text(paragraph)):
+                submitted += 1
+        if submitted:
+            logger.debug(f"已提交 {submitted} 个完成的段落进行判别")
+        return submitted
+
+    def _submit(self, index: int, text: str) -> bool:
+        if not text:
+            return False
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            job = self._jobs.get(index)
+            if job is not None and job[0] == digest:
+                return False
+            self._jobs[index] = (digest, self._executor.submit(self._verify, self.query, text))
+            return True
+
+    def finalize(self, state_data: Optional[Dict[str, Any]], final_report: str, save_result: bool = False,
+                 output_dir: Optional[str] = None, task_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        研究结束后汇总：补交尚未判别（或判别失败、内容已变化）的段落，等待全部段落的结果后汇总
+
+        没有可判别的段落时对完整报告整体判别
+
+        Args:
+            state_data: 最终的 Agent 状态数据
+            final_report: 完整的研究报告
+            save_result: 是否保存判别结果到文件
+            output_dir: 输出目录
+            task_id: 关联的任务ID
+
+        Returns:
+            与 VerificationService.verify_news 格式相同的判别结果
+        """
+        try:
+            paragraphs = (state_data or {}).get("paragraphs") or []
+            texts = [paragraph_text(paragraph) for paragraph in paragraphs]
+            for index, text in enumerate(texts):
+                self._submit(index, text)
+                with self._lock:
+                    job = self._jobs.get(index)
+                if job is not None and job[1].done() and job[1].exception() is not None:
+                    # 失败的段落重试一次
+                    with self._lock:
+                        self._jobs.pop(index, None)
+                    self._submit(index, text)
+
+            with self._lock:
+                jobs = {index: job for index, job in self._jobs.items() if index < len(texts) and texts[index]}
+            if not jobs:
+                logger.info("没有可增量判别的段落，对完整报告进行判别")
+                return self.service.verify_news(self.query, final_report, save_result, output_dir, task_id)
+
+            ready = sum(1 for _, future in jobs.values() if future.done())
+            logger.info(f"研究结束时 {ready}/{len(jobs)} 个段落已完成判别，等待其余段落后汇总")
+            wait([future for _, future in jobs.values()])
+
+            section_results = self._section_results(paragraphs, texts, jobs)
+            if not section_results:
+                return self.service.verify_news(self.query, final_report, save_result, output_dir, task_id)
+
+            reduced = self.service.reduce_sections(self.query, section_results)
+            return self.service.build_result(self.query, reduced, save_result, output_dir, task_id)
+        finally:
+            self.close()
+
+    def _section_results(self, paragraphs: List[Dict[str, Any]], texts: List[str],
+                         jobs: Dict[int, Tuple[str, Future]]) -> List[Dict[str, Any]]:
+        section_results = []
+        for index in sorted(jobs):
+            future = jobs[index][1]
+            if future.exception() is not None:
+                logger.warning(f"第 {index + 1} 段判别失败: {str(future.exception())}")
+                continue
+            outcome = future.result()
+            section_results.append({
+                "section": index + 1,
+                "title": paragraphs[index].get("title") or "",
+                "length": len(texts[index]),
+                "verdict": outcome.get("verdict", UNKNOWN_VERDICT),
+                "summary": outcome.get("summary", "")
+            })
+        return section_results
+
+    def close(self):
+        """释放后台线程（未开始的判别任务会被取消）"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_incremental_verifier(service: VerificationService, query: str) -> Optional[IncrementalVerifier]:
+    """
+    创建增量判别器的便捷函数
+
+    Args:
+        service: 判别服务
+        query: 原始查询/新闻内容
+
+    Returns:
+        IncrementalVerifier实例；VERIFICATION_INCREMENTAL 关闭时返回 None
+    """
+    if not INCREMENTAL_VERIFICATION:
+        return None
+    return IncrementalVerifier(service, query)
@@ -0,0 +1,86 @@
+"""
+JSON 编解码
+优先使用 orjson（直接输出 UTF-8 字节，序列化 dataclass / datetime 无需中间字典），未安装时退回标准库 json。
+不依赖 Flask，服务端与客户端共用；Flask 的 JSON provider 见 json_provider.py
+"""
+
+import dataclasses
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时使用标准库
+    orjson = None
+
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj: Any) -> Any:
+    """处理两种后端都不能直接序列化的类型"""
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        # 标准库后端逐字段转换（orjson 原生支持 dataclass，不会走到这里）
+        return {field.name: getattr(obj, field.name) for field in dataclasses.fields(obj)}
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    to_dict = getattr(obj, "to_dict", None)
+    if callable(to_dict):
+        return to_dict()
+    tolist = getattr(obj, "tolist", None)  # numpy 标量与数组
+    if callable(tolist):
+        return tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """
+    序列化为 UTF-8 编码的 JSON 字节
+
+    Args:
+        obj: 要序列化的对象（支持 dataclass、datetime、set 以及带 to_dict 方法的对象）
+        indent: 是否缩进两格输出
+        sort_keys: 是否按键排序
+
+    Returns:
+        JSON 字节
+    """
+    if orjson is not None:
+        options = _ORJSON_OPTIONS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        if sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=_default, option=options)
+    return json.dumps(
+        obj,
+        default=_default,
+        ensure_ascii=False,
+        indent=2 if indent else None,
+        separators=None if indent else (",", ":"),
+        sort_keys=sort_keys
+    ).encode("utf-8")
+
+
+def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    """
+    解析 JSON
+
+    Raises:
+        ValueError: JSON 格式无效（orjson.JSONDecodeError 与 json.JSONDecodeError 都是其子类）
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
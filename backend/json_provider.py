@@ -0,0 +1,34 @@
+"""
+Flask JSON provider
+用 json_codec 替换 jsonify 与 request.get_json 的实现
+"""
+
+import os
+import sys
+from typing import Any, Union
+
+from flask import Flask
+from flask.json.provider import JSONProvider
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from json_codec import dumps, loads
+
+
+class FastJSONProvider(JSONProvider):
+    """使用 json_codec 的 Flask JSON provider（调试模式下缩进输出）"""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return dumps(obj, sort_keys=kwargs.get("sort_keys", False)).decode("utf-8")
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        return loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj, indent=self._app.debug), mimetype="application/json")
+
+
+def install_json_provider(app: Flask):
+    """为 Flask 应用启用快速 JSON 编解码"""
+    app.json = FastJSONProvider(app)
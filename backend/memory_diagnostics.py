@@ -0,0 +1,284 @@
+"""
+内存诊断服务
+统计任务对象与进程内缓存的内存占用，并基于 tracemalloc 提供快照与差异分析
+"""
+
+import importlib
+import os
+import sys
+import threading
+import tracemalloc
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from loguru import logger
+
+
+# 只保留最近的若干个快照，避免诊断工具本身造成内存增长
+MAX_SNAPSHOTS = 10
+
+# 进程内的 LRU 缓存：(名称, 模块, 函数名)
+LRU_CACHES = [
+    ("date_normalizer", "date_normalizer", "_normalize_string"),
+    ("canonicalize_url", "url_utils", "canonicalize_url"),
+]
+
+# 分配位置所属类别的判断规则（按顺序匹配文件路径）
+SITE_CATEGORIES = [
+    ("agent", ("@bettafish", "@deepsearchagent_demo")),
+    ("service", (os.path.dirname(os.path.abspath(__file__)),)),
+    ("library", ("site-packages", "dist-packages")),
+]
+
+
+def estimate_size(obj: Any) -> int:
+    """
+    估算对象及其引用的所有子对象占用的内存（字节）
+
+    Args:
+        obj: 任意 Python 对象
+
+    Returns:
+        估算的字节数（同一对象只计算一次）
+    """
+    if obj is None:
+        return 0
+
+    seen = set()
+    stack = [obj]
+    total = 0
+
+    while stack:
+        current = stack.pop()
+        obj_id = id(current)
+        if obj_id in seen:
+            continue
+        seen.add(obj_id)
+
+        try:
+            total += sys.getsizeof(current)
+        except TypeError:
+            continue
+
+        if isinstance(current, (str, bytes, bytearray, int, float, bool)):
+            continue
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif hasattr(current, "__dict__"):
+            stack.append(vars(current))
+
+    return total
+
+
+def get_process_rss() -> Optional[int]:
+    """
+    获取当前进程的常驻内存（RSS，字节）
+
+    Returns:
+        RSS 字节数，无法获取时返回 None
+    """
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        import resource
+        # Linux 上 ru_maxrss 的单位是 KB（此处为峰值，作为兜底）
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except Exception:
+        return None
+
+
+def lru_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    各 LRU 缓存的条目数、容量与命中情况
+
+    Returns:
+        名称 -> {"entries", "maxsize", "hits", "misses"}（模块无法导入时跳过）
+    """
+    stats = {}
+    for name, module_name, function_name in LRU_CACHES:
+        try:
+            info = getattr(importlib.import_module(module_name), function_name).cache_info()
+        except (ImportError, AttributeError):
+            continue
+        stats[name] = {"entries": info.currsize, "maxsize": info.maxsize, "hits": info.hits, "misses": info.misses}
+    return stats
+
+
+def _categorize_site(filename: str) -> str:
+    """根据文件路径判断分配位置所属类别"""
+    for category, patterns in SITE_CATEGORIES:
+        if any(pattern in filename for pattern in patterns):
+            return category
+    return "other"
+
+
+class MemoryDiagnostics:
+    """基于 tracemalloc 的内存快照管理"""
+
+    def __init__(self, nframes: int = 1, max_snapshots: int = MAX_SNAPSHOTS):
+        """
+        初始化内存诊断
+
+        Args:
+            nframes: tracemalloc 记录的调用栈深度
+            max_snapshots: 最多保留的快照数量
+        """
+        self.nframes = nframes
+        self.max_snapshots = max_snapshots
+        self._snapshots: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    def is_tracing(self) -> bool:
+        """是否正在追踪内存分配"""
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        """开始追踪内存分配（已在追踪时不做处理）"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.nframes)
+            logger.info(f"tracemalloc 已启动，调用栈深度: {self.nframes}")
+
+    def stop(self):
+        """停止追踪并清空已有快照"""
+        with self._lock:
+            self._snapshots.clear()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("tracemalloc 已停止")
+
+    def take_snapshot(self, label: str = "") -> Dict[str, Any]:
+        """
+        拍摄一个内存快照
+
+        Args:
+            label: 快照标签，便于识别
+
+        Returns:
+            快照摘要信息
+        """
+        self.start()
+        snapshot = self._filter(tracemalloc.take_snapshot())
+        current, peak = tracemalloc.get_traced_memory()
+
+        with self._lock:
+            self._counter += 1
+            snapshot_id = f"snapshot_{self._counter}"
+            info = {
+                "snapshot_id": snapshot_id,
+                "label": label,
+                "created_at": datetime.now().isoformat(),
+                "traced_current": current,
+                "traced_peak": peak,
+                "rss": get_process_rss()
+            }
+            self._snapshots[snapshot_id] = {"info": info, "snapshot": snapshot}
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+
+        logger.info(f"内存快照已创建: {snapshot_id} ({label})")
+        return info
+
+    def list_snapshots(self) -> List[Dict[str, Any]]:
+        """列出所有保留的快照摘要"""
+        with self._lock:
+            return [entry["info"] for entry in self._snapshots.values()]
+
+    def diff(self, from_id: str, to_id: Optional[str] = None,
+             limit: int = 20, group_by: str = "lineno") -> Dict[str, Any]:
+        """
+        比较两个快照，返回增长最多的分配位置
+
+        Args:
+            from_id: 起始快照ID
+            to_id: 结束快照ID，不提供时即时拍摄一个新快照
+            limit: 返回的分配位置数量
+            group_by: 分组方式（lineno/filename/traceback）
+
+        Returns:
+            差异结果字典
+
+        Raises:
+            KeyError: 快照不存在
+            ValueError: 分组方式无效
+        """
+        if group_by not in ("lineno", "filename", "traceback"):
+            raise ValueError(f"无效的分组方式: {group_by}")
+
+        with self._lock:
+            if from_id not in self._snapshots:
+                raise KeyError(from_id)
+            old = self._snapshots[from_id]
+
+        if to_id:
+            with self._lock:
+                if to_id not in self._snapshots:
+                    raise KeyError(to_id)
+                new = self._snapshots[to_id]
+        else:
+            info = self.take_snapshot(label="diff")
+            with self._lock:
+                new = self._snapshots[info["snapshot_id"]]
+
+        stats = new["snapshot"].compare_to(old["snapshot"], group_by)
+
+        top_sites = []
+        category_totals: Dict[str, int] = {}
+        for stat in stats:
+            frame = stat.traceback[0]
+            category = _categorize_site(frame.filename)
+            category_totals[category] = category_totals.get(category, 0) + stat.size_diff
+            if len(top_sites) < limit:
+                top_sites.append({
+                    "file": frame.filename,
+                    "line": frame.lineno,
+                    "category": category,
+                    "size_diff": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                    "size": stat.size,
+                    "count": stat.count,
+                    "traceback": [f"{f.filename}:{f.lineno}" for f in stat.traceback] if group_by == "traceback" else None
+                })
+
+        return {
+            "from": old["info"],
+            "to": new["info"],
+            "group_by": group_by,
+            "total_size_diff": sum(stat.size_diff for stat in stats),
+            "category_size_diff": category_totals,
+            "top_sites": top_sites
+        }
+
+    @staticmethod
+    def _filter(snapshot: tracemalloc.Snapshot) -> tracemalloc.Snapshot:
+        """过滤掉 tracemalloc 和导入机制自身的分配"""
+        return snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+
+def create_memory_diagnostics(nframes: Optional[int] = None) -> MemoryDiagnostics:
+    """
+    创建内存诊断实例的便捷函数
+
+    Args:
+        nframes: 调用栈深度，默认读取环境变量 MEMORY_TRACE_FRAMES（默认 1）
+
+    Returns:
+        MemoryDiagnostics实例
+    """
+    if nframes is None:
+        nframes = int(os.getenv("MEMORY_TRACE_FRAMES", "1"))
+    return MemoryDiagnostics(nframes=nframes)
@@ -0,0 +1,285 @@
+"""
+Mermaid Timeline 本地渲染、校验与修复
+- 直接把 TimelineService / TimelineIndex 生成的结构化时间线转换为 Mermaid timeline 代码，不调用 LLM
+- 按 Mermaid timeline 语法校验 LLM 生成的代码，并在本地修复（转义、整理 section、截断），避免重新生成
+"""
+
+import os
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+
+# 最多展示的日期数（按来源数量挑选，再按时间顺序排列）
+MAX_DATES = int(os.getenv("MERMAID_TIMELINE_MAX_DATES", "12"))
+
+# 每个日期最多展示的事件数（按相关度）
+MAX_EVENTS_PER_DATE = int(os.getenv("MERMAID_TIMELINE_MAX_EVENTS", "4"))
+
+# 单个事件与标题的最大长度（字符）
+MAX_EVENT_CHARS = 40
+MAX_TITLE_CHARS = 60
+
+# Mermaid 中有特殊含义的字符替换为全角形式：冒号分隔事件，分号与 # 会被当作语句分隔与实体编码
+_ESCAPES = str.maketrans({
+    ":": "：",
+    ";": "；",
+    "#": "＃",
+    "{": "（",
+    "}": "）",
+    "<": "＜",
+    ">": "＞",
+})
+_WHITESPACE = re.compile(r"\s+")
+
+INDENT = "    "
+
+# Mermaid timeline 语法（与其词法规则一致）：
+# 事件以 ": " 开头（冒号后必须有空白，事件内部的冒号不能后接空白）；时间段不能包含 # ; :；
+# 标题不能包含 # ;；section 名称不能包含冒号
+_EVENT_SEPARATOR = re.compile(r":\s+|:$")
+_FORBIDDEN_IN_PERIOD = re.compile(r"[#;:]")
+_FORBIDDEN_IN_TITLE = re.compile(r"[#;]")
+_CODE_FENCE = re.compile(r"^\s*```")
+_HEADER = re.compile(r"^timeline(\s+(LR|TD))?$")
+_HTML = re.compile(r"[<>]")
+
+
+def escape_text(text: Optional[str], max_chars: int = MAX_EVENT_CHARS) -> str:
+    """
+    转换为可以安全放入 Mermaid timeline 的单行文本
+
+    Args:
+        text: 原始文本
+        max_chars: 最大长度，超出部分以省略号代替
+
+    Returns:
+        转义后的文本
+    """
+    text = _WHITESPACE.sub(" ", (text or "").replace("%%", "％％").translate(_ESCAPES)).strip()
+    if len(text) > max_chars:
+        text = text[:max_chars - 1].rstrip() + "…"
+    return text
+
+
+def render_mermaid_timeline(timeline_data: Dict[str, Any], title: Optional[str] = None,
+                            max_dates: Optional[int] = None, max_events: Optional[int] = None) -> str:
+    """
+    把结构化时间线渲染为 Mermaid timeline 代码
+
+    Args:
+        timeline_data: generate_timeline / TimelineIndex.snapshot 的返回值
+        title: 图表标题（如原始查询）
+        max_dates: 最多展示的日期数，默认使用 MAX_DATES
+        max_events: 每个日期最多展示的事件数，默认使用 MAX_EVENTS_PER_DATE
+
+    Returns:
+        Mermaid timeline 代码
+    """
+    max_dates = MAX_DATES if max_dates is None else max_dates
+    max_events = MAX_EVENTS_PER_DATE if max_events is None else max_events
+
+    days = [day for day in timeline_data.get("timeline") or [] if day.get("date_key") not in (None, "unknown")]
+    # 来源最多的日期优先（来源数相同时较新的优先），展示时按时间顺序排列
+    selected = sorted(days, key=lambda day: -(day.get("source_count") or 0))[:max_dates]
+    selected.sort(key=lambda day: day["date_key"])
+
+    lines = ["timeline"]
+    title = escape_text(title, MAX_TITLE_CHARS)
+    if title:
+        lines.append(f"{INDENT}title {title}")
+
+    for day in selected:
+        events = [escape_text(event.get("title")) for event in day.get("events") or []]
+        events = [event for event in events if event]
+        hidden = len(events) - max_events if len(events) > max_events else 0
+        events = events[:max_events]
+        if hidden:
+            events.append(f"另有 {hidden} 个事件")
+        if not events:
+            continue
+
+        lines.extend(_format_period(day["date_key"], events, INDENT))
+
+    return "\n".join(lines)
+
+
+def _format_period(period: str, events: List[str], indent: str) -> List[str]:
+    """时间段与其事件：第一个事件与时间段同行，其余事件以冒号对齐续行"""
+    lines = [f"{indent}{period} : {events[0]}"]
+    continuation = indent + " " * (len(period) + 1)
+    lines.extend(f"{continuation}: {event}" for event in events[1:])
+    return lines
+
+
+def validate_mermaid_timeline(code: Optional[str]) -> List[str]:
+    """
+    校验 Mermaid timeline 代码
+
+    Args:
+        code: Mermaid 代码
+
+    Returns:
+        错误列表（带行号），为空表示可以正常渲染
+    """
+    if not code or not code.strip():
+        return ["内容为空"]
+
+    errors = []
+    header_seen = False
+    title_seen = False
+    section_line = None  # 尚未出现时间段的 section 所在行号
+    in_period = False
+    event_count = 0
+
+    for number, raw in enumerate(code.splitlines(), start=1):
+        line = raw.strip()
+        if not line or line.startswith("%%"):
+            continue
+        if _CODE_FENCE.match(line):
+            errors.append(f"第 {number} 行: 包含代码块标记")
+            continue
+        if not header_seen:
+            if not _HEADER.match(line):
+                errors.append(f"第 {number} 行: 缺少 timeline 声明")
+            header_seen = True
+            if _HEADER.match(line):
+                continue
+        if _HTML.search(line):
+            errors.append(f"第 {number} 行: 包含 HTML 标记字符")
+
+        keyword, _, rest = line.partition(" ")
+        if keyword == "title":
+            if title_seen:
+                errors.append(f"第 {number} 行: 重复的 title")
+            if not rest.strip() or _FORBIDDEN_IN_TITLE.search(rest):
+                errors.append(f"第 {number} 行: title 为空或包含 # ;")
+            title_seen = True
+            continue
+        if keyword == "section":
+            if section_line is not None:
+                errors.append(f"第 {section_line} 行: section 下没有时间段")
+            if not rest.strip() or ":" in rest:
+                errors.append(f"第 {number} 行: section 名称为空或包含冒号")
+            section_line = number
+            in_period = False
+            continue
+
+        if line.startswith(":"):
+            if not in_period:
+                errors.append(f"第 {number} 行: 事件前没有时间段")
+            events = _EVENT_SEPARATOR.split(line[1:])
+        else:
+            match = _EVENT_SEPARATOR.search(line)
+            period = line[:match.start()] if match else line
+            if not match:
+                errors.append(f"第 {number} 行: 时间段缺少事件（事件需以 \": \" 分隔）")
+            elif _FORBIDDEN_IN_PERIOD.search(period):
+                errors.append(f"第 {number} 行: 时间段包含 # ; 或冒号")
+            events = _EVENT_SEPARATOR.split(line[match.end():]) if match else []
+            in_period = True
+            section_line = None
+
+        if any(not event.strip() for event in events):
+            errors.append(f"第 {number} 行: 存在空事件")
+        event_count += sum(1 for event in events if event.strip())
+
+    if not header_seen:
+        errors.append("缺少 timeline 声明")
+    if section_line is not None:
+        errors.append(f"第 {section_line} 行: section 下没有时间段")
+    if header_seen and event_count == 0:
+        errors.append("没有任何事件")
+    return errors
+
+
+def repair_mermaid_timeline(code: Optional[str], max_events: Optional[int] = None) -> str:
+    """
+    按语法规则修复 Mermaid timeline 代码
+
+    去掉代码块标记与 timeline 声明之前的说明文字，转义文本中的特殊字符并截断过长的文本，
+    删除没有时间段的 section 与无法识别的行，每个时间段最多保留 max_events 个事件
+
+    Args:
+        code: Mermaid 代码
+        max_events: 每个时间段最多保留的事件数，默认使用 MAX_EVENTS_PER_DATE
+
+    Returns:
+        修复后的代码
+    """
+    max_events = MAX_EVENTS_PER_DATE if max_events is None else max_events
+    lines = [line.strip() for line in (code or "").splitlines()]
+    lines = [line for line in lines if line and not line.startswith("%%") and not _CODE_FENCE.match(line)]
+    headers = [index for index, line in enumerate(lines) if _HEADER.match(line)]
+    if headers:
+        lines = lines[headers[0] + 1:]
+
+    title = None
+    sections: List[Tuple[Optional[str], List[Tuple[str, List[str]]]]] = [(None, [])]
+    for line in lines:
+        keyword, _, rest = line.partition(" ")
+        if keyword == "title":
+            title = title or escape_text(rest, MAX_TITLE_CHARS)
+            continue
+        if keyword == "section":
+            name = escape_text(rest, MAX_TITLE_CHARS)
+            if name:
+                sections.append((name, []))
+            continue
+
+        periods = sections[-1][1]
+        if line.startswith(":"):
+            events = _EVENT_SEPARATOR.split(line[1:])
+            if not periods:
+                periods.append(("未注明时间", []))
+        else:
+            match = _EVENT_SEPARATOR.search(line)
+            if not match:
+                # 没有事件的行（多为说明文字）
+                continue
+            period = escape_text(line[:match.start()], MAX_EVENT_CHARS)
+            if not period:
+                continue
+            periods.append((period, []))
+            events = _EVENT_SEPARATOR.split(line[match.end():])
+        periods[-1][1].extend(event for event in (escape_text(text) for text in events) if event)
+
+    output = ["timeline"]
+    if title:
+        output.append(f"{INDENT}title {title}")
+    for name, periods in sections:
+        periods = [(period, events) for period, events in periods if events]
+        if not periods:
+            continue
+        indent = INDENT
+        if name is not None:
+            output.append(f"{INDENT}section {name}")
+            indent = INDENT * 2
+        for period, events in periods:
+            hidden = len(events) - max_events if len(events) > max_events else 0
+            events = events[:max_events] + ([f"另有 {hidden} 个事件"] if hidden else [])
+            output.extend(_format_period(period, events, indent))
+    return "\n".join(output)
+
+
+def ensure_valid_mermaid_timeline(code: Optional[str]) -> Tuple[str, Dict[str, Any]]:
+    """
+    校验 Mermaid timeline 代码，无法渲染时在本地修复
+
+    Args:
+        code: Mermaid 代码
+
+    Returns:
+        (可以渲染的代码, 校验结果)；校验结果包含 valid（原始代码是否有效）、errors（原始代码的错误）、
+        repaired（是否经过修复）与 remaining_errors（修复后仍存在的错误）
+    """
+    errors = validate_mermaid_timeline(code)
+    if not errors:
+        return code, {"valid": True, "errors": [], "repaired": False, "remaining_errors": []}
+
+    repaired = repair_mermaid_timeline(code)
+    return repaired, {
+        "valid": False,
+        "errors": errors,
+        "repaired": True,
+        "remaining_errors": validate_mermaid_timeline(repaired)
+    }
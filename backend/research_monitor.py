@@ -0,0 +1,100 @@
+"""
+研究过程监视器
+在后台线程中定期读取 Agent 的状态数据，把新产生的搜索结果送入增量时间线索引，
+使时间线在研究进行中即可查看，研究结束时也无需重新计算；
+同时可以把已完成的段落交给增量判别器，在研究进行中判别
+"""
+
+import os
+import sys
+import threading
+from typing import Dict, Any, Callable, Optional, TYPE_CHECKING
+from loguru import logger
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from timeline_index import TimelineIndex
+
+if TYPE_CHECKING:
+    from incremental_verification import IncrementalVerifier
+
+
+class ResearchMonitor:
+    """定期把 Agent 状态同步到时间线索引"""
+
+    def __init__(self, read_state: Callable[[], Optional[Dict[str, Any]]], index: TimelineIndex,
+                 interval: float = 2.0, verifier: Optional["IncrementalVerifier"] = None):
+        """
+        初始化
+
+        Args:
+            read_state: 读取当前状态数据的函数（返回包含 paragraphs 的字典）
+            index: 时间线索引
+            interval: 轮询间隔（秒）
+            verifier: 增量判别器（可选），已完成的段落会提交判别
+        """
+        self.read_state = read_state
+        self.index = index
+        self.interval = interval
+        self.verifier = verifier
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "ResearchMonitor":
+        """启动后台轮询线程"""
+        self._thread = threading.Thread(target=self._run, name="research-monitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止轮询，并做最后一次同步"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.poll()
+
+    def poll(self) -> int:
+        """
+        同步一次状态
+
+        Returns:
+            新增的搜索结果数量
+        """
+        try:
+            state_data = self.read_state()
+            if not state_data:
+                return 0
+            added = self.index.ingest_state(state_data)
+            if added:
+                logger.debug(f"时间线索引新增 {added} 条搜索结果（版本 {self.index.version}）")
+            if self.verifier is not None:
+                self.verifier.ingest_state(state_data)
+            return added
+        except Exception as e:
+            # Agent 正在修改状态时读取可能失败，下次轮询重试
+            logger.debug(f"读取研究状态失败，稍后重试: {str(e)}")
+            return 0
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.poll()
+
+
+def create_research_monitor(read_state: Callable[[], Optional[Dict[str, Any]]], index: TimelineIndex,
+                            interval: Optional[float] = None,
+                            verifier: Optional["IncrementalVerifier"] = None) -> ResearchMonitor:
+    """
+    创建并启动研究过程监视器的便捷函数
+
+    Args:
+        read_state: 读取当前状态数据的函数
+        index: 时间线索引
+        interval: 轮询间隔（秒），默认读取 TIMELINE_MONITOR_INTERVAL，未设置时为 2 秒
+        verifier: 增量判别器（可选）
+
+    Returns:
+        已启动的ResearchMonitor实例
+    """
+    if interval is None:
+        interval = float(os.getenv("TIMELINE_MONITOR_INTERVAL", "2.0"))
+    return ResearchMonitor(read_state, index, interval, verifier).start()
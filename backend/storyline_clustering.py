@@ -0,0 +1,180 @@
+"""
+故事线聚类
+把同一日期内讨论同一事件的报道归为一条故事线：字符二元组 TF-IDF + 余弦相似度 + 近邻图的连通分量，
+分词、加权与相似度计算全部在 NumPy / SciPy 稀疏矩阵上完成，不依赖任何模型
+"""
+
+import os
+import sys
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.sparse import csc_matrix
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from char_bigrams import bigram_codes, hash_codes
+from timeline_dedup import component_labels, group_by_label
+
+
+# 同一故事线的最小余弦相似度
+STORYLINE_SIMILARITY = float(os.getenv("TIMELINE_STORYLINE_SIMILARITY", "0.35"))
+
+# 每个文本只与相似度最高的 STORYLINE_NEIGHBORS 个文本相连（且不低于阈值），避免通过常用搭配把不同事件串成一条故事线
+STORYLINE_NEIGHBORS = int(os.getenv("TIMELINE_STORYLINE_NEIGHBORS", "3"))
+
+# 没有标题时参与计算的正文长度（字符）
+STORYLINE_CONTENT_CHARS = 200
+
+# 忽略组内出现在超过 max(MIN_PRUNE_DOCS, MAX_DOCUMENT_RATIO x 组内文档数) 篇文档中的二元组
+# （常用搭配区分度低，并且会使相似度矩阵变稠密）
+MAX_DOCUMENT_RATIO = 0.1
+MIN_PRUNE_DOCS = 20
+
+# 二元组哈希后的位数（特征空间大小为 2^STORYLINE_HASH_BITS，与文本数量无关）
+STORYLINE_HASH_BITS = 24
+
+# 相似度矩阵按行分块计算，每块只保留超过阈值的近邻
+SIMILARITY_CHUNK_ROWS = 4096
+
+# 选取近邻时相似度量化的位数
+SIMILARITY_RANK_BITS = 20
+
+
+def storyline_text(search: Any) -> str:
+    """
+    参与聚类的文本：标题，没有标题时使用正文开头
+
+    正文开头常是电头、导语等各家通用的套话（“记者从……获悉”），会把同一天的不同事件连在一起，
+    而同一事件的报道标题通常包含相同的人名、机构与地点
+    """
+    return search.get("title") or (search.get("content") or "")[:STORYLINE_CONTENT_CHARS]
+
+
+def _group_ids(groups: Optional[Sequence[Hashable]], count: int) -> np.ndarray:
+    """分组编号：整数数组直接使用，其余按首次出现的顺序编号"""
+    if groups is None:
+        return np.zeros(count, dtype=np.int64)
+    if isinstance(groups, np.ndarray) and groups.dtype.kind in "iu":
+        return groups.astype(np.int64)
+    ids: Dict[Hashable, int] = {}
+    return np.fromiter((ids.setdefault(group, len(ids)) for group in groups), dtype=np.int64, count=count)
+
+
+def tfidf_matrix(texts: Sequence[str], groups: Optional[Sequence[Hashable]] = None) -> csc_matrix:
+    """
+    计算字符二元组 TF-IDF 矩阵（行已做 L2 归一化）
+
+    二元组哈希到固定大小的特征空间；IDF 在每个分组内单独统计，并且不同分组的二元组映射到不同的列，
+    因此矩阵与自身转置的乘积只包含同组文档之间的相似度
+
+    Args:
+        texts: 文本列表
+        groups: 每个文本所属的分组（如日期，也可以是非负整数数组），None 表示全部属于同一组
+
+    Returns:
+        len(texts) 行的稀疏矩阵（按列压缩）
+    """
+    count = len(texts)
+    group_ids = _group_ids(groups, count)
+    docs, codes = bigram_codes(texts)
+    if codes.size == 0:
+        return csc_matrix((count, 0))
+
+    # (分组, 哈希后的二元组, 文档) 打包为一个整数排序一次：相同的键是同一文档中重复的二元组（词频），
+    # 同一 (分组, 二元组) 下的不同文档数即组内文档频率
+    doc_bits = max(int(count - 1).bit_length(), 1)
+    group_bits = max(int(group_ids.max()).bit_length(), 1)
+    hash_bits = min(STORYLINE_HASH_BITS, 63 - doc_bits - group_bits)
+    if hash_bits < 8:
+        raise ValueError("文本或分组数量过多")
+    hashed = hash_codes(codes, hash_bits)
+    keys = (((group_ids[docs].astype(np.uint64) << np.uint64(hash_bits)) | hashed) << np.uint64(doc_bits)) | docs.astype(np.uint64)
+    keys.sort()
+
+    pair_start = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    term_frequency = np.diff(np.append(pair_start, keys.size))
+    pairs = keys[pair_start]
+    pair_docs = (pairs & np.uint64((1 << doc_bits) - 1)).astype(np.int64)
+    features = pairs >> np.uint64(doc_bits)
+    column_start = np.concatenate(([True], features[1:] != features[:-1]))
+    columns = np.cumsum(column_start) - 1
+    document_frequency = np.diff(np.append(np.flatnonzero(column_start), features.size))[columns]
+
+    group_sizes = np.bincount(group_ids)[group_ids[pair_docs]]
+    idf = np.log((1.0 + group_sizes) / (1.0 + document_frequency)) + 1.0
+    weights = (1.0 + np.log(term_frequency)) * idf
+
+    keep = document_frequency <= np.maximum(MIN_PRUNE_DOCS, MAX_DOCUMENT_RATIO * group_sizes)
+    pair_docs, columns, weights = pair_docs[keep], columns[keep], weights[keep]
+
+    norms = np.sqrt(np.bincount(pair_docs, weights=weights * weights, minlength=count))
+    weights = weights / norms[pair_docs]
+    # 条目已按 (列, 文档) 排序，直接构造按列压缩的矩阵
+    column_pointers = np.concatenate(([0], np.cumsum(np.bincount(columns))))
+    return csc_matrix((weights, pair_docs, column_pointers), shape=(count, column_pointers.size - 1))
+
+
+def cluster_storylines(texts: Sequence[str], groups: Optional[Sequence[Hashable]] = None,
+                       threshold: Optional[float] = None,
+                       neighbors: Optional[int] = None) -> Tuple[List[List[int]], List[int]]:
+    """
+    把同一分组内相似的文本归为同一故事线
+
+    每个文本与同组中相似度不低于阈值的前 neighbors 个文本相连，故事线是该近邻图的连通分量
+
+    Args:
+        texts: 文本列表（顺序决定簇的顺序，簇内按输入顺序排列）
+        groups: 每个文本所属的分组（如日期，也可以是非负整数数组），None 表示全部属于同一组
+        threshold: 最小余弦相似度，默认使用 STORYLINE_SIMILARITY
+        neighbors: 每个文本最多连接的近邻数，默认使用 STORYLINE_NEIGHBORS
+
+    Returns:
+        (簇列表, 每个簇的代表下标)；簇为输入下标的列表，代表是与故事线内其他文本相似度之和最大的文本
+    """
+    count = len(texts)
+    if count == 0:
+        return [], []
+    threshold = STORYLINE_SIMILARITY if threshold is None else threshold
+    neighbors = STORYLINE_NEIGHBORS if neighbors is None else neighbors
+
+    matrix = tfidf_matrix(texts, groups)
+    # 按列压缩的矩阵转置后即为按行压缩，无需再转换
+    transposed = matrix.T
+    matrix = matrix.tocsr()
+    rows, cols, similarities = [], [], []
+    for start in range(0, count, SIMILARITY_CHUNK_ROWS):
+        block = matrix[start:start + SIMILARITY_CHUNK_ROWS] if count > SIMILARITY_CHUNK_ROWS else matrix
+        block = block @ transposed
+        block_rows = np.repeat(np.arange(start, start + block.shape[0]), np.diff(block.indptr))
+        linked = (block.data >= threshold) & (block_rows != block.indices)
+        block_rows, block_cols, block_data = block_rows[linked], block.indices[linked], block.data[linked]
+        # 近邻超过 neighbors 个的行只保留相似度最高的 neighbors 个：(块内行号, 量化的相似度倒序, 列) 打包为一个整数排序，
+        # 相似度相差不到 2^-SIMILARITY_RANK_BITS 时视为并列，取靠前的文本
+        crowded = np.bincount(block_rows - start, minlength=block.shape[0])[block_rows - start] > neighbors
+        if crowded.any():
+            crowded_rows, crowded_cols, crowded_data = block_rows[crowded], block_cols[crowded], block_data[crowded]
+            rank = np.rint((1.0 - np.minimum(crowded_data, 1.0)) * (1 << SIMILARITY_RANK_BITS)).astype(np.int64)
+            order = np.argsort((((crowded_rows - start) << (SIMILARITY_RANK_BITS + 1)) | rank) * count + crowded_cols)
+            crowded_rows, crowded_cols, crowded_data = crowded_rows[order], crowded_cols[order], crowded_data[order]
+            nearest = np.arange(crowded_rows.size) - np.searchsorted(crowded_rows, crowded_rows) < neighbors
+            rows.append(crowded_rows[nearest])
+            cols.append(crowded_cols[nearest])
+            similarities.append(crowded_data[nearest])
+            block_rows, block_cols, block_data = block_rows[~crowded], block_cols[~crowded], block_data[~crowded]
+        rows.append(block_rows)
+        cols.append(block_cols)
+        similarities.append(block_data)
+
+    rows, cols, similarities = np.concatenate(rows), np.concatenate(cols), np.concatenate(similarities)
+    # 分量标签是其中最小的下标，按标签分组即按首个成员的位置排序
+    labels = component_labels(count, rows, cols)
+    clusters = group_by_label(labels)
+
+    # 代表：与故事线内近邻的相似度之和最大的文本（并列时取靠前的）；
+    # 按 (故事线, 相似度之和倒序) 稳定排序后，每条故事线的第一个即为代表
+    centrality = np.bincount(rows, weights=similarities, minlength=count) \
+        + np.bincount(cols, weights=similarities, minlength=count)
+    ranked = np.lexsort((-centrality, labels))
+    representatives = ranked[np.flatnonzero(np.diff(labels[ranked], prepend=-1))].tolist()
+    return clusters, representatives
@@ -0,0 +1,273 @@
+"""
+时间线去重
+- 按规范化 URL 合并不同段落重复检索到的同一篇文章
+- 用 SimHash 聚合不同媒体转载的同一报道（标题/正文近似重复）
+
+指纹在来源进入时（merge_by_url / TimelineIndex.ingest）批量计算一次并保存在 search["simhash"] 中，
+聚类时按分段（LSH）分桶，只比较同一分组、同一分段桶里的候选，全部在 NumPy 数组上完成
+"""
+
+import os
+import sys
+from typing import Dict, Any, Hashable, List, Optional, Sequence
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from char_bigrams import bigram_codes, hash_codes, mix64
+from url_utils import canonicalize_url
+
+
+SIMHASH_BITS = 64
+
+# 参与计算指纹的正文长度（字符）
+SIMHASH_CONTENT_CHARS = 200
+
+# 判定为近似重复的最大汉明距离，分段索引要求 SIMHASH_BANDS > MAX_HAMMING_DISTANCE
+MAX_HAMMING_DISTANCE = 3
+SIMHASH_BANDS = 4
+
+# 二元组先哈希到 2^SIMHASH_BUCKET_BITS 个桶（每个桶有固定的 64 位随机签名），每批文本的计数矩阵与签名矩阵相乘即得到各位的加权和
+SIMHASH_BUCKET_BITS = 8
+SIMHASH_BUCKETS = 1 << SIMHASH_BUCKET_BITS
+
+# 每批计算指纹的文本数（计数矩阵为 SIMHASH_CHUNK_DOCS x SIMHASH_BUCKETS）
+SIMHASH_CHUNK_DOCS = 1024
+
+_BAND_WIDTH = SIMHASH_BITS // SIMHASH_BANDS
+_BAND_MASK = np.uint64((1 << _BAND_WIDTH) - 1)
+
+# 每个桶的签名：第 i 位为 1 时第 i 列为 +1，否则为 -1
+_BUCKET_SIGNS = np.unpackbits(
+    mix64(np.arange(SIMHASH_BUCKETS, dtype=np.uint64)).astype("<u8").view(np.uint8).reshape(-1, 8),
+    axis=1, bitorder="little"
+).astype(np.float32) * 2 - 1
+
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def simhash_many(texts: Sequence[str]) -> np.ndarray:
+    """
+    批量计算文本的 SimHash 指纹（字符二元组，按出现次数加权）
+
+    Args:
+        texts: 文本列表
+
+    Returns:
+        uint64 数组，空文本的指纹为 0
+    """
+    fingerprints = np.zeros(len(texts), dtype=np.uint64)
+    for first in range(0, len(texts), SIMHASH_CHUNK_DOCS):
+        chunk = texts[first:first + SIMHASH_CHUNK_DOCS]
+        docs, codes = bigram_codes(chunk)
+        buckets = hash_codes(codes, SIMHASH_BUCKET_BITS).astype(np.int64)
+        counts = np.bincount(docs * SIMHASH_BUCKETS + buckets, minlength=len(chunk) * SIMHASH_BUCKETS)
+        weights = counts.reshape(len(chunk), SIMHASH_BUCKETS).astype(np.float32) @ _BUCKET_SIGNS
+        packed = np.packbits(weights > 0, axis=1, bitorder="little")
+        fingerprints[first:first + len(chunk)] = packed.view("<u8").ravel()
+    return fingerprints
+
+
+def simhash(text: str) -> int:
+    """
+    计算单个文本的 SimHash 指纹
+
+    Args:
+        text: 文本
+
+    Returns:
+        64 位整数指纹，空文本返回 0
+    """
+    return int(simhash_many([text or ""])[0])
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """两个指纹之间的汉明距离"""
+    return bin(a ^ b).count("1")
+
+
+def fingerprint_text(search: Dict[str, Any]) -> str:
+    """参与计算指纹的文本：标题 + 正文开头"""
+    return f"{search.get('title') or ''} {(search.get('content') or '')[:SIMHASH_CONTENT_CHARS]}"
+
+
+def fingerprint_searches(searches: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """
+    搜索结果的指纹：已保存在 search["simhash"] 中的直接使用，其余批量计算后保存
+
+    Args:
+        searches: 搜索结果列表（原地修改）
+
+    Returns:
+        与输入对应的 uint64 指纹数组
+    """
+    values = [search.get("simhash") for search in searches]
+    if None in values:
+        missing = [index for index, value in enumerate(values) if value is None]
+        computed = simhash_many([fingerprint_text(searches[index]) for index in missing]).tolist()
+        for index, value in zip(missing, computed):
+            values[index] = searches[index]["simhash"] = value
+    return np.array(values, dtype=np.uint64)
+
+
+def merge_duplicate(existing: Dict[str, Any], search: Dict[str, Any]):
+    """
+    把同一篇文章的重复检索结果合并到已有条目：取最高的相关度，用重复项补齐缺失的字段，并记录命中的检索词
+
+    Args:
+        existing: 已有条目（原地修改）
+        search: 重复的搜索结果
+    """
+    if (search.get("score") or 0) > (existing.get("score") or 0):
+        existing["score"] = search.get("score")
+    for field in ("title", "content", "published_date", "timestamp", "website_name"):
+        if not existing.get(field) and search.get(field):
+            existing[field] = search[field]
+            if field in ("title", "content"):
+                # 参与指纹的文本变了，下次使用时重新计算
+                existing.pop("simhash", None)
+    query = search.get("query")
+    if query and query not in existing.setdefault("queries", []):
+        existing["queries"].append(query)
+
+
+def merge_by_url(searches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    按规范化 URL 合并重复的搜索结果，保留首次出现的顺序，并为去重后的结果计算指纹
+
+    Args:
+        searches: 搜索结果列表
+
+    Returns:
+        去重后的搜索结果列表
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    unique = []
+
+    for search in searches:
+        url = search.get("url") or ""
+        key = canonicalize_url(url) if url else f"#{len(unique)}"
+        existing = merged.get(key)
+        if existing is None:
+            search["canonical_url"] = key if url else ""
+            search["queries"] = [search["query"]] if search.get("query") else []
+            merged[key] = search
+            unique.append(search)
+            continue
+
+        merge_duplicate(existing, search)
+
+    fingerprint_searches(unique)
+    return unique
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    """uint64 数组每个元素中 1 的个数"""
+    return _POPCOUNT[values.astype("<u8").view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def component_labels(count: int, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    """
+    无向图的连通分量
+
+    每轮把每条边两端所在分量的根挂到较小的根上，再做指针跳跃直到每个节点都直接指向根，
+    没有跨分量的边时结束（轮数约为 O(log n)）
+
+    Args:
+        count: 节点数
+        rows: 边的一端
+        cols: 边的另一端
+
+    Returns:
+        每个节点所属分量中最小的节点下标
+    """
+    labels = np.arange(count)
+    while True:
+        row_labels, col_labels = labels[rows], labels[cols]
+        lower = np.minimum(row_labels, col_labels)
+        hooked = labels.copy()
+        np.minimum.at(hooked, row_labels, lower)
+        np.minimum.at(hooked, col_labels, lower)
+        while True:
+            jumped = hooked[hooked]
+            if np.array_equal(jumped, hooked):
+                break
+            hooked = jumped
+        if np.array_equal(hooked, labels):
+            return labels
+        labels = hooked
+
+
+def group_by_label(labels: np.ndarray) -> List[List[int]]:
+    """按分量标签分组下标，组按标签排序、组内保持下标顺序"""
+    members = np.argsort(labels, kind="stable")
+    starts = np.flatnonzero(np.diff(labels[members], prepend=-1)).tolist()
+    flat = members.tolist()
+    return [flat[start:end] for start, end in zip(starts, starts[1:] + [len(flat)])]
+
+
+def _group_ids(groups: Optional[Sequence[Hashable]], count: int) -> np.ndarray:
+    """分组编号：整数数组直接使用，其余按首次出现的顺序编号"""
+    if groups is None:
+        return np.zeros(count, dtype=np.uint64)
+    if isinstance(groups, np.ndarray) and groups.dtype.kind in "iu":
+        return groups.astype(np.uint64)
+    ids: Dict[Hashable, int] = {}
+    return np.fromiter((ids.setdefault(group, len(ids)) for group in groups), dtype=np.uint64, count=count)
+
+
+def cluster_near_duplicates(items: List[Dict[str, Any]], groups: Optional[Sequence[Hashable]] = None,
+                            max_distance: int = MAX_HAMMING_DISTANCE) -> List[List[int]]:
+    """
+    按 SimHash 聚合近似重复的条目，只在同一分组内聚合
+
+    指纹被切分为 SIMHASH_BANDS 段，汉明距离不超过 max_distance 的两个指纹至少有一段完全相同，
+    因此按 (分组, 分段值) 排序后只需比较同一个桶里的候选；指纹完全相同的条目先直接合并，不进入分桶比较
+
+    Args:
+        items: 条目列表（顺序决定每个簇的代表项，排在前面的作为代表）
+        groups: 每个条目所属的分组（如日期，也可以是非负整数数组），None 表示全部属于同一组
+        max_distance: 最大汉明距离
+
+    Returns:
+        簇列表（输入下标的列表），簇内与簇间都保持输入顺序
+    """
+    count = len(items)
+    if count < 2:
+        return [[index] for index in range(count)]
+
+    fingerprints = fingerprint_searches(items)
+    group_ids = _group_ids(groups, count)
+
+    # 指纹相同的条目排序后相邻，同组的直接连边；空文本（指纹为 0）不参与聚合。
+    # 只按指纹排序时不同分组的相同指纹可能交错，漏掉的同组条目仍会在下面的分桶比较中以距离 0 连上
+    order = np.argsort(fingerprints)
+    same = (fingerprints[order[1:]] == fingerprints[order[:-1]]) & (group_ids[order[1:]] == group_ids[order[:-1]])
+    same &= fingerprints[order[1:]] != 0
+    rows, cols = [order[1:][same]], [order[:-1][same]]
+    candidates = order[np.concatenate(([True], ~same))]
+    candidates = candidates[fingerprints[candidates] != 0]
+
+    for band in range(SIMHASH_BANDS):
+        band_values = (fingerprints[candidates] >> np.uint64(band * _BAND_WIDTH)) & _BAND_MASK
+        bucket_keys = (group_ids[candidates] << np.uint64(_BAND_WIDTH)) | band_values
+        bucket_order = np.argsort(bucket_keys)
+        members, bucket_keys = candidates[bucket_order], bucket_keys[bucket_order]
+        # 第 k 轮比较相距 k 的同桶条目；桶是连续的，相距 k 仍同桶的位置一定在上一轮的位置之中
+        active = np.arange(members.size - 1)
+        offset = 1
+        while active.size:
+            active = active[active + offset < members.size]
+            active = active[bucket_keys[active] == bucket_keys[active + offset]]
+            left, right = members[active], members[active + offset]
+            close = _popcount(fingerprints[left] ^ fingerprints[right]) <= max_distance
+            rows.append(left[close])
+            cols.append(right[close])
+            offset += 1
+
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    if not rows.size:
+        return [[index] for index in range(count)]
+    # 分量标签是其中最小的下标，按标签分组即按首个成员的位置排序
+    return group_by_label(component_labels(count, rows, cols))
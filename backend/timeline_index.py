@@ -0,0 +1,411 @@
+"""
+增量时间线索引
+在研究过程中逐条接收搜索结果，按日期分桶并在桶内按相关度有序插入，
+随时可以取出当前时间线快照；快照按版本缓存，只有发生变化的日期会被重新构建
+"""
+
+import base64
+import bisect
+import json
+import os
+import re
+import sys
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from timeline_service import TimelineService, create_timeline_service
+from timeline_dedup import merge_duplicate, fingerprint_searches
+from url_utils import canonicalize_url
+
+
+UNKNOWN_DATE = "unknown"
+
+# 日期桶分块存放时每块的目标大小
+BUCKET_CHUNK_SIZE = 256
+
+_DATE_PARAM = re.compile(r'^(\d{4})[-./](\d{1,2})[-./](\d{1,2})$')
+
+
+def parse_date_param(value: Optional[str]) -> Optional[str]:
+    """
+    解析日期过滤参数（YYYY-MM-DD 或 YYYY.MM.DD）
+
+    Raises:
+        ValueError: 日期格式无效
+    """
+    if not value:
+        return None
+    match = _DATE_PARAM.match(value.strip())
+    if not match:
+        raise ValueError(f"无效的日期: {value}，应为 YYYY-MM-DD")
+    year, month, day = match.groups()
+    return f"{year}-{int(month):02d}-{int(day):02d}"
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    """把分页状态（偏移量与过滤条件）编码为不透明的游标"""
+    payload = json.dumps(state, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def _is_count(value: Any, minimum: int) -> bool:
+    """是否为不小于 minimum 的整数（JSON 中的 true/false 不算）"""
+    return isinstance(value, int) and not isinstance(value, bool) and value >= minimum
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """
+    解码游标并校验各字段的类型（游标来自客户端，可能被篡改）
+
+    Returns:
+        {"offset": 非负整数, "start"/"end": YYYY-MM-DD 或 None, "top_k"/"limit": 正整数或 None}
+
+    Raises:
+        ValueError: 游标无效
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"无效的游标: {cursor}") from e
+    if not isinstance(state, dict) or not _is_count(state.get("offset"), 0):
+        raise ValueError(f"无效的游标: {cursor}")
+    for name in ("start", "end"):
+        value = state.get(name)
+        if value is not None and (not isinstance(value, str) or parse_date_param(value) != value):
+            raise ValueError(f"无效的游标: {cursor}")
+    for name in ("top_k", "limit"):
+        if state.get(name) is not None and not _is_count(state[name], 1):
+            raise ValueError(f"无效的游标: {cursor}")
+    return {name: state.get(name) for name in ("offset", "start", "end", "top_k", "limit")}
+
+
+class _DateBucket:
+    """
+    单个日期的搜索结果，按（相关度倒序，时间倒序，到达顺序）排列
+
+    分块有序列表：块内有序，块之间按各块最大键有序。插入与删除先在块的最大键上二分定位块，再在块内二分，
+    只移动该块内的元素（O(log n + BUCKET_CHUNK_SIZE)）；块超过 2 倍块大小时对半拆分，删空的块直接去掉
+    """
+
+    def __init__(self):
+        self._maxes: List[Tuple] = []
+        self._keys: List[List[Tuple]] = []
+        self._entries: List[List[Dict[str, Any]]] = []
+        self._size = 0
+        self.version = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def insert(self, key: Tuple, entry: Dict[str, Any]):
+        if not self._maxes:
+            self._maxes.append(key)
+            self._keys.append([key])
+            self._entries.append([entry])
+        else:
+            chunk = bisect.bisect_right(self._maxes, key)
+            if chunk == len(self._maxes):
+                chunk -= 1
+                self._maxes[chunk] = key
+            keys = self._keys[chunk]
+            position = bisect.bisect_right(keys, key)
+            keys.insert(position, key)
+            self._entries[chunk].insert(position, entry)
+            if len(keys) > 2 * BUCKET_CHUNK_SIZE:
+                self._split(chunk)
+        self._size += 1
+        self.version += 1
+
+    def remove(self, key: Tuple):
+        chunk = bisect.bisect_left(self._maxes, key)
+        keys = self._keys[chunk]
+        position = bisect.bisect_left(keys, key)
+        del keys[position]
+        del self._entries[chunk][position]
+        if keys:
+            self._maxes[chunk] = keys[-1]
+        else:
+            del self._maxes[chunk], self._keys[chunk], self._entries[chunk]
+        self._size -= 1
+        self.version += 1
+
+    def top(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """排在最前的 limit 个搜索结果（None 表示全部）"""
+        result = []
+        for entries in self._entries:
+            if limit and len(result) >= limit:
+                break
+            result.extend(entries)
+        return result[:limit] if limit else result
+
+    def _split(self, chunk: int):
+        keys, entries = self._keys[chunk], self._entries[chunk]
+        half = len(keys) // 2
+        self._keys[chunk:chunk + 1] = [keys[:half], keys[half:]]
+        self._entries[chunk:chunk + 1] = [entries[:half], entries[half:]]
+        self._maxes[chunk:chunk + 1] = [keys[half - 1], keys[-1]]
+
+
+class TimelineIndex:
+    """任务级的增量时间线索引（线程安全）"""
+
+    def __init__(self, service: Optional[TimelineService] = None, top_k: Optional[int] = None):
+        """
+        初始化
+
+        Args:
+            service: 用于日期处理和事件构建的时间线服务
+            top_k: 快照中每个日期默认保留的搜索结果数（按相关度），None 表示不限制
+        """
+        self.service = service or create_timeline_service()
+        self.top_k = top_k
+        self.version = 0
+        self.total_ingested = 0
+        self._lock = threading.RLock()
+        self._by_url: Dict[str, Dict[str, Any]] = {}
+        self._positions: Dict[int, Tuple[str, Tuple]] = {}
+        self._dates: List[str] = []  # 已知日期（升序，不含未知日期）
+        self._buckets: Dict[str, _DateBucket] = {}
+        self._consumed: Dict[int, int] = {}
+        self._sequence = 0
+        self._day_cache: Dict[Tuple[str, Optional[int]], Tuple[int, Dict[str, Any]]] = {}
+        self._snapshot_cache: Dict[Optional[int], Tuple[int, Dict[str, Any]]] = {}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._positions)
+
+    def ingest(self, searches: List[Dict[str, Any]]) -> int:
+        """
+        加入一批 search_history 记录
+
+        Args:
+            searches: 搜索记录列表
+
+        Returns:
+            新增的（按 URL 去重后）搜索结果数量
+        """
+        added = 0
+        touched = []
+        with self._lock:
+            for search in searches:
+                item = self.service._to_search_item(search)
+                url = item.get("url") or ""
+                canonical = canonicalize_url(url) if url else ""
+                existing = self._by_url.get(canonical) if canonical else None
+                self.total_ingested += 1
+
+                if existing is not None:
+                    # 合并后相关度或日期可能变化，按原到达顺序重新插入
+                    sequence = self._detach(existing)
+                    merge_duplicate(existing, item)
+                    self._attach(existing, sequence)
+                    touched.append(existing)
+                    continue
+
+                item["canonical_url"] = canonical
+                item["queries"] = [item["query"]] if item.get("query") else []
+                if canonical:
+                    self._by_url[canonical] = item
+                self._attach(item)
+                touched.append(item)
+                added += 1
+
+            # 新来源（以及补齐了标题或正文的已有来源）的指纹在这里批量计算一次，构建日期时直接使用
+            fingerprint_searches(touched)
+            if searches:
+                self.version += 1
+        return added
+
+    def ingest_state(self, state_data: Dict[str, Any]) -> int:
+        """
+        从状态数据中加入尚未处理过的搜索结果（可以对同一任务的状态反复调用）
+
+        Args:
+            state_data: 状态字典（包含 paragraphs 和 search_history）
+
+        Returns:
+            新增的搜索结果数量
+        """
+        added = 0
+        with self._lock:
+            for index, paragraph in enumerate(state_data.get("paragraphs") or []):
+                search_history = (paragraph.get("research") or {}).get("search_history") or []
+                consumed = self._consumed.get(index, 0)
+                if len(search_history) < consumed:
+                    # 段落的搜索历史被重置，重新读取（按 URL 去重，不会重复计入）
+                    consumed = 0
+                if len(search_history) > consumed:
+                    added += self.ingest(search_history[consumed:])
+                    self._consumed[index] = len(search_history)
+        return added
+
+    def _attach(self, item: Dict[str, Any], sequence: Optional[int] = None):
+        """处理日期并插入对应的日期桶，sequence 为到达顺序（相关度和时间相同时靠前的在前）"""
+        self.service._process_dates([item])
+        date_key = item.get("normalized_date") or UNKNOWN_DATE
+        normalized = item.get("normalized_datetime")
+        # 相关度与时间都按倒序排列，时间转换为数字以便取负
+        key = (
+            -(item.get("score") or 0),
+            -int(normalized.replace("-", "").replace("T", "").replace(":", "")) if normalized else 0,
+            self._sequence if sequence is None else sequence
+        )
+        if sequence is None:
+            self._sequence += 1
+
+        bucket = self._buckets.get(date_key)
+        if bucket is None:
+            bucket = self._buckets[date_key] = _DateBucket()
+            if date_key != UNKNOWN_DATE:
+                bisect.insort(self._dates, date_key)
+        bucket.insert(key, item)
+        self._positions[id(item)] = (date_key, key)
+
+    def _detach(self, item: Dict[str, Any]) -> int:
+        """从所在的日期桶中移除，返回其到达顺序"""
+        date_key, key = self._positions.pop(id(item))
+        self._buckets[date_key].remove(key)
+        return key[-1]
+
+    def snapshot(self, top_k: Optional[int] = None) -> Dict[str, Any]:
+        """
+        获取当前时间线（结构与 TimelineService.generate_timeline 的返回值一致）
+
+        Args:
+            top_k: 每个日期最多保留的搜索结果数，默认使用索引的 top_k
+
+        Returns:
+            时间线字典，附带索引版本号
+        """
+        top_k = top_k if top_k is not None else self.top_k
+        with self._lock:
+            cached = self._snapshot_cache.get(top_k)
+            if cached and cached[0] == self.version:
+                return cached[1]
+
+            date_keys = list(reversed(self._dates))
+            if UNKNOWN_DATE in self._buckets and len(self._buckets[UNKNOWN_DATE]):
+                date_keys.append(UNKNOWN_DATE)
+
+            timeline = []
+            for date_key in date_keys:
+                item = self._build_day(date_key, top_k)
+                if item:
+                    timeline.append(item)
+
+            known_dates = [d for d in self._dates if len(self._buckets[d])]
+            date_range = {
+                "start": self.service._format_display_date(known_dates[0]),
+                "end": self.service._format_display_date(known_dates[-1])
+            } if known_dates else None
+
+            result = {
+                "timeline": timeline,
+                "total_sources": len(self._positions),
+                "duplicates_removed": self.total_ingested - len(self._positions),
+                "date_range": date_range,
+                "version": self.version,
+                "message": "时间线生成成功" if timeline else "没有找到搜索结果"
+            }
+            self._snapshot_cache[top_k] = (self.version, result)
+            return result
+
+    def page(self, start: Optional[str] = None, end: Optional[str] = None, top_k: Optional[int] = None,
+             offset: int = 0, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        按日期范围与事件数量分页获取时间线
+
+        事件按时间线顺序（日期倒序，日期内按相关度）排列，offset/limit 以事件为单位；
+        范围之外的日期不会被构建
+
+        Args:
+            start: 起始日期（YYYY-MM-DD，含），指定范围时不包含未知日期
+            end: 结束日期（YYYY-MM-DD，含）
+            top_k: 每个日期最多保留的搜索结果数，默认使用索引的 top_k
+            offset: 跳过的事件数
+            limit: 本页最多返回的事件数，None 表示不限制
+
+        Returns:
+            时间线字典，附带 total_events、total_days、has_more 与 next_offset
+        """
+        top_k = top_k if top_k is not None else self.top_k
+        with self._lock:
+            low = bisect.bisect_left(self._dates, start) if start else 0
+            high = bisect.bisect_right(self._dates, end) if end else len(self._dates)
+            date_keys = list(reversed(self._dates[low:high]))
+            if not start and not end and UNKNOWN_DATE in self._buckets:
+                date_keys.append(UNKNOWN_DATE)
+
+            timeline = []
+            total_events = 0
+            total_days = 0
+            remaining = limit
+            for date_key in date_keys:
+                item = self._build_day(date_key, top_k)
+                if not item:
+                    continue
+                events = item["events"]
+                day_start = total_events
+                total_events += len(events)
+                total_days += 1
+
+                if day_start + len(events) <= offset or remaining == 0:
+                    continue
+                skip = max(0, offset - day_start)
+                selected = events[skip:skip + remaining] if remaining is not None else events[skip:]
+                if remaining is not None:
+                    remaining -= len(selected)
+                timeline.append({**item, "events": selected, "event_count": len(events)})
+
+            returned = sum(len(item["events"]) for item in timeline)
+            next_offset = offset + returned
+            known_dates = [d for d in date_keys if d != UNKNOWN_DATE and len(self._buckets[d])]
+
+            return {
+                "timeline": timeline,
+                "total_sources": len(self._positions),
+                "duplicates_removed": self.total_ingested - len(self._positions),
+                "date_range": {
+                    "start": self.service._format_display_date(known_dates[-1]),
+                    "end": self.service._format_display_date(known_dates[0])
+                } if known_dates else None,
+                "total_events": total_events,
+                "total_days": total_days,
+                "has_more": next_offset < total_events,
+                "next_offset": next_offset if next_offset < total_events else None,
+                "version": self.version,
+                "message": "时间线生成成功" if total_events else "没有找到搜索结果"
+            }
+
+    def _build_day(self, date_key: str, top_k: Optional[int]) -> Optional[Dict[str, Any]]:
+        """构建单个日期的时间线项，日期桶没有变化时直接使用缓存"""
+        bucket = self._buckets[date_key]
+        if not len(bucket):
+            return None
+        cached = self._day_cache.get((date_key, top_k))
+        if cached and cached[0] == bucket.version:
+            return cached[1]
+
+        item = self.service._build_timeline({date_key: bucket.top(top_k)})[0]
+        item["source_count"] = len(bucket)
+        self._day_cache[(date_key, top_k)] = (bucket.version, item)
+        return item
+
+
+def create_timeline_index(top_k: Optional[int] = None) -> TimelineIndex:
+    """
+    创建增量时间线索引的便捷函数
+
+    Args:
+        top_k: 每个日期默认保留的搜索结果数，默认读取 TIMELINE_TOP_K，未设置时不限制
+
+    Returns:
+        TimelineIndex实例
+    """
+    if top_k is None and os.getenv("TIMELINE_TOP_K"):
+        top_k = int(os.getenv("TIMELINE_TOP_K"))
+    return TimelineIndex(top_k=top_k)
@@ -5,20 +5,32 @@
 
 import os
 import sys
-from datetime import datetime
 from typing import Dict, Any, List, Optional
 from collections import defaultdict
+import numpy as np
 from loguru import logger
 
 # 添加路径以便导入
 sys.path.insert(0, os.path.dirname(__file__))
 
+from date_normalizer import normalize_datetime
+from timeline_dedup import merge_by_url, cluster_near_duplicates
+from storyline_clustering import cluster_storylines, storyline_text
+
 
 class TimelineService:
     """时间线生成服务"""
     
-    def __init__(self):
-        """初始化时间线服务"""
+    def __init__(self, default_tz_offset: Optional[int] = None):
+        """
+        初始化时间线服务
+        
+        Args:
+            default_tz_offset: 不带时区的时间相对 UTC 的偏移（分钟），默认读取 TIMELINE_DEFAULT_TZ_OFFSET，未设置时按 UTC 处理
+        """
+        if default_tz_offset is None:
+            default_tz_offset = int(os.getenv("TIMELINE_DEFAULT_TZ_OFFSET", "0"))
+        self.default_tz_offset = default_tz_offset
         logger.info("时间线服务已初始化")
     
     def generate_timeline(self, state_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -43,8 +55,11 @@ class TimelineService:
                     "message": "没有找到搜索结果"
                 }
             
+            # 合并不同段落重复检索到的同一篇文章
+            unique_searches = self._deduplicate_sources(all_searches)
+            
             # 处理日期并排序
-            processed_searches = self._process_dates(all_searches)
+            processed_searches = self._process_dates(unique_searches)
             
             # 按日期分组
             grouped_by_date = self._group_by_date(processed_searches)
@@ -57,7 +72,8 @@ class TimelineService:
             
             return {
                 "timeline": timeline,
-                "total_sources": len(all_searches),
+                "total_sources": len(unique_searches),
+                "duplicates_removed": len(all_searches) - len(unique_searches),
                 "date_range": date_range,
                 "message": "时间线生成成功"
             }
@@ -93,21 +109,43 @@ class TimelineService:
             search_history = research.get("search_history", [])
             
             for search in search_history:
-                # 转换为统一格式
-                search_item = {
-                    "title": search.get("title", ""),
-                    "url": search.get("url", ""),
-                    "content": search.get("content", ""),
-                    "score": search.get("score"),
-                    "published_date": search.get("published_date"),
-                    "timestamp": search.get("timestamp"),
-                    "website_name": search.get("website_name"),
-                    "query": search.get("query", "")
-                }
-                all_searches.append(search_item)
+                all_searches.append(self._to_search_item(search))
         
         return all_searches
     
+    def _to_search_item(self, search: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        将 search_history 中的一条记录转换为统一格式
+        
+        Args:
+            search: 搜索记录
+            
+        Returns:
+            统一格式的搜索结果
+        """
+        return {
+            "title": search.get("title", ""),
+            "url": search.get("url", ""),
+            "content": search.get("content", ""),
+            "score": search.get("score"),
+            "published_date": search.get("published_date"),
+            "timestamp": search.get("timestamp"),
+            "website_name": search.get("website_name"),
+            "query": search.get("query", "")
+        }
+    
+    def _deduplicate_sources(self, searches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        按规范化 URL 合并重复的搜索结果（去掉跟踪参数、锚点等差异）
+        
+        Args:
+            searches: 搜索结果列表
+            
+        Returns:
+            去重后的搜索结果列表
+        """
+        return merge_by_url(searches)
+    
     def _process_dates(self, searches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
         处理日期和时间信息，统一格式
@@ -123,22 +161,16 @@ class TimelineService:
         for search in searches:
             # 优先使用 published_date，如果没有则使用 timestamp
             date_str = search.get("published_date") or search.get("timestamp")
+            normalized_datetime = self._normalize_datetime(date_str) if date_str else None
             
-            if date_str:
-                # 尝试解析日期和时间
-                normalized_datetime = self._normalize_datetime(date_str)
-                if normalized_datetime:
-                    search["normalized_datetime"] = normalized_datetime
-                    search["normalized_date"] = normalized_datetime[:10]  # YYYY-MM-DD
-                    search["normalized_time"] = normalized_datetime[11:19] if len(normalized_datetime) > 10 else None  # HH:MM:SS
-                    search["display_date"] = self._format_display_date(normalized_datetime[:10])
-                    search["display_time"] = self._format_display_time(normalized_datetime[11:19]) if len(normalized_datetime) > 10 else None
-                else:
-                    search["normalized_datetime"] = None
-                    search["normalized_date"] = None
-                    search["normalized_time"] = None
-                    search["display_date"] = "未知日期"
-                    search["display_time"] = None
+            if normalized_datetime:
+                date_part = normalized_datetime[:10]  # YYYY-MM-DD
+                time_part = normalized_datetime[11:19]  # HH:MM:SS
+                search["normalized_datetime"] = normalized_datetime
+                search["normalized_date"] = date_part
+                search["normalized_time"] = time_part
+                search["display_date"] = self._format_display_date(date_part)
+                search["display_time"] = time_part[:5]
             else:
                 search["normalized_datetime"] = None
                 search["normalized_date"] = None
@@ -152,7 +184,9 @@ class TimelineService:
     
     def _normalize_datetime(self, date_str: str) -> Optional[str]:
         """
-        标准化日期时间格式为 YYYY-MM-DDTHH:MM:SS
+        标准化日期时间格式为 UTC 的 YYYY-MM-DDTHH:MM:SS
+        
+        支持 ISO 8601（含时区偏移/Z）、RFC 2822、中文日期等格式，解析结果有 LRU 缓存
         
         Args:
             date_str: 原始日期时间字符串
@@ -160,44 +194,7 @@ class TimelineService:
         Returns:
             标准化后的日期时间字符串 (YYYY-MM-DDTHH:MM:SS) 或 None
         """
-        if not date_str:
-            return None
-        
-        # 尝试多种日期时间格式
-        datetime_formats = [
-            "%Y-%m-%dT%H:%M:%S",      # 2025-08-08T10:30:00
-            "%Y-%m-%dT%H:%M:%S.%f",   # 2025-08-08T10:30:00.123456
-            "%Y-%m-%d %H:%M:%S",      # 2025-08-08 10:30:00
-            "%Y-%m-%d %H:%M:%S.%f",   # 2025-08-08 10:30:00.123456
-            "%Y-%m-%d",               # 2025-08-08
-            "%Y/%m/%d %H:%M:%S",      # 2025/08/08 10:30:00
-            "%Y/%m/%d",               # 2025/08/08
-            "%Y.%m.%d %H:%M:%S",      # 2025.08.08 10:30:00
-            "%Y.%m.%d",               # 2025.08.08
-        ]
-        
-        for fmt in datetime_formats:
-            try:
-                dt = datetime.strptime(date_str[:len(fmt)], fmt)
-                return dt.strftime("%Y-%m-%dT%H:%M:%S")
-            except (ValueError, IndexError):
-                continue
-        
-        # 如果都失败，尝试提取日期时间部分
-        try:
-            import re
-            # 尝试提取 YYYY-MM-DD HH:MM:SS 格式
-            match = re.search(r'(\d{4}-\d{2}-\d{2})\s+(\d{2}:\d{2}:\d{2})', date_str)
-            if match:
-                return f"{match.group(1)}T{match.group(2)}"
-            # 尝试提取 YYYY-MM-DD 格式
-            match = re.search(r'(\d{4}-\d{2}-\d{2})', date_str)
-            if match:
-                return f"{match.group(1)}T00:00:00"
-        except:
-            pass
-        
-        return None
+        return normalize_datetime(date_str, self.default_tz_offset)
     
     def _format_display_date(self, date_str: Optional[str]) -> str:
         """
@@ -212,11 +209,7 @@ class TimelineService:
         if not date_str:
             return "未知日期"
         
-        try:
-            dt = datetime.strptime(date_str, "%Y-%m-%d")
-            return dt.strftime("%Y.%m.%d")
-        except:
-            return date_str.replace("-", ".")
+        return date_str.replace("-", ".")
     
     def _format_display_time(self, time_str: Optional[str]) -> Optional[str]:
         """
@@ -285,38 +278,68 @@ class TimelineService:
         if "unknown" in grouped_by_date:
             sorted_dates.append("unknown")
         
-        for date_key in sorted_dates:
-            searches = grouped_by_date[date_key]
-            
-            # 生成事件（每个搜索结果作为一个事件，已按相关度倒序）
-            events = []
-            for search in searches:
-                event = {
-                    "title": search.get("title", "无标题"),
-                    "description": search.get("content", "")[:200] + "..." if len(search.get("content", "")) > 200 else search.get("content", ""),
-                    "time": search.get("display_time"),  # 显示时间
-                    "datetime": search.get("normalized_datetime"),  # 完整日期时间用于排序
-                    "sources": [{
-                        "title": search.get("title", "无标题"),
-                        "url": search.get("url", ""),
-                        "score": search.get("score"),
-                        "website_name": search.get("website_name"),  # 网站名称
-                        "content_preview": search.get("content", "")[:150] + "..." if len(search.get("content", "")) > 150 else search.get("content", "")
-                    }]
-                }
-                events.append(event)
-            
+        # 同一报道的近似重复转载先合并（相关度最高的一篇作为代表），
+        # 再把同一日期内讨论同一事件的报道归为一条故事线，所有日期一次完成聚类
+        ordered = [search for date_key in sorted_dates for search in grouped_by_date[date_key]]
+        date_indices = np.repeat(np.arange(len(sorted_dates)), [len(grouped_by_date[d]) for d in sorted_dates])
+        duplicate_clusters = cluster_near_duplicates(ordered, date_indices)
+        leaders = [cluster[0] for cluster in duplicate_clusters]
+        storylines, representatives = cluster_storylines(
+            [storyline_text(ordered[leader]) for leader in leaders],
+            date_indices[np.array(leaders, dtype=np.int64)]
+        )
+        
+        # 生成事件：每条故事线一个事件，与故事线整体最相似的报道作为代表
+        events_by_date = [[] for _ in sorted_dates]
+        date_of = date_indices.tolist()
+        for members, representative_index in zip(storylines, representatives):
+            leader = leaders[representative_index]
+            representative = ordered[leader]
+            content = representative.get("content") or ""
+            event = {
+                "title": representative.get("title", "无标题"),
+                "description": content[:200] + "..." if len(content) > 200 else content,
+                "time": representative.get("display_time"),  # 显示时间
+                "datetime": representative.get("normalized_datetime"),  # 完整日期时间用于排序
+                "sources": [
+                    self._build_source(ordered[index])
+                    for member in members
+                    for index in duplicate_clusters[member]
+                ]
+            }
+            events_by_date[date_of[leader]].append(event)
+        
+        for date_key, events in zip(sorted_dates, events_by_date):
             timeline_item = {
                 "date": self._format_display_date(date_key) if date_key != "unknown" else "未知日期",
                 "date_key": date_key,
                 "events": events,
-                "source_count": len(searches)
+                "source_count": len(grouped_by_date[date_key])
             }
             
             timeline.append(timeline_item)
         
         return timeline
     
+    def _build_source(self, search: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        构建事件的来源条目
+        
+        Args:
+            search: 搜索结果
+            
+        Returns:
+            来源字典
+        """
+        content = search.get("content") or ""
+        return {
+            "title": search.get("title", "无标题"),
+            "url": search.get("url", ""),
+            "score": search.get("score"),
+            "website_name": search.get("website_name"),  # 网站名称
+            "content_preview": content[:150] + "..." if len(content) > 150 else content
+        }
+    
     def _calculate_date_range(self, searches: List[Dict[str, Any]]) -> Optional[Dict[str, str]]:
         """
         计算日期范围
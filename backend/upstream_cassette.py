@@ -0,0 +1,410 @@
+"""
+上游请求录制与回放（cassette）
+在 HTTP 传输层录制 LLM（openai SDK / httpx）与搜索（Tavily / requests）的请求和响应，
+并可在本地原样回放，使性能测试不依赖真实的 DeepSeek / Tavily 接口
+
+通过环境变量启用:
+    UPSTREAM_CASSETTE_MODE=record|replay   录制或回放（默认关闭）
+    UPSTREAM_CASSETTE_DIR=cassettes        cassette 文件目录
+    UPSTREAM_CASSETTE_LATENCY=1.0          回放时模拟原始延迟的倍数（0 表示不模拟）
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlsplit
+from loguru import logger
+
+
+UNBOUND_CASSETTE = "_unbound"
+
+# 计算请求指纹时忽略的易变字段
+VOLATILE_BODY_FIELDS = ("api_key", "user", "request_id")
+
+# 拦截的 httpx 兼容模块（openai SDK 按版本使用 httpx 或 httpx2 发送请求）
+HTTPX_MODULES = ("httpx", "httpx2")
+
+# 录制时保留的响应头
+RECORDED_HEADERS = ("content-type",)
+
+
+class CassetteMissError(RuntimeError):
+    """回放时找不到匹配的录制请求"""
+
+
+def cassette_name_for(query: str) -> str:
+    """
+    根据查询内容生成 cassette 名称（相同查询的录制与回放使用同一个文件）
+
+    Args:
+        query: 查询内容
+
+    Returns:
+        cassette 名称
+    """
+    query_safe = re.sub(r'[^\w\-]+', '_', query.strip())[:30].strip('_')
+    digest = hashlib.sha1(query.strip().encode("utf-8")).hexdigest()[:12]
+    return f"{query_safe}_{digest}" if query_safe else digest
+
+
+def _body_fingerprint(body: Optional[bytes]) -> str:
+    """计算请求体指纹（JSON 请求体按规范化后的内容计算）"""
+    if not body:
+        return ""
+    try:
+        payload = json.loads(body)
+        if isinstance(payload, dict):
+            payload = {k: v for k, v in payload.items() if k not in VOLATILE_BODY_FIELDS}
+        canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    except (ValueError, UnicodeDecodeError):
+        canonical = body
+    return hashlib.sha1(canonical).hexdigest()
+
+
+def _endpoint(url: str) -> str:
+    """去掉查询参数后的请求地址"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+
+class Cassette:
+    """单个 cassette 文件中的交互记录"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.interactions: List[Dict[str, Any]] = []
+        self._by_key: Dict[Tuple[str, str, str], deque] = {}
+        self._by_endpoint: Dict[Tuple[str, str], deque] = {}
+        self._used = set()
+
+    def load(self) -> "Cassette":
+        """读取 cassette 文件（gzip 压缩的 JSON Lines，可包含多个 gzip 段）"""
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self._index(json.loads(line))
+        return self
+
+    def _index(self, interaction: Dict[str, Any]):
+        position = len(self.interactions)
+        self.interactions.append(interaction)
+        key = (interaction["method"], interaction["endpoint"], interaction["body_hash"])
+        self._by_key.setdefault(key, deque()).append(position)
+        self._by_endpoint.setdefault((interaction["method"], interaction["endpoint"]), deque()).append(position)
+
+    def match(self, method: str, url: str, body: Optional[bytes]) -> Optional[Dict[str, Any]]:
+        """
+        查找匹配的录制响应：优先精确匹配请求体，否则按录制顺序取同一接口的下一条
+
+        Returns:
+            交互记录，找不到时返回 None
+        """
+        endpoint = _endpoint(url)
+        for queue in (self._by_key.get((method, endpoint, _body_fingerprint(body))),
+                      self._by_endpoint.get((method, endpoint))):
+            while queue:
+                position = queue.popleft()
+                if position not in self._used:
+                    self._used.add(position)
+                    return self.interactions[position]
+        return None
+
+
+class CassetteManager:
+    """管理录制与回放"""
+
+    def __init__(self, mode: str, directory: str, latency_factor: float = 1.0):
+        """
+        初始化
+
+        Args:
+            mode: record 或 replay
+            directory: cassette 文件目录
+            latency_factor: 回放时模拟原始延迟的倍数
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError(f"无效的 cassette 模式: {mode}")
+        self.mode = mode
+        self.directory = directory
+        self.latency_factor = latency_factor
+        self._lock = threading.Lock()
+        self._pending: Dict[str, List[Dict[str, Any]]] = {}
+        self._started_at: Dict[str, float] = {}
+        self._loaded: Dict[str, Cassette] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.jsonl.gz")
+
+    def record(self, name: str, method: str, url: str, body: Optional[bytes],
+               status: int, headers: Dict[str, str], content: bytes, elapsed: float):
+        """记录一次交互（在 flush 时写入文件）"""
+        now = time.time()
+        with self._lock:
+            started_at = self._started_at.setdefault(name, now - elapsed)
+            self._pending.setdefault(name, []).append({
+                "method": method,
+                "endpoint": _endpoint(url),
+                "body_hash": _body_fingerprint(body),
+                "request_bytes": len(body or b""),
+                "status": status,
+                "headers": {k: v for k, v in headers.items() if k.lower() in RECORDED_HEADERS},
+                "body": content.decode("utf-8", errors="replace"),
+                "elapsed": round(elapsed, 4),
+                "offset": round(now - elapsed - started_at, 4)
+            })
+
+    def flush(self, name: str):
+        """把尚未写入的交互追加到 cassette 文件"""
+        with self._lock:
+            interactions = self._pending.pop(name, [])
+        if not interactions:
+            return
+        path = self.path_for(name)
+        with gzip.open(path, "at", encoding="utf-8") as f:
+            for interaction in interactions:
+                f.write(json.dumps(interaction, ensure_ascii=False) + "\n")
+        logger.info(f"已录制 {len(interactions)} 条上游请求到: {path}")
+
+    def replay(self, name: str, method: str, url: str, body: Optional[bytes]) -> Dict[str, Any]:
+        """
+        查找录制的响应，并按需模拟原始延迟
+
+        Raises:
+            CassetteMissError: 没有匹配的录制请求
+        """
+        with self._lock:
+            cassette = self._loaded.get(name)
+            if cassette is None:
+                path = self.path_for(name)
+                if not os.path.exists(path):
+                    raise CassetteMissError(f"cassette 不存在: {path}")
+                cassette = self._loaded[name] = Cassette(path).load()
+            interaction = cassette.match(method, url, body)
+
+        if interaction is None:
+            raise CassetteMissError(f"cassette {name} 中没有匹配的请求: {method} {url}")
+        if self.latency_factor > 0:
+            time.sleep(interaction["elapsed"] * self.latency_factor)
+        return interaction
+
+    def rewind(self, name: str):
+        """丢弃已加载的回放进度，下次回放时从头读取"""
+        with self._lock:
+            self._loaded.pop(name, None)
+
+
+_manager: Optional[CassetteManager] = None
+_current_cassette: ContextVar[str] = ContextVar("upstream_cassette", default=UNBOUND_CASSETTE)
+
+
+@contextmanager
+def use_cassette(name: str):
+    """
+    在当前上下文中绑定 cassette，上下文内的上游请求都录制到（或回放自）该文件
+
+    Args:
+        name: cassette 名称
+    """
+    token = _current_cassette.set(name)
+    try:
+        yield
+    finally:
+        _current_cassette.reset(token)
+        if _manager is not None and _manager.mode == "record":
+            _manager.flush(name)
+
+
+def rewind_cassette(name: str):
+    """
+    重置 cassette 的回放进度（同一查询被再次执行时调用）
+
+    Args:
+        name: cassette 名称
+    """
+    if _manager is not None and _manager.mode == "replay":
+        _manager.rewind(name)
+
+
+def _patch_httpx():
+    """拦截 httpx（openai SDK）请求，新版 openai SDK 使用的 httpx2 同样处理"""
+    import importlib
+
+    patched = False
+    for module_name in HTTPX_MODULES:
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            continue
+        _patch_httpx_client(module)
+        patched = True
+    return patched
+
+
+def _patch_httpx_client(module):
+    """替换指定 httpx 模块中 Client.send 的实现"""
+    original = module.Client.send
+    if getattr(original, "_cassette_patched", False):
+        return
+
+    def send(self, request, **kwargs):
+        name = _current_cassette.get()
+        body = request.read()
+        if _manager.mode == "replay":
+            interaction = _manager.replay(name, request.method, str(request.url), body)
+            return module.Response(
+                interaction["status"],
+                headers=interaction["headers"],
+                content=interaction["body"].encode("utf-8"),
+                request=request
+            )
+
+        start = time.time()
+        response = original(self, request, **kwargs)
+        content = response.read()
+        _manager.record(name, request.method, str(request.url), body, response.status_code,
+                        dict(response.headers), content, time.time() - start)
+        return response
+
+    send._cassette_patched = True
+    module.Client.send = send
+
+
+def _patch_requests():
+    """拦截 requests（Tavily SDK）请求"""
+    try:
+        import requests
+    except ImportError:
+        return False
+
+    original = requests.Session.send
+    if getattr(original, "_cassette_patched", False):
+        return True
+
+    def send(self, request, **kwargs):
+        name = _current_cassette.get()
+        body = request.body.encode("utf-8") if isinstance(request.body, str) else request.body
+        if _manager.mode == "replay":
+            interaction = _manager.replay(name, request.method, request.url, body)
+            response = requests.Response()
+            response.status_code = interaction["status"]
+            response.headers.update(interaction["headers"])
+            response._content = interaction["body"].encode("utf-8")
+            response.encoding = "utf-8"
+            response.url = request.url
+            response.request = request
+            return response
+
+        start = time.time()
+        response = original(self, request, **kwargs)
+        _manager.record(name, request.method, request.url, body, response.status_code,
+                        dict(response.headers), response.content, time.time() - start)
+        return response
+
+    send._cassette_patched = True
+    requests.Session.send = send
+    return True
+
+
+def install_cassettes(mode: str, directory: str, latency_factor: float = 1.0) -> CassetteManager:
+    """
+    启用录制或回放
+
+    Args:
+        mode: record 或 replay
+        directory: cassette 文件目录
+        latency_factor: 回放时模拟原始延迟的倍数（0 表示立即返回）
+
+    Returns:
+        CassetteManager实例
+    """
+    global _manager
+    _manager = CassetteManager(mode, directory, latency_factor)
+    installed = {"httpx": _patch_httpx(), "requests": _patch_requests()}
+    logger.info(f"上游 cassette 已启用: mode={mode}, dir={directory}, latency_factor={latency_factor}, {installed}")
+    return _manager
+
+
+def install_cassettes_from_env() -> Optional[CassetteManager]:
+    """根据环境变量启用录制或回放，未设置时不做处理"""
+    mode = os.getenv("UPSTREAM_CASSETTE_MODE", "").strip().lower()
+    if not mode or mode == "off":
+        return None
+    return install_cassettes(
+        mode,
+        os.getenv("UPSTREAM_CASSETTE_DIR", "cassettes"),
+        float(os.getenv("UPSTREAM_CASSETTE_LATENCY", "1.0"))
+    )
+
+
+def summarize_cassette(path: str) -> Dict[str, Any]:
+    """
+    汇总 cassette 文件中的请求数量、字节数与录制时的耗时
+
+    Args:
+        path: cassette 文件路径
+
+    Returns:
+        按接口汇总的统计字典
+    """
+    cassette = Cassette(path).load()
+    endpoints: Dict[str, Dict[str, float]] = {}
+    for interaction in cassette.interactions:
+        stats = endpoints.setdefault(f"{interaction['method']} {interaction['endpoint']}",
+                                     {"count": 0, "request_bytes": 0, "response_bytes": 0, "elapsed": 0.0})
+        stats["count"] += 1
+        stats["request_bytes"] += interaction["request_bytes"]
+        stats["response_bytes"] += len(interaction["body"].encode("utf-8"))
+        stats["elapsed"] = round(stats["elapsed"] + interaction["elapsed"], 4)
+    return {
+        "path": path,
+        "interactions": len(cassette.interactions),
+        "endpoints": endpoints
+    }
+
+
+def check_replay_blocks_llm() -> bool:
+    """
+    自检：回放空 cassette 时 openai SDK 的请求应被拦截并抛出 CassetteMissError，而不是访问真实接口
+
+    Returns:
+        是否拦截成功（未安装 openai SDK 时返回 False）
+    """
+    import tempfile
+
+    try:
+        import openai
+    except ImportError:
+        logger.warning("未安装 openai SDK，跳过回放自检")
+        return False
+    with tempfile.TemporaryDirectory() as directory:
+        install_cassettes("replay", directory, latency_factor=0)
+        client = openai.OpenAI(api_key="cassette-check", base_url="http://127.0.0.1:9/v1", max_retries=0)
+        try:
+            with use_cassette("cassette_check"):
+                client.chat.completions.create(model="check", messages=[{"role": "user", "content": "ping"}])
+        except CassetteMissError:
+            return True
+        except Exception as e:
+            logger.error(f"回放空 cassette 时 openai 请求未被拦截: {type(e).__name__}: {str(e)}")
+            return False
+    logger.error("回放空 cassette 时 openai 请求意外成功")
+    return False
+
+
+if __name__ == "__main__":
+    import sys
+    if sys.argv[1:] == ["--check"]:
+        ok = check_replay_blocks_llm()
+        print("回放自检通过" if ok else "回放自检失败：LLM 请求没有经过 cassette")
+        sys.exit(0 if ok else 1)
+    for cassette_path in sys.argv[1:]:
+        print(json.dumps(summarize_cassette(cassette_path), ensure_ascii=False, indent=2))
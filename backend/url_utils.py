@@ -0,0 +1,164 @@
+"""
+URL 工具
+规范化新闻链接，去掉跟踪参数、锚点等不影响内容的部分，展开已知的跳转链接，便于按 URL 合并同一篇文章
+"""
+
+import re
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+
+# 不影响页面内容的跟踪/分享参数
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+    "spm", "scm", "share", "share_token", "share_source", "share_medium", "shareid",
+    "from", "ref", "referer", "isappinstalled", "wfr",
+    "s_trans", "s_channel", "sharer_shareid", "sharer_sharetime", "chksm", "scene",
+    "xhsshare", "app_platform", "app_version",
+}
+
+TRACKING_PREFIXES = ("utm_", "share_", "sharer_")
+
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+# 目标地址写在参数中的跳转链接：主机名 -> (路径，保存目标地址的参数)；无需联网即可展开
+REDIRECT_PARAMS = {
+    "link.zhihu.com": ("/", ("target",)),
+    "link.juejin.cn": ("/", ("target",)),
+    "link.csdn.net": ("/", ("target",)),
+    "weibo.cn": ("/sinaurl", ("u", "toasturl")),
+    "google.com": ("/url", ("q", "url")),
+    "l.facebook.com": ("/l.php", ("u",)),
+    "lm.facebook.com": ("/l.php", ("u",)),
+    "t.umblr.com": ("/redirect", ("z",)),
+    "c.pc.qq.com": ("/middlem.html", ("pfurl", "url")),
+    "getpocket.com": ("/redirect", ("url",)),
+}
+
+# 只由部分参数确定文章的站点：主机名 -> 保留的参数（其余参数与内容无关）
+IDENTITY_PARAMS = {
+    "mp.weixin.qq.com": {"__biz", "mid", "idx", "sn"},
+    "youtube.com": {"v"},
+}
+
+# 跳转链接最多展开的层数
+MAX_REDIRECT_DEPTH = 3
+
+_URL_QUERY = re.compile(r"^https?://\S+$", re.IGNORECASE)
+
+
+def is_url_query(text: str) -> bool:
+    """查询内容是否是单个链接"""
+    return bool(_URL_QUERY.match((text or "").strip()))
+
+
+def unwrap_redirect(url: str) -> str:
+    """
+    离线展开已知的跳转链接（目标地址写在参数中，如 link.zhihu.com/?target=...），
+    以及 youtu.be/<id> 这类可以直接还原的短链接
+
+    Args:
+        url: 原始 URL
+
+    Returns:
+        目标地址；不是已知的跳转链接时返回原值
+    """
+    for _ in range(MAX_REDIRECT_DEPTH):
+        try:
+            parts = urlsplit(url.strip())
+        except ValueError:
+            return url
+        host = (parts.hostname or "").lower()
+        if host.startswith("www."):
+            host = host[4:]
+        if host == "youtu.be" and parts.path.strip("/"):
+            return f"https://youtube.com/watch?v={parts.path.strip('/')}"
+        rule = REDIRECT_PARAMS.get(host)
+        if rule is None or (parts.path or "/").rstrip("/") != rule[0].rstrip("/"):
+            return url
+        params = dict(parse_qsl(parts.query))
+        target = next((params[name] for name in rule[1] if params.get(name, "").lower().startswith("http")), None)
+        if target is None:
+            return url
+        url = target
+    return url
+
+
+def _is_tracking_param(key: str) -> bool:
+    key = key.lower()
+    return key in TRACKING_PARAMS or key.startswith(TRACKING_PREFIXES)
+
+
+def clean_url(url: str) -> str:
+    """
+    抓取与研究使用的 URL：展开已知的跳转链接并去掉跟踪参数，其余部分（主机名、路径、参数顺序）保持原样
+
+    与 canonicalize_url 不同，这里不改写主机名和路径，也不删除与文章身份无关的普通参数，
+    规范化后的 URL 只用作缓存与去重的键，不一定能直接访问
+
+    Args:
+        url: 原始 URL
+
+    Returns:
+        清理后的 URL，无法解析时返回去除首尾空白的原值
+    """
+    if not url:
+        return ""
+    url = unwrap_redirect(url.strip())
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    if not parts.netloc or not parts.query:
+        return url
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if not _is_tracking_param(key)]
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), parts.fragment))
+
+
+@lru_cache(maxsize=65536)
+def canonicalize_url(url: str) -> str:
+    """
+    规范化 URL
+
+    - 展开已知的跳转链接（见 unwrap_redirect）
+    - scheme 与主机名小写，去掉默认端口和 www. 前缀
+    - 去掉锚点、跟踪参数，剩余参数按名称排序；IDENTITY_PARAMS 中的站点只保留确定文章的参数
+    - 去掉路径末尾的斜杠
+
+    Args:
+        url: 原始 URL
+
+    Returns:
+        规范化后的 URL，无法解析时返回去除首尾空白的原值
+    """
+    if not url:
+        return ""
+    url = unwrap_redirect(url.strip())
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    if not parts.netloc:
+        return url
+
+    scheme = (parts.scheme or "http").lower()
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and str(port) != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+
+    identity = IDENTITY_PARAMS.get(host)
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if (key in identity if identity is not None else not _is_tracking_param(key))
+    ]
+    query.sort()
+
+    path = parts.path.rstrip("/") or ""
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
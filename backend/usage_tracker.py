@@ -0,0 +1,370 @@
+"""
+LLM 与搜索调用成本统计
+按任务、按阶段记录 token 数、调用次数、字节数与耗时
+"""
+
+import functools
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Dict, Any, Optional, Callable, Iterable
+from loguru import logger
+
+
+# 统计字段（每个阶段一份）
+USAGE_FIELDS = (
+    "llm_calls",
+    "llm_errors",
+    "prompt_tokens",
+    "completion_tokens",
+    "llm_request_bytes",
+    "llm_response_bytes",
+    "llm_latency",
+    "search_calls",
+    "search_errors",
+    "search_results",
+    "search_request_bytes",
+    "search_response_bytes",
+    "search_latency",
+)
+
+DEFAULT_STAGE = "other"
+
+_CJK_PATTERN = re.compile(r'[㐀-鿿豈-﫿]')
+_WORD_PATTERN = re.compile(r'[A-Za-z0-9_]+')
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    粗略估算文本的 token 数（中文按字计，英文按词计）
+
+    Args:
+        text: 文本内容
+
+    Returns:
+        估算的 token 数
+    """
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    word_count = len(_WORD_PATTERN.findall(text))
+    return cjk_count + int(word_count * 1.3)
+
+
+def _json_size(obj: Any) -> int:
+    """计算对象序列化为 JSON 后的字节数"""
+    try:
+        return len(json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8"))
+    except Exception:
+        return 0
+
+
+class UsageTracker:
+    """单个任务的调用成本统计（线程安全）"""
+
+    def __init__(self):
+        """初始化统计"""
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, float]] = {}
+        self.version = 0  # 每记录一次调用递增
+
+    def _stage(self, stage: str) -> Dict[str, float]:
+        if stage not in self._stages:
+            self._stages[stage] = {field: 0 for field in USAGE_FIELDS}
+        return self._stages[stage]
+
+    def record_llm(self, stage: str, prompt_tokens: int, completion_tokens: int,
+                   request_bytes: int, response_bytes: int, latency: float, error: bool = False):
+        """记录一次 LLM 调用"""
+        with self._lock:
+            counters = self._stage(stage)
+            counters["llm_calls"] += 1
+            counters["llm_errors"] += int(error)
+            counters["prompt_tokens"] += prompt_tokens
+            counters["completion_tokens"] += completion_tokens
+            counters["llm_request_bytes"] += request_bytes
+            counters["llm_response_bytes"] += response_bytes
+            counters["llm_latency"] += latency
+            self.version += 1
+
+    def record_search(self, stage: str, result_count: int, request_bytes: int,
+                      response_bytes: int, latency: float, error: bool = False):
+        """记录一次搜索调用"""
+        with self._lock:
+            counters = self._stage(stage)
+            counters["search_calls"] += 1
+            counters["search_errors"] += int(error)
+            counters["search_results"] += result_count
+            counters["search_request_bytes"] += request_bytes
+            counters["search_response_bytes"] += response_bytes
+            counters["search_latency"] += latency
+            self.version += 1
+
+    def merge_into(self, target: Dict[str, Dict[str, float]]):
+        """把本统计按阶段累加到 target 字典中"""
+        with self._lock:
+            for stage, counters in self._stages.items():
+                merged = target.setdefault(stage, {field: 0 for field in USAGE_FIELDS})
+                for field in USAGE_FIELDS:
+                    merged[field] += counters[field]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        转换为字典格式
+
+        Returns:
+            {"totals": {...}, "stages": {stage: {...}}}
+        """
+        stages: Dict[str, Dict[str, float]] = {}
+        self.merge_into(stages)
+        return summarize_stages(stages)
+
+
+def summarize_stages(stages: Dict[str, Dict[str, float]]) -> Dict[str, Any]:
+    """
+    汇总各阶段统计，并把耗时保留三位小数
+
+    Args:
+        stages: 按阶段分组的统计字典
+
+    Returns:
+        {"totals": {...}, "stages": {...}}
+    """
+    totals = {field: 0 for field in USAGE_FIELDS}
+    for counters in stages.values():
+        for field in USAGE_FIELDS:
+            totals[field] += counters[field]
+
+    def _round(counters: Dict[str, float]) -> Dict[str, float]:
+        rounded = dict(counters)
+        rounded["llm_latency"] = round(rounded["llm_latency"], 3)
+        rounded["search_latency"] = round(rounded["search_latency"], 3)
+        return rounded
+
+    return {
+        "totals": _round(totals),
+        "stages": {stage: _round(counters) for stage, counters in stages.items()}
+    }
+
+
+# 未绑定任务时的调用记录在这里
+unattributed_usage = UsageTracker()
+
+_current_tracker: ContextVar[Optional[UsageTracker]] = ContextVar("usage_tracker", default=None)
+_current_stage: ContextVar[str] = ContextVar("usage_stage", default=DEFAULT_STAGE)
+
+
+def current_tracker() -> UsageTracker:
+    """获取当前上下文绑定的统计对象（未绑定时返回 unattributed_usage）"""
+    return _current_tracker.get() or unattributed_usage
+
+
+def current_stage() -> str:
+    """获取当前上下文的阶段名称"""
+    return _current_stage.get()
+
+
+@contextmanager
+def track_usage(tracker: Optional[UsageTracker], stage: Optional[str] = None):
+    """
+    在当前上下文中绑定统计对象（以及可选的阶段）
+
+    Args:
+        tracker: 统计对象
+        stage: 阶段名称
+    """
+    tracker_token = _current_tracker.set(tracker)
+    stage_token = _current_stage.set(stage) if stage else None
+    try:
+        yield tracker
+    finally:
+        if stage_token is not None:
+            _current_stage.reset(stage_token)
+        _current_tracker.reset(tracker_token)
+
+
+@contextmanager
+def usage_stage(stage: str):
+    """
+    标记当前阶段，阶段内的调用会计入该阶段
+
+    Args:
+        stage: 阶段名称（如 mode_detection / research / verification / mermaid）
+    """
+    token = _current_stage.set(stage)
+    try:
+        yield
+    finally:
+        _current_stage.reset(token)
+
+
+def bind_context(func: Callable) -> Callable:
+    """
+    把当前上下文（统计对象与阶段）绑定到函数上，供线程池中的任务使用
+
+    Args:
+        func: 需要在其他线程执行的函数
+
+    Returns:
+        在当前上下文副本中执行的函数
+    """
+    context = copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+
+    return wrapper
+
+
+class _TrackedStream:
+    """包装流式响应，在迭代结束时记录统计"""
+
+    def __init__(self, stream: Any, tracker: UsageTracker, stage: str,
+                 prompt_tokens: int, request_bytes: int, start_time: float):
+        self._stream = stream
+        self._tracker = tracker
+        self._stage = stage
+        self._prompt_tokens = prompt_tokens
+        self._request_bytes = request_bytes
+        self._start_time = start_time
+        self._recorded = False
+
+    def __iter__(self) -> Iterable[Any]:
+        parts = []
+        usage = None
+        error = False
+        try:
+            for chunk in self._stream:
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                for choice in getattr(chunk, "choices", None) or []:
+                    delta = getattr(choice, "delta", None)
+                    content = getattr(delta, "content", None) if delta else None
+                    if content:
+                        parts.append(content)
+                yield chunk
+        except Exception:
+            error = True
+            raise
+        finally:
+            self._record("".join(parts), usage, error)
+
+    def _record(self, text: str, usage: Any, error: bool):
+        if self._recorded:
+            return
+        self._recorded = True
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or self._prompt_tokens
+        completion_tokens = getattr(usage, "completion_tokens", None) or estimate_tokens(text)
+        self._tracker.record_llm(
+            self._stage, prompt_tokens, completion_tokens,
+            self._request_bytes, len(text.encode("utf-8")),
+            time.time() - self._start_time, error=error
+        )
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._stream, name)
+
+
+def _patch_openai() -> bool:
+    """统计 openai SDK 的 chat.completions.create 调用（DeepSeek 也走此 SDK）"""
+    try:
+        from openai.resources.chat.completions import Completions
+    except ImportError:
+        return False
+
+    original = Completions.create
+    if getattr(original, "_usage_tracked", False):
+        return True
+
+    @functools.wraps(original)
+    def create(self, *args, **kwargs):
+        tracker = current_tracker()
+        stage = current_stage()
+        messages = kwargs.get("messages") or []
+        request_bytes = _json_size(messages)
+        prompt_estimate = sum(estimate_tokens(str(m.get("content", ""))) for m in messages if isinstance(m, dict))
+        start_time = time.time()
+
+        try:
+            response = original(self, *args, **kwargs)
+        except Exception:
+            tracker.record_llm(stage, prompt_estimate, 0, request_bytes, 0,
+                               time.time() - start_time, error=True)
+            raise
+
+        if kwargs.get("stream"):
+            return _TrackedStream(response, tracker, stage, prompt_estimate, request_bytes, start_time)
+
+        text = ""
+        try:
+            text = response.choices[0].message.content or ""
+        except (AttributeError, IndexError):
+            pass
+        usage = getattr(response, "usage", None)
+        tracker.record_llm(
+            stage,
+            getattr(usage, "prompt_tokens", None) or prompt_estimate,
+            getattr(usage, "completion_tokens", None) or estimate_tokens(text),
+            request_bytes,
+            len(text.encode("utf-8")),
+            time.time() - start_time
+        )
+        return response
+
+    create._usage_tracked = True
+    Completions.create = create
+    return True
+
+
+def _patch_tavily() -> bool:
+    """统计 tavily SDK 的 search 调用"""
+    try:
+        from tavily import TavilyClient
+    except ImportError:
+        return False
+
+    original = TavilyClient.search
+    if getattr(original, "_usage_tracked", False):
+        return True
+
+    @functools.wraps(original)
+    def search(self, *args, **kwargs):
+        tracker = current_tracker()
+        stage = current_stage()
+        request_bytes = _json_size({"args": args, "kwargs": kwargs})
+        start_time = time.time()
+
+        try:
+            response = original(self, *args, **kwargs)
+        except Exception:
+            tracker.record_search(stage, 0, request_bytes, 0, time.time() - start_time, error=True)
+            raise
+
+        results = response.get("results", []) if isinstance(response, dict) else []
+        tracker.record_search(
+            stage, len(results), request_bytes, _json_size(response), time.time() - start_time
+        )
+        return response
+
+    search._usage_tracked = True
+    TavilyClient.search = search
+    return True
+
+
+def install_instrumentation() -> Dict[str, bool]:
+    """
+    安装 LLM 与搜索调用的统计钩子（可重复调用）
+
+    Returns:
+        各 SDK 是否安装成功
+    """
+    installed = {
+        "openai": _patch_openai(),
+        "tavily": _patch_tavily()
+    }
+    logger.info(f"调用成本统计已安装: {installed}")
+    return installed
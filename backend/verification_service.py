@@ -1,13 +1,17 @@
 """
 独立的新闻真假判别服务
-可以被深度思考和浅度思考两种模式调用
+可以被深度思考和浅度思考两种模式调用；长报告按章节分段并行判别后汇总（map-reduce）
 """
 
 import os
+import re
 import sys
 import json
+import threading
+from collections import Counter
+from concurrent.futures import CancelledError, ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 # 添加路径以便导入
 deepsearch_demo_path = os.path.join(os.path.dirname(__file__), 'DeepSearchAgent-Demo')
@@ -18,17 +22,113 @@ from src.nodes.verification_node import NewsVerificationNode
 from src.utils.config import Config
 from loguru import logger
 
+sys.path.insert(0, os.path.dirname(__file__))
+
+from concurrency import cancellable, llm_limiter, map_concurrently
+from usage_tracker import bind_context
+from claim_cache import ClaimCache, ClaimVerifier, get_claim_cache
+from verification_store import VerificationStore, get_verification_store
+from artifact_log import ArtifactLog, ARTIFACT_LEGACY_FILES, artifact_key, get_artifact_log
+
+
+# 报告超过该长度（字符）时分段并行判别再汇总
+LONG_REPORT_THRESHOLD = int(os.getenv("VERIFICATION_LONG_REPORT_CHARS", "8000"))
+
+# 分段判别时每段的目标长度（字符）
+SECTION_TARGET_CHARS = int(os.getenv("VERIFICATION_SECTION_CHARS", "4000"))
+
+_HEADING = re.compile(r"^#{1,3}\s", re.MULTILINE)
+
+# 各判别结果在汇总投票中的含义
+KNOWN_VERDICTS = ("真", "假", "部分真实")
+UNKNOWN_VERDICT = "无法确定"
+
+# 集成判别的成员：逗号分隔的 provider:model，如 deepseek:deepseek-chat,openai:gpt-4o-mini
+VERIFICATION_ENSEMBLE = os.getenv("VERIFICATION_ENSEMBLE", "")
+
+# 集成判别达成一致所需的模型数，0 表示过半
+VERIFICATION_ENSEMBLE_QUORUM = int(os.getenv("VERIFICATION_ENSEMBLE_QUORUM", "0"))
+
+
+def split_report(report: str, target_chars: int = SECTION_TARGET_CHARS) -> List[str]:
+    """
+    按章节把报告切分为若干段
+
+    先按一到三级标题切分章节，相邻的短章节合并到接近 target_chars，
+    超长的章节再按段落切分
+
+    Args:
+        report: 报告内容
+        target_chars: 每段的目标长度
+
+    Returns:
+        分段列表
+    """
+    starts = [match.start() for match in _HEADING.finditer(report)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    chapters = [report[start:end].strip() for start, end in zip(starts, starts[1:] + [len(report)])]
+
+    pieces = []
+    for chapter in filter(None, chapters):
+        if len(chapter) <= target_chars:
+            pieces.append(chapter)
+            continue
+        current = ""
+        for paragraph in re.split(r"\n\s*\n", chapter):
+            if current and len(current) + len(paragraph) + 2 > target_chars:
+                pieces.append(current)
+                current = ""
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+        if current:
+            pieces.append(current)
+
+    sections = []
+    for piece in pieces:
+        if sections and len(sections[-1]) + len(piece) + 2 <= target_chars:
+            sections[-1] = f"{sections[-1]}\n\n{piece}"
+        else:
+            sections.append(piece)
+    return sections
+
+
+def vote_verdict(section_results: List[Dict[str, Any]]) -> str:
+    """
+    按各段的判别结果投票（以段落长度加权）
+
+    无法确定的段落不参与投票；某一结果占三分之二以上时采用该结果，
+    真假结论相互矛盾时为部分真实
+    """
+    weights = Counter()
+    for result in section_results:
+        verdict = result.get("verdict")
+        if verdict in KNOWN_VERDICTS:
+            weights[verdict] += result.get("length", 1)
+    total = sum(weights.values())
+    if not total:
+        return UNKNOWN_VERDICT
+    verdict, weight = weights.most_common(1)[0]
+    if weight * 3 >= total * 2:
+        return verdict
+    return "部分真实"
+
 
 class VerificationService:
     """新闻真假判别服务"""
     
-    def __init__(self, llm_client: Optional[BaseLLM] = None, config: Optional[Config] = None):
+    def __init__(self, llm_client: Optional[BaseLLM] = None, config: Optional[Config] = None,
+                 claim_cache: Optional[ClaimCache] = None, store: Optional[VerificationStore] = None,
+                 artifact_log: Optional[ArtifactLog] = None):
         """
         初始化判别服务
         
         Args:
             llm_client: LLM客户端，必须提供
             config: 配置对象，用于输出目录等配置
+            claim_cache: 陈述判别缓存（可选），提供时按陈述判别并复用其他任务的结论
+            store: 判别结果存储（可选），保存的结果同时写入该存储以便检索
+            artifact_log: 产物日志（可选），提供时判别结果由后台线程写入，不再逐个输出 JSON / Markdown 文件
+                （ARTIFACT_LEGACY_FILES=1 时仍然输出）
         """
         if not llm_client:
             raise ValueError("必须提供 llm_client 参数")
@@ -45,11 +145,14 @@ class VerificationService:
         
         # 初始化判别节点
         self.verification_node = NewsVerificationNode(self.llm_client)
+        self.claim_verifier = ClaimVerifier(self.llm_client, claim_cache) if claim_cache else None
+        self.store = store
+        self.artifact_log = artifact_log
         
         logger.info("新闻真假判别服务已初始化")
     
     def verify_news(self, query: str, final_report: str, save_result: bool = False, 
-                   output_dir: Optional[str] = None) -> Dict[str, Any]:
+                   output_dir: Optional[str] = None, task_id: Optional[str] = None) -> Dict[str, Any]:
         """
         执行新闻真假判别
         
@@ -58,6 +161,7 @@ class VerificationService:
             final_report: 完整的研究报告
             save_result: 是否保存判别结果到文件
             output_dir: 输出目录，如果不提供则使用配置中的目录
+            task_id: 关联的任务ID（保存到判别结果存储）
             
         Returns:
             包含判别结果的字典
@@ -71,27 +175,16 @@ class VerificationService:
                 "final_report": final_report
             }
             
-            # 调用判别节点
-            verification_result = self.verification_node.run(verification_input)
-            
-            verdict = verification_result.get("verdict", "无法确定")
-            summary = verification_result.get("summary", "无法生成判别摘要")
+            # 调用判别节点（长报告分段并行判别后汇总；启用陈述缓存时按陈述判别）
+            if len(final_report) > LONG_REPORT_THRESHOLD:
+                verification_result = self._verify_map_reduce(query, final_report)
+            else:
+                verification_result = self._verify_claims(query, final_report)
+                if verification_result is None:
+                    with llm_limiter:
+                        verification_result = self.verification_node.run(verification_input)
             
-            logger.info(f"判别结果: {verdict}")
-            
-            # 构建返回结果
-            result = {
-                "verdict": verdict,
-                "summary": summary,
-                "query": query,
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            
-            # 保存结果到文件（如果需要）
-            if save_result:
-                self._save_verification_result(result, output_dir)
-            
-            return result
+            return self.build_result(query, verification_result, save_result, output_dir, task_id)
             
         except Exception as e:
             logger.error(f"新闻真假判别失败: {str(e)}")
@@ -104,46 +197,219 @@ class VerificationService:
                 "error": str(e)
             }
     
-    def _save_verification_result(self, result: Dict[str, Any], output_dir: Optional[str] = None):
+    def build_result(self, query: str, verification_result: Dict[str, Any], save_result: bool = False,
+                     output_dir: Optional[str] = None, task_id: Optional[str] = None) -> Dict[str, Any]:
         """
-        保存判别结果到文件
+        由判别节点（或汇总步骤）的输出构建返回结果，并按需保存到文件
         
         Args:
-            result: 判别结果字典
+            query: 原始查询/新闻内容
+            verification_result: 包含 verdict、summary（以及可选的 sections）的字典
+            save_result: 是否保存判别结果到文件
             output_dir: 输出目录
+            task_id: 关联的任务ID
+            
+        Returns:
+            包含判别结果的字典
         """
+        verdict = verification_result.get("verdict", "无法确定")
+        summary = verification_result.get("summary", "无法生成判别摘要")
+        
+        logger.info(f"判别结果: {verdict}")
+        
+        # 构建返回结果
+        result = {
+            "verdict": verdict,
+            "summary": summary,
+            "query": query,
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        for key in ("claims", "sections", "ensemble"):
+            if verification_result.get(key):
+                result[key] = verification_result[key]
+        
+        # 保存结果到文件（如果需要）
+        if save_result:
+            self._save_verification_result(result, output_dir, task_id)
+        
+        return result
+    
+    def _verify_claims(self, query: str, evidence: str) -> Optional[Dict[str, Any]]:
+        """
+        陈述级判别（未启用陈述缓存、无法拆分出陈述或判别失败时返回 None）
+        
+        Args:
+            query: 原始查询/新闻内容
+            evidence: 研究材料（报告或各段判别结论）
+        """
+        if self.claim_verifier is None:
+            return None
         try:
-            output_dir = output_dir or self.config.output_dir
-            os.makedirs(output_dir, exist_ok=True)
-            
-            # 生成文件名
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            query_safe = "".join(c for c in result["query"] if c.isalnum() or c in (' ', '-', '_')).rstrip()
-            query_safe = query_safe.replace(' ', '_')[:30]
-            
-            # 保存为 JSON 格式
-            json_filename = f"verification_result_{query_safe}_{timestamp}.json"
-            json_filepath = os.path.join(output_dir, json_filename)
+            return self.claim_verifier.verify(query, evidence)
+        except Exception as e:
+            logger.warning(f"陈述级判别失败，改为整体判别: {str(e)}")
+            return None
+    
+    def verify_section(self, query: str, text: str) -> Dict[str, Any]:
+        """
+        判别报告中的一段内容（在 LLM 并发限制器内执行）
+        
+        Args:
+            query: 原始查询/新闻内容
+            text: 报告片段
             
-            with open(json_filepath, 'w', encoding='utf-8') as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
+        Returns:
+            判别节点的输出（verdict、summary）
+        """
+        with llm_limiter:
+            return self.verification_node.run({"query": query, "final_report": text})
+    
+    def reduce_sections(self, query: str, section_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        汇总各段的判别结论：把各段结论作为材料再判别一次（输入很短），失败时按段落投票；
+        启用陈述缓存时以各段结论为材料按陈述判别
+        
+        Args:
+            query: 原始查询/新闻内容
+            section_results: 各段的判别结果（section、length、verdict、summary，可选 title）
             
-            logger.info(f"判别结果已保存到: {json_filepath}")
+        Returns:
+            {"verdict": ..., "summary": ..., "sections": section_results}
+        """
+        digest = "\n\n".join(
+            f"### 第 {result['section']} 部分{'：' + result['title'] if result.get('title') else ''}"
+            f"（判定：{result['verdict']}）\n{result['summary']}"
+            for result in section_results
+        )
+        claims_result = self._verify_claims(query, digest)
+        if claims_result is not None:
+            return {**claims_result, "sections": section_results}
+        
+        if len(section_results) == 1:
+            only = section_results[0]
+            return {"verdict": only["verdict"], "summary": only["summary"], "sections": section_results}
+        
+        try:
+            reduced = self.verify_section(query, digest)
+            verdict = reduced.get("verdict", UNKNOWN_VERDICT)
+            summary = reduced.get("summary") or digest
+        except Exception as e:
+            logger.warning(f"汇总判别失败，按各段结论投票: {str(e)}")
+            verdict = vote_verdict(section_results)
+            summary = digest
+        
+        return {
+            "verdict": verdict,
+            "summary": summary,
+            "sections": section_results
+        }
+    
+    def _verify_map_reduce(self, query: str, final_report: str) -> Dict[str, Any]:
+        """
+        长报告判别：分段并行判别（受 LLM 并发限制器约束），再根据各段结论汇总
+        
+        Args:
+            query: 原始查询/新闻内容
+            final_report: 完整的研究报告
             
-            # 同时保存为 Markdown 格式
-            md_filename = f"verification_result_{query_safe}_{timestamp}.md"
-            md_filepath = os.path.join(output_dir, md_filename)
+        Returns:
+            {"verdict": ..., "summary": ..., "sections": [各段的判别结果]}
+        """
+        sections = split_report(final_report)
+        logger.info(f"报告长度 {len(final_report)}，分为 {len(sections)} 段并行判别")
+        
+        outcomes = map_concurrently(
+            lambda section: self.verify_section(query, section), sections,
+            max_workers=llm_limiter.limit, return_exceptions=True
+        )
+        
+        section_results = []
+        for index, (section, outcome) in enumerate(zip(sections, outcomes), start=1):
+            if isinstance(outcome, Exception):
+                logger.warning(f"第 {index} 段判别失败: {str(outcome)}")
+                continue
+            section_results.append({
+                "section": index,
+                "length": len(section),
+                "verdict": outcome.get("verdict", UNKNOWN_VERDICT),
+                "summary": outcome.get("summary", "")
+            })
+        
+        if not section_results:
+            raise outcomes[0]
+        
+        return self.reduce_sections(query, section_results)
+    
+    def _save_verification_result(self, result: Dict[str, Any], output_dir: Optional[str] = None,
+                                  task_id: Optional[str] = None):
+        """
+        保存判别结果，并写入判别结果存储（建立检索索引）
+        
+        启用产物日志时只把结果放入写入队列立即返回，落盘与建立索引都在后台线程中完成
+        
+        Args:
+            result: 判别结果字典
+            output_dir: 输出目录
+            task_id: 关联的任务ID
+        """
+        try:
+            json_filename = None
+            if self.artifact_log is None or ARTIFACT_LEGACY_FILES:
+                json_filename = self._write_result_files(result, output_dir)
             
-            # 根据判别结果选择emoji
-            emoji_map = {
-                "真": "✅",
-                "假": "❌",
-                "部分真实": "⚠️",
-                "无法确定": "❓"
-            }
-            emoji = emoji_map.get(result["verdict"], "❓")
+            if self.artifact_log is not None:
+                key = artifact_key("verification", result["query"])
+                store = self.store
+                on_written = (lambda: store.add(result, task_id=task_id, source=json_filename or key)) if store else None
+                self.artifact_log.append("verification", key, {**result, "task_id": task_id}, on_written)
+            elif self.store is not None:
+                self.store.add(result, task_id=task_id, source=json_filename)
             
-            md_content = f"""# {emoji} 新闻真假判别结果
+        except Exception as e:
+            logger.error(f"保存判别结果时发生错误: {str(e)}")
+    
+    def _write_result_files(self, result: Dict[str, Any], output_dir: Optional[str] = None) -> str:
+        """
+        把判别结果逐个保存为 JSON 与 Markdown 文件
+        
+        Args:
+            result: 判别结果字典
+            output_dir: 输出目录
+        
+        Returns:
+            JSON 文件名
+        """
+        output_dir = output_dir or self.config.output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        
+        # 生成文件名
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        query_safe = "".join(c for c in result["query"] if c.isalnum() or c in (' ', '-', '_')).rstrip()
+        query_safe = query_safe.replace(' ', '_')[:30]
+        
+        # 保存为 JSON 格式
+        json_filename = f"verification_result_{query_safe}_{timestamp}.json"
+        json_filepath = os.path.join(output_dir, json_filename)
+        
+        with open(json_filepath, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        
+        logger.info(f"判别结果已保存到: {json_filepath}")
+        
+        # 同时保存为 Markdown 格式
+        md_filename = f"verification_result_{query_safe}_{timestamp}.md"
+        md_filepath = os.path.join(output_dir, md_filename)
+        
+        # 根据判别结果选择emoji
+        emoji_map = {
+            "真": "✅",
+            "假": "❌",
+            "部分真实": "⚠️",
+            "无法确定": "❓"
+        }
+        emoji = emoji_map.get(result["verdict"], "❓")
+        
+        md_content = f"""# {emoji} 新闻真假判别结果
 
 ## 查询内容
 
@@ -164,20 +430,178 @@ class VerificationService:
 ---
 *此文件由新闻真假判别服务自动生成*
 """
+        
+        with open(md_filepath, 'w', encoding='utf-8') as f:
+            f.write(md_content)
+        
+        logger.info(f"判别结果（Markdown格式）已保存到: {md_filepath}")
+        
+        return json_filename
+
+
+class VerificationEnsemble:
+    """多模型集成判别：并发调用多个模型，达到法定数量的模型结论一致时立即返回"""
+    
+    def __init__(self, members: Dict[str, VerificationService], recorder: VerificationService,
+                 quorum: Optional[int] = None):
+        """
+        初始化
+        
+        Args:
+            members: 成员名称（provider:model）-> 判别服务（各自独立，不共享陈述缓存）
+            recorder: 用于构建与保存最终结果的判别服务
+            quorum: 达成一致所需的模型数，默认过半
+        """
+        if len(members) < 2:
+            raise ValueError("集成判别至少需要两个模型")
+        self.members = members
+        self.recorder = recorder
+        self.quorum = min(quorum or len(members) // 2 + 1, len(members))
+    
+    @property
+    def name(self) -> str:
+        """集成的名称（用于缓存键）"""
+        return "ensemble:" + ",".join(self.members)
+    
+    def verify_news(self, query: str, final_report: str, save_result: bool = False,
+                    output_dir: Optional[str] = None, task_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        集成判别：按完成顺序收集各模型的结论，某一结论得到 quorum 个模型支持时立即返回，
+        并取消其余成员：还在排队等待 LLM 并发名额的成员不再开始，正在进行的成员在当前这次调用结束后
+        不再发起后续调用（陈述判别、分段判别等）；全部完成仍未达到法定数量时按多数结论返回
+        
+        Args:
+            query: 原始查询/新闻内容
+            final_report: 完整的研究报告
+            save_result: 是否保存判别结果
+            output_dir: 输出目录
+            task_id: 关联的任务ID
             
-            with open(md_filepath, 'w', encoding='utf-8') as f:
-                f.write(md_content)
-            
-            logger.info(f"判别结果（Markdown格式）已保存到: {md_filepath}")
-            
-        except Exception as e:
-            logger.error(f"保存判别结果时发生错误: {str(e)}")
+        Returns:
+            与 verify_news 格式相同的判别结果，ensemble 字段给出各模型的结论与达成一致的模型
+        """
+        votes: Dict[str, Optional[str]] = {}
+        results: Dict[str, Dict[str, Any]] = {}
+        supporters: List[str] = []
+        
+        cancel = threading.Event()
+        
+        def run_member(name: str, service: VerificationService) -> Dict[str, Any]:
+            with cancellable(cancel):
+                try:
+                    return service.verify_news(query, final_report)
+                except CancelledError:
+                    logger.info(f"集成判别已达成一致，成员 {name} 被取消")
+                    raise
+        
+        executor = ThreadPoolExecutor(max_workers=len(self.members), thread_name_prefix="ensemble")
+        try:
+            futures = {
+                executor.submit(bind_context(run_member), name, service): name
+                for name, service in self.members.items()
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                result = future.result()
+                if result.get("error"):
+                    logger.warning(f"集成判别成员 {name} 失败: {result['error']}")
+                    votes[name] = None
+                    continue
+                votes[name] = result.get("verdict", UNKNOWN_VERDICT)
+                results[name] = result
+                supporters = [member for member, verdict in votes.items() if verdict == votes[name]]
+                if len(supporters) >= self.quorum:
+                    break
+        finally:
+            # 取消尚未结束的成员并且不等待它们，后台线程在当前调用结束后退出
+            cancel.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        reached_quorum = len(supporters) >= self.quorum
+        if reached_quorum:
+            verdict = votes[supporters[0]]
+        elif results:
+            verdict = vote_verdict([{"verdict": member_verdict} for member_verdict in votes.values() if member_verdict])
+            supporters = [member for member, member_verdict in votes.items() if member_verdict == verdict]
+        else:
+            raise RuntimeError("集成判别的所有模型均失败")
+        
+        summary = results[supporters[0]]["summary"] if supporters else "\n\n".join(
+            f"**{name}**（{result['verdict']}）：{result['summary']}" for name, result in results.items()
+        )
+        abandoned = [name for name in self.members if name not in votes]
+        logger.info(
+            f"集成判别结果: {verdict}（{len(supporters)}/{len(self.members)} 个模型一致，"
+            f"{'达到' if reached_quorum else '未达到'}法定数量 {self.quorum}，取消 {len(abandoned)} 个）"
+        )
+        
+        return self.recorder.build_result(query, {
+            "verdict": verdict,
+            "summary": summary,
+            "ensemble": {
+                "models": list(self.members),
+                "quorum": self.quorum,
+                "reached_quorum": reached_quorum,
+                "agreed": supporters,
+                "votes": votes,
+                "abandoned": abandoned
+            }
+        }, save_result, output_dir, task_id)
+
+
+def parse_ensemble_spec(spec: Optional[str] = None) -> List[Tuple[str, str]]:
+    """
+    解析集成判别的成员配置
+    
+    Args:
+        spec: 逗号分隔的 provider:model，默认读取 VERIFICATION_ENSEMBLE
+        
+    Returns:
+        (provider, model) 列表（去重，保持顺序）
+    """
+    spec = VERIFICATION_ENSEMBLE if spec is None else spec
+    members = []
+    for item in spec.split(","):
+        provider, _, model = item.strip().partition(":")
+        if provider.strip() and model.strip():
+            members.append((provider.strip().lower(), model.strip()))
+    return list(dict.fromkeys(members))
+
+
+def create_verification_ensemble(members: List[Tuple[str, str, str]], quorum: Optional[int] = None,
+                                 output_dir: Optional[str] = None) -> VerificationEnsemble:
+    """
+    创建集成判别的便捷函数
+    
+    Args:
+        members: (provider, model_name, api_key) 列表
+        quorum: 达成一致所需的模型数，默认读取 VERIFICATION_ENSEMBLE_QUORUM（0 表示过半）
+        output_dir: 输出目录
+        
+    Returns:
+        VerificationEnsemble实例
+    """
+    services = {
+        f"{provider}:{model_name}": create_verification_service(
+            api_key=api_key,
+            provider=provider,
+            model_name=model_name,
+            output_dir=output_dir,
+            shared_state=False
+        )
+        for provider, model_name, api_key in members
+    }
+    provider, model_name, api_key = members[0]
+    recorder = create_verification_service(api_key=api_key, provider=provider, model_name=model_name,
+                                           output_dir=output_dir)
+    return VerificationEnsemble(services, recorder, quorum or VERIFICATION_ENSEMBLE_QUORUM or None)
 
 
 def create_verification_service(api_key: Optional[str] = None, 
                                 provider: str = "deepseek",
                                 model_name: Optional[str] = None,
-                                output_dir: Optional[str] = None) -> VerificationService:
+                                output_dir: Optional[str] = None,
+                                shared_state: bool = True) -> VerificationService:
     """
     创建判别服务实例的便捷函数
     
@@ -186,6 +610,7 @@ def create_verification_service(api_key: Optional[str] = None,
         provider: LLM提供商 (deepseek/openai)
         model_name: 模型名称
         output_dir: 输出目录
+        shared_state: 是否使用共享的陈述缓存、结果存储与产物日志（集成判别的成员为 False，各模型独立判别）
         
     Returns:
         VerificationService实例
@@ -217,5 +642,14 @@ def create_verification_service(api_key: Optional[str] = None,
         output_dir=output_dir or "reports"
     )
     
-    return VerificationService(llm_client=llm_client, config=config)
+    if not shared_state:
+        return VerificationService(llm_client=llm_client, config=config)
+    
+    return VerificationService(
+        llm_client=llm_client,
+        config=config,
+        claim_cache=get_claim_cache(),
+        store=get_verification_store(),
+        artifact_log=get_artifact_log()
+    )
 
@@ -0,0 +1,256 @@
+"""
+判别结果存储
+把每次判别的结果写入 SQLite，并为查询、摘要与结论建立倒排索引（英文按单词、中文按字符二元组），
+支持按文本相似度、结论与日期快速查找已有的判别，回答“这条新闻是否已经判别过”
+"""
+
+import glob
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from typing import Dict, Any, List, Optional, Set
+from loguru import logger
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from claim_cache import normalize_claim
+
+
+# 存储文件路径，设置为空字符串时不保存
+VERIFICATION_STORE_PATH = os.getenv(
+    "VERIFICATION_STORE_PATH", os.path.join("query_engine_streamlit_reports", "verifications.db")
+)
+
+# 默认的最低匹配度（命中的检索词占查询检索词的比例）
+DEFAULT_MIN_SCORE = 0.5
+
+MAX_SEARCH_LIMIT = 100
+
+_TERMS = re.compile(r"[a-z0-9\u00c0-\u024f]+|[\u3400-\u9fff\uf900-\ufaff]+")
+_CJK = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]")
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """全角转半角并转为小写"""
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def index_terms(text: Optional[str]) -> Set[str]:
+    """
+    文本的检索词：英文与数字按单词，中文按相邻字符二元组（单字时为该字）
+
+    Args:
+        text: 文本
+
+    Returns:
+        检索词集合
+    """
+    terms = set()
+    for run in _TERMS.findall(normalize_text(text)):
+        if _CJK.match(run) and len(run) > 1:
+            terms.update(run[index:index + 2] for index in range(len(run) - 1))
+        else:
+            terms.add(run)
+    return terms
+
+
+def query_key(query: str) -> str:
+    """查询的精确匹配键（规范化文本的 SHA-1）"""
+    return hashlib.sha1(normalize_claim(query).encode("utf-8")).hexdigest()
+
+
+class VerificationStore:
+    """带倒排索引的判别结果存储（SQLite，线程安全）"""
+
+    def __init__(self, path: str):
+        """
+        初始化
+
+        Args:
+            path: SQLite 文件路径（":memory:" 表示仅在内存中）
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and path != ":memory:":
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS verifications ("
+                "id INTEGER PRIMARY KEY, task_id TEXT, query TEXT NOT NULL, query_key TEXT NOT NULL, "
+                "verdict TEXT NOT NULL, summary TEXT, timestamp TEXT, date TEXT, created_at REAL NOT NULL, "
+                "source TEXT UNIQUE, result TEXT NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS verifications_query_key ON verifications (query_key)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS verifications_date ON verifications (date)")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS verifications_created ON verifications (created_at)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS terms (term TEXT NOT NULL, id INTEGER NOT NULL, "
+                "PRIMARY KEY (term, id)) WITHOUT ROWID"
+            )
+
+    def add(self, result: Dict[str, Any], task_id: Optional[str] = None, source: Optional[str] = None) -> Optional[int]:
+        """
+        保存一次判别结果并建立索引
+
+        Args:
+            result: 判别结果（包含 query、verdict、summary、timestamp）
+            task_id: 关联的任务ID
+            source: 对应的结果文件名（同一文件只保存一次）
+
+        Returns:
+            记录ID；source 已存在时返回 None
+        """
+        query = result.get("query") or ""
+        verdict = result.get("verdict") or "无法确定"
+        summary = result.get("summary") or ""
+        timestamp = result.get("timestamp")
+        terms = index_terms(query) | index_terms(summary) | index_terms(verdict)
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "INSERT OR IGNORE INTO verifications "
+                "(task_id, query, query_key, verdict, summary, timestamp, date, created_at, source, result) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (task_id, query, query_key(query), verdict, summary, timestamp, (timestamp or "")[:10] or None,
+                 time.time(), source, json.dumps(result, ensure_ascii=False, default=str))
+            )
+            if not cursor.rowcount:
+                return None
+            record_id = cursor.lastrowid
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO terms (term, id) VALUES (?, ?)", ((term, record_id) for term in terms)
+            )
+            return record_id
+
+    def import_directory(self, directory: str) -> int:
+        """
+        导入目录中已有的 verification_result_*.json 文件（已导入的文件会跳过）
+
+        Returns:
+            新导入的记录数
+        """
+        imported = 0
+        for filepath in sorted(glob.glob(os.path.join(directory, "verification_result_*.json"))):
+            try:
+                with open(filepath, "r", encoding="utf-8") as f:
+                    result = json.load(f)
+                if isinstance(result, dict) and result.get("query") and self.add(result, source=os.path.basename(filepath)):
+                    imported += 1
+            except (OSError, ValueError) as e:
+                logger.debug(f"跳过无法读取的判别结果文件 {filepath}: {str(e)}")
+        return imported
+
+    def search(self, text: Optional[str] = None, verdict: Optional[str] = None, start: Optional[str] = None,
+               end: Optional[str] = None, limit: int = 10, min_score: float = DEFAULT_MIN_SCORE) -> List[Dict[str, Any]]:
+        """
+        查找判别结果
+
+        Args:
+            text: 检索文本（为空时按时间倒序列出）
+            verdict: 只返回该结论的结果
+            start: 起始日期（YYYY-MM-DD，含）
+            end: 结束日期（YYYY-MM-DD，含）
+            limit: 最多返回的结果数
+            min_score: 最低匹配度（命中的检索词占比）
+
+        Returns:
+            结果列表（task_id、query、verdict、summary、timestamp、score、exact），
+            查询完全相同的结果排在最前，其余按匹配度与时间排序
+        """
+        filters, params = [], []
+        if verdict:
+            filters.append("v.verdict = ?")
+            params.append(verdict)
+        if start:
+            filters.append("v.date >= ?")
+            params.append(start)
+        if end:
+            filters.append("v.date <= ?")
+            params.append(end)
+        where = f"WHERE {' AND '.join(filters)}" if filters else ""
+        columns = "v.id, v.task_id, v.query, v.verdict, v.summary, v.timestamp, v.query_key"
+
+        terms = sorted(index_terms(text))
+        with self._lock:
+            if not terms:
+                rows = self._connection.execute(
+                    f"SELECT {columns}, 0 FROM verifications v {where} ORDER BY v.created_at DESC LIMIT ?",
+                    (*params, limit)
+                ).fetchall()
+            else:
+                required = max(1, int(len(terms) * min_score + 0.999999))
+                placeholders = ",".join("?" * len(terms))
+                rows = self._connection.execute(
+                    f"SELECT {columns}, m.hits FROM ("
+                    f"SELECT id, COUNT(*) AS hits FROM terms WHERE term IN ({placeholders}) "
+                    f"GROUP BY id HAVING hits >= ?) m JOIN verifications v ON v.id = m.id {where} "
+                    f"ORDER BY v.query_key = ? DESC, m.hits DESC, v.created_at DESC LIMIT ?",
+                    (*terms, required, *params, query_key(text), limit)
+                ).fetchall()
+
+        exact_key = query_key(text) if terms else None
+        return [
+            {
+                "id": record_id,
+                "task_id": task_id,
+                "query": query,
+                "verdict": record_verdict,
+                "summary": summary,
+                "timestamp": timestamp,
+                "score": round(hits / len(terms), 3) if terms else None,
+                "exact": record_key == exact_key
+            }
+            for record_id, task_id, query, record_verdict, summary, timestamp, record_key, hits in rows
+        ]
+
+    def get(self, record_id: int) -> Optional[Dict[str, Any]]:
+        """获取完整的判别结果"""
+        with self._lock:
+            row = self._connection.execute("SELECT result FROM verifications WHERE id = ?", (record_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            count = self._connection.execute("SELECT COUNT(*) FROM verifications").fetchone()[0]
+        return {"path": self.path, "results": count}
+
+
+_shared_store: Optional[VerificationStore] = None
+_shared_store_lock = threading.Lock()
+
+
+def get_verification_store(path: Optional[str] = None) -> Optional[VerificationStore]:
+    """
+    获取进程内共享的判别结果存储（首次调用时打开，并导入同目录中已有的结果文件）
+
+    Args:
+        path: 存储文件路径，默认使用 VERIFICATION_STORE_PATH
+
+    Returns:
+        VerificationStore实例；路径为空或无法打开时返回 None
+    """
+    global _shared_store
+    path = VERIFICATION_STORE_PATH if path is None else path
+    if not path:
+        return None
+    with _shared_store_lock:
+        if _shared_store is None or _shared_store.path != path:
+            try:
+                store = VerificationStore(path)
+            except sqlite3.Error as e:
+                logger.warning(f"无法打开判别结果存储 {path}: {str(e)}")
+                return None
+            imported = store.import_directory(os.path.dirname(path) or ".")
+            logger.info(f"判别结果存储: {path}（导入已有结果文件 {imported} 个）")
+            _shared_store = store
+        return _shared_store
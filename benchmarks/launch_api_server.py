@@ -0,0 +1,73 @@
+"""
+将 API 服务器指向本地上游替身服务后启动
+
+所有 openai SDK 客户端（DeepSeek 同协议）和 Tavily 客户端的地址都会被改写到
+--upstream 指定的地址，不会访问外网
+
+运行方式:
+    python benchmarks/launch_api_server.py --port 6101 --upstream http://127.0.0.1:7001
+"""
+
+import argparse
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(PROJECT_ROOT, "backend")
+
+
+def redirect_upstreams(upstream_url: str):
+    """
+    把 LLM 与搜索客户端的地址改写到本地替身服务
+
+    Args:
+        upstream_url: 替身服务地址，如 http://127.0.0.1:7001
+    """
+    upstream_url = upstream_url.rstrip("/")
+
+    import openai
+
+    original_openai_init = openai.OpenAI.__init__
+
+    def openai_init(self, *args, **kwargs):
+        kwargs["base_url"] = f"{upstream_url}/v1"
+        kwargs.setdefault("api_key", "stub")
+        original_openai_init(self, *args, **kwargs)
+
+    openai.OpenAI.__init__ = openai_init
+
+    from tavily import TavilyClient
+
+    original_tavily_init = TavilyClient.__init__
+
+    def tavily_init(self, *args, **kwargs):
+        original_tavily_init(self, *args, **kwargs)
+        self.base_url = upstream_url
+
+    TavilyClient.__init__ = tavily_init
+
+
+def main():
+    parser = argparse.ArgumentParser(description="使用本地上游替身启动 API 服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6101)
+    parser.add_argument("--upstream", default="http://127.0.0.1:7001", help="上游替身服务地址")
+    args = parser.parse_args()
+
+    # 配置项需要在导入 api_server（及其 config）之前设置
+    os.environ.setdefault("QUERY_ENGINE_API_KEY", "stub")
+    os.environ.setdefault("TAVILY_API_KEY", "stub")
+    os.environ["QUERY_ENGINE_BASE_URL"] = f"{args.upstream.rstrip('/')}/v1"
+
+    redirect_upstreams(args.upstream)
+
+    # api_server 使用相对 backend 目录的导入和静态目录
+    os.chdir(BACKEND_DIR)
+    sys.path.insert(0, BACKEND_DIR)
+    import api_server
+
+    api_server.app.run(host=args.host, port=args.port, debug=False, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""
+API 服务器压测工具
+按目标速率发起真实的请求组合（创建查询、轮询状态、获取结果、判别、时间线、Mermaid），
+统计吞吐量、各接口 p50/p95/p99 延迟，并通过逐级加压找到饱和点
+
+离线运行（自动启动上游替身服务和 API 服务器）:
+    python benchmarks/load_test.py --spawn --rates 0.2,0.5,1,2 --duration 60
+
+压测已运行的服务器:
+    python benchmarks/load_test.py --server-url http://127.0.0.1:6101 --rates 1 --duration 120
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SAMPLE_QUERIES = [
+    "OpenAI 投资 AMD 一千亿美元",
+    "特斯拉股东批准马斯克薪酬方案",
+    "央行下调 LPR 利率",
+    "某地发生地震的最新消息",
+    "新能源汽车出口数据",
+    "人工智能监管新规",
+]
+
+# 默认请求组合：每个会话执行各步骤的概率，以及模式分布
+DEFAULT_MIX = {
+    "deep": 0.3,
+    "quick": 0.7,
+    "result": 1.0,
+    "verification": 1.0,
+    "timeline": 1.0,
+    "mermaid": 0.8,
+}
+
+
+def parse_mix(spec: Optional[str]) -> Dict[str, float]:
+    """解析 key=value,key=value 形式的请求组合"""
+    mix = dict(DEFAULT_MIX)
+    if spec:
+        for part in spec.split(","):
+            key, _, value = part.partition("=")
+            mix[key.strip()] = float(value)
+    return mix
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """最近秩法计算百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class RequestRecorder:
+    """记录每个请求的接口、延迟与结果（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: List[Dict[str, Any]] = []
+        self.sessions: List[Dict[str, Any]] = []
+
+    def add_request(self, endpoint: str, latency: float, ok: bool, status: Optional[int]):
+        with self._lock:
+            self.requests.append({"endpoint": endpoint, "latency": latency, "ok": ok, "status": status, "at": time.time()})
+
+    def add_session(self, latency: float, ok: bool, task_status: str):
+        with self._lock:
+            self.sessions.append({"latency": latency, "ok": ok, "task_status": task_status, "finished_at": time.time()})
+
+
+class LoadSession:
+    """一个用户会话：创建查询并等待结果，再依次加载判别、时间线与 Mermaid"""
+
+    def __init__(self, base_url: str, recorder: RequestRecorder, mix: Dict[str, float],
+                 poll_interval: float, session_timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.recorder = recorder
+        self.mix = mix
+        self.poll_interval = poll_interval
+        self.session_timeout = session_timeout
+        self.http = requests.Session()
+
+    def _call(self, endpoint: str, method: str, path: str, **kwargs) -> Optional[requests.Response]:
+        start = time.time()
+        try:
+            response = self.http.request(method, f"{self.base_url}{path}", timeout=self.session_timeout, **kwargs)
+            self.recorder.add_request(endpoint, time.time() - start, response.status_code < 400, response.status_code)
+            return response
+        except requests.exceptions.RequestException:
+            self.recorder.add_request(endpoint, time.time() - start, False, None)
+            return None
+
+    def run(self):
+        """执行会话，无论成功、失败还是出现异常都记录一次会话结果"""
+        start = time.time()
+        try:
+            ok, task_status = self._run(start)
+        except ValueError:
+            ok, task_status = False, "invalid_response"  # 响应不是合法的 JSON
+        except Exception:
+            ok, task_status = False, "client_error"
+        self.recorder.add_session(time.time() - start, ok, task_status)
+
+    def _run(self, start: float) -> Tuple[bool, str]:
+        mode = "deep" if random.random() < self.mix["deep"] / (self.mix["deep"] + self.mix["quick"]) else "quick"
+        response = self._call("POST /api/query", "POST", "/api/query",
+                              json={"query": random.choice(SAMPLE_QUERIES), "mode": mode})
+        if response is None or response.status_code != 200:
+            return False, "create_failed"
+
+        task_id = response.json().get("task_id")
+        task_status = "pending"
+        while time.time() - start < self.session_timeout:
+            response = self._call("GET /api/query/<id>/status", "GET", f"/api/query/{task_id}/status")
+            if response is not None and response.status_code == 200:
+                task_status = response.json().get("task", {}).get("status", task_status)
+                if task_status in ("completed", "error"):
+                    break
+            time.sleep(self.poll_interval)
+
+        if task_status != "completed":
+            return False, task_status
+
+        # 后续任一请求失败（无响应或状态码 >= 400）时会话记为失败
+        followups = []
+        if random.random() < self.mix["result"]:
+            followups.append(self._call("GET /api/query/<id>", "GET", f"/api/query/{task_id}"))
+        if random.random() < self.mix["verification"]:
+            followups.append(self._call("POST /api/verification", "POST", "/api/verification", json={"task_id": task_id}))
+        if random.random() < self.mix["timeline"]:
+            followups.append(self._call("GET /api/timeline/query/<id>", "GET", f"/api/timeline/query/{task_id}"))
+        if random.random() < self.mix["mermaid"]:
+            followups.append(self._call("POST /api/timeline/mermaid", "POST", "/api/timeline/mermaid", json={"task_id": task_id}))
+
+        if any(response is None or response.status_code >= 400 for response in followups):
+            return False, "followup_failed"
+        return True, task_status
+
+
+def completion_throughput(finish_times: List[float], duration: float) -> float:
+    """
+    会话完成速率：按第一个到最后一个会话完成之间的跨度计算（n 个完成时刻之间有 n - 1 个间隔）
+
+    未饱和时完成时刻只是到达时刻平移一个会话延迟，速率与到达速率相当；
+    饱和时会话排队，完成跨度被拉长，速率降为服务能力。不计入首个会话完成前的爬升与最后的排空时间
+    """
+    if len(finish_times) < 2:
+        return len(finish_times) / duration if duration else 0.0
+    span = max(finish_times) - min(finish_times)
+    return (len(finish_times) - 1) / span if span > 0 else 0.0
+
+
+def summarize(recorder: RequestRecorder, offered_rate: float, start: float, duration: float,
+              elapsed: float) -> Dict[str, Any]:
+    """
+    汇总一个压力级别的统计结果
+
+    Args:
+        recorder: 请求记录
+        offered_rate: 目标到达速率（会话/秒）
+        start: 开始发起会话的时间
+        duration: 发起会话的时长（秒）
+        elapsed: 从开始到所有会话结束的时长（秒，包含排空时间）
+    """
+    by_endpoint: Dict[str, List[Dict[str, Any]]] = {}
+    for record in recorder.requests:
+        by_endpoint.setdefault(record["endpoint"], []).append(record)
+
+    endpoints = {}
+    for endpoint, records in sorted(by_endpoint.items()):
+        latencies = [r["latency"] for r in records]
+        errors = sum(1 for r in records if not r["ok"])
+        endpoints[endpoint] = {
+            "count": len(records),
+            "error_rate": round(errors / len(records), 4),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+        }
+
+    sessions = recorder.sessions
+    ok_sessions = [s for s in sessions if s["ok"]]
+    session_latencies = [s["latency"] for s in ok_sessions]
+    last_finish = max((s["finished_at"] for s in sessions), default=start + duration)
+    return {
+        "offered_rate": offered_rate,
+        "arrival_rate": round(len(sessions) / duration, 4) if duration else 0.0,
+        "elapsed": round(elapsed, 3),
+        "drain_time": round(max(0.0, last_finish - (start + duration)), 3),
+        "sessions": len(sessions),
+        "sessions_ok": len(ok_sessions),
+        "session_throughput": round(completion_throughput([s["finished_at"] for s in ok_sessions], duration), 4),
+        "request_throughput": round(len(recorder.requests) / elapsed, 4) if elapsed else 0.0,
+        "session_error_rate": round(1 - len(ok_sessions) / len(sessions), 4) if sessions else 0.0,
+        "session_p50": percentile(session_latencies, 50),
+        "session_p95": percentile(session_latencies, 95),
+        "session_p99": percentile(session_latencies, 99),
+        "endpoints": endpoints,
+    }
+
+
+def run_level(base_url: str, rate: float, duration: float, mix: Dict[str, float],
+              poll_interval: float, session_timeout: float, max_workers: int) -> Dict[str, Any]:
+    """以泊松到达的方式按目标速率发起会话，并等待所有会话结束"""
+    recorder = RequestRecorder()
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        next_arrival = start
+        while next_arrival - start < duration:
+            delay = next_arrival - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            session = LoadSession(base_url, recorder, mix, poll_interval, session_timeout)
+            executor.submit(session.run)
+            next_arrival += random.expovariate(rate)
+    return summarize(recorder, rate, start, duration, time.time() - start)
+
+
+def find_saturation(levels: List[Dict[str, Any]], max_error_rate: float,
+                    min_efficiency: float, latency_factor: float) -> Dict[str, Any]:
+    """
+    找到饱和点：会话完成速率跟不上实际到达速率、错误率过高或会话延迟明显劣化的第一个压力级别
+
+    泊松到达的实际速率与目标速率会有偏差，吞吐量与实际到达速率比较
+    """
+    baseline_p95 = levels[0]["session_p95"] if levels else None
+    last_healthy = None
+    for level in levels:
+        reasons = []
+        if level["session_throughput"] < level["arrival_rate"] * min_efficiency:
+            reasons.append("throughput")
+        if level["session_error_rate"] > max_error_rate:
+            reasons.append("errors")
+        if baseline_p95 and level["session_p95"] and level["session_p95"] > baseline_p95 * latency_factor:
+            reasons.append("latency")
+        if reasons:
+            return {"saturated_at": level["offered_rate"], "last_healthy_rate": last_healthy, "reasons": reasons}
+        last_healthy = level["offered_rate"]
+    return {"saturated_at": None, "last_healthy_rate": last_healthy, "reasons": []}
+
+
+def wait_until_ready(url: str, timeout: float = 60.0):
+    """等待服务可以响应"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url, timeout=2).status_code == 200:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"服务未在 {timeout} 秒内就绪: {url}")
+
+
+def spawn_services(args) -> List[subprocess.Popen]:
+    """启动上游替身服务和指向它的 API 服务器"""
+    upstream_url = f"http://127.0.0.1:{args.upstream_port}"
+    stub = subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, "stub_upstreams.py"),
+        "--port", str(args.upstream_port),
+        "--llm-latency", args.llm_latency,
+        "--search-latency", args.search_latency,
+        "--error-rate", str(args.error_rate),
+    ])
+    server = subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, "launch_api_server.py"),
+        "--port", str(args.server_port),
+        "--upstream", upstream_url,
+    ])
+    processes = [stub, server]
+    try:
+        wait_until_ready(f"{upstream_url}/health")
+        wait_until_ready(f"http://127.0.0.1:{args.server_port}/api/metrics")
+    except Exception:
+        for process in processes:
+            process.terminate()
+        raise
+    return processes
+
+
+def print_level(level: Dict[str, Any]):
+    def fmt(value):
+        return f"{value:.3f}" if isinstance(value, float) else "-"
+
+    print(f"\n=== 目标速率 {level['offered_rate']} 会话/秒 ===")
+    print(f"会话: {level['sessions_ok']}/{level['sessions']} 成功, 到达 {level['arrival_rate']} 会话/秒, "
+          f"完成 {level['session_throughput']} 会话/秒, 排空 {level['drain_time']} 秒, "
+          f"{level['request_throughput']} 请求/秒, 会话 p50/p95/p99 = "
+          f"{fmt(level['session_p50'])}/{fmt(level['session_p95'])}/{fmt(level['session_p99'])} 秒")
+    print(f"{'接口':<32}{'请求数':>8}{'错误率':>8}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for endpoint, stats in level["endpoints"].items():
+        print(f"{endpoint:<32}{stats['count']:>8}{stats['error_rate']:>8.2%}"
+              f"{fmt(stats['p50']):>9}{fmt(stats['p95']):>9}{fmt(stats['p99']):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verum API 服务器压测")
+    parser.add_argument("--server-url", default=None, help="已运行的 API 服务器地址（不使用 --spawn 时必需）")
+    parser.add_argument("--spawn", action="store_true", help="自动启动上游替身服务和 API 服务器")
+    parser.add_argument("--server-port", type=int, default=6101)
+    parser.add_argument("--upstream-port", type=int, default=7001)
+    parser.add_argument("--llm-latency", default="lognormal:0.8,0.5", help="替身 LLM 延迟分布")
+    parser.add_argument("--search-latency", default="uniform:0.2,0.8", help="替身搜索延迟分布")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="替身上游错误率")
+    parser.add_argument("--rates", default="0.2,0.5,1,2", help="逐级加压的会话到达速率（会话/秒）")
+    parser.add_argument("--duration", type=float, default=60.0, help="每个压力级别的持续时间（秒）")
+    parser.add_argument("--mix", default=None, help="请求组合，如 deep=0.3,quick=0.7,mermaid=0.5")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="状态轮询间隔（秒）")
+    parser.add_argument("--session-timeout", type=float, default=600.0, help="单个会话超时（秒）")
+    parser.add_argument("--max-workers", type=int, default=512, help="并发会话上限")
+    parser.add_argument("--max-error-rate", type=float, default=0.05, help="判定饱和的会话错误率")
+    parser.add_argument("--min-efficiency", type=float, default=0.9, help="判定饱和的会话吞吐量/实际到达速率比例")
+    parser.add_argument("--latency-factor", type=float, default=2.0, help="判定饱和的会话 p95 劣化倍数")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+    parser.add_argument("--report", default=None, help="将结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    if not args.spawn and not args.server_url:
+        parser.error("请提供 --server-url 或使用 --spawn")
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    processes = spawn_services(args) if args.spawn else []
+    base_url = args.server_url or f"http://127.0.0.1:{args.server_port}"
+    mix = parse_mix(args.mix)
+
+    try:
+        levels = []
+        for rate in [float(r) for r in args.rates.split(",")]:
+            level = run_level(base_url, rate, args.duration, mix, args.poll_interval,
+                              args.session_timeout, args.max_workers)
+            print_level(level)
+            levels.append(level)
+
+        saturation = find_saturation(levels, args.max_error_rate, args.min_efficiency, args.latency_factor)
+        print(f"\n饱和点: {saturation}")
+
+        try:
+            server_metrics = requests.get(f"{base_url}/api/metrics", timeout=10).json()
+        except (requests.exceptions.RequestException, ValueError):
+            server_metrics = None
+
+        report = {
+            "config": vars(args),
+            "mix": mix,
+            "levels": levels,
+            "saturation": saturation,
+            "server_metrics": server_metrics,
+        }
+        if args.report:
+            os.makedirs(os.path.dirname(os.path.abspath(args.report)), exist_ok=True)
+            with open(args.report, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"压测结果已保存到: {args.report}")
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+本地上游替身服务
+模拟 OpenAI 兼容的 LLM 接口（DeepSeek 同协议）和 Tavily 搜索接口，
+支持配置延迟分布和错误率，用于离线压测 API 服务器
+
+运行方式:
+    python benchmarks/stub_upstreams.py --port 7001 --llm-latency lognormal:0.5,0.4 --search-latency uniform:0.2,0.8 --error-rate 0.01
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Any, List
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """
+    解析延迟分布描述
+
+    支持的格式:
+        fixed:0.5            固定 0.5 秒
+        uniform:0.2,1.5      0.2~1.5 秒均匀分布
+        normal:1.0,0.2       正态分布（均值, 标准差）
+        lognormal:0.5,0.4    对数正态分布（中位数, sigma）
+        exp:0.8              指数分布（均值）
+
+    Args:
+        spec: 延迟分布描述
+
+    Returns:
+        每次调用返回一个延迟（秒）的函数
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v.strip()] if params else []
+
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        import math
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+    if kind == "exp":
+        return lambda: random.expovariate(1.0 / values[0])
+    raise ValueError(f"无法识别的延迟分布: {spec}")
+
+
+# 按系统提示词中的关键字选择替身回复（覆盖两个 Agent 的各个节点）
+def _stub_llm_reply(system_prompt: str, user_prompt: str) -> str:
+    """根据提示词内容生成结构上合法的替身回复"""
+    prompt = f"{system_prompt}\n{user_prompt}"
+
+    if '"deep"' in prompt and '"quick"' in prompt:
+        return random.choice(["deep", "quick"])
+    if "verdict" in prompt or "真假" in prompt:
+        return json.dumps({
+            "verdict": random.choice(["真", "假", "部分真实", "无法确定"]),
+            "summary": "替身判别摘要：" + "相关报道与多方信源基本一致。" * 5
+        }, ensure_ascii=False)
+    if "timeline" in prompt.lower() and "mermaid" in prompt.lower():
+        return "timeline\n    title 替身时间线\n    2025-11-01 : 事件一\n    2025-11-05 : 事件二 : 事件三"
+    if "paragraph_latest_state" in prompt:
+        return json.dumps({"paragraph_latest_state": "替身段落总结。" * 40}, ensure_ascii=False)
+    if "search_query" in prompt:
+        return json.dumps({
+            "search_query": "替身搜索关键词",
+            "search_tool": "basic_search_news",
+            "reasoning": "替身推理过程"
+        }, ensure_ascii=False)
+    if '"title"' in prompt and '"content"' in prompt:
+        return json.dumps([
+            {"title": f"替身段落{i + 1}", "content": "替身段落预期内容"} for i in range(3)
+        ], ensure_ascii=False)
+    return "# 替身报告\n\n" + "这是用于压测的替身报告内容。\n\n" * 30
+
+
+def _stub_search_results(query: str, max_results: int) -> List[Dict[str, Any]]:
+    """生成带有随机日期的替身搜索结果"""
+    now = datetime.now()
+    results = []
+    for i in range(max_results):
+        published = now - timedelta(days=random.randint(0, 60), minutes=random.randint(0, 1440))
+        results.append({
+            "title": f"{query} 相关报道 {i + 1}",
+            "url": f"https://news.example.com/{uuid.uuid4().hex[:12]}",
+            "content": f"{query} 的替身新闻内容。" * 50,
+            "raw_content": None,
+            "score": round(random.uniform(0.3, 0.99), 4),
+            "published_date": published.strftime("%a, %d %b %Y %H:%M:%S GMT")
+        })
+    return results
+
+
+class StubUpstreamHandler(BaseHTTPRequestHandler):
+    """处理 LLM 与搜索请求"""
+
+    server_version = "VerumStubUpstream/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # 压测时关闭逐请求日志
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        config = self.server.stub_config
+
+        if self.path.rstrip("/").endswith("/chat/completions"):
+            self._sleep_and_maybe_fail(config["llm_latency"], config["error_rate"])
+            if not self._failed:
+                self._handle_chat(body)
+        elif self.path.rstrip("/").endswith("/search"):
+            self._sleep_and_maybe_fail(config["search_latency"], config["error_rate"])
+            if not self._failed:
+                self._handle_search(body)
+        else:
+            self._send_json(404, {"error": f"unknown path: {self.path}"})
+
+        with self.server.stats_lock:
+            self.server.stats[self.path] = self.server.stats.get(self.path, 0) + 1
+
+    def do_GET(self):
+        if self.path == "/health":
+            with self.server.stats_lock:
+                self._send_json(200, {"status": "ok", "requests": dict(self.server.stats)})
+        else:
+            self._send_json(404, {"error": f"unknown path: {self.path}"})
+
+    def _sleep_and_maybe_fail(self, latency: Callable[[], float], error_rate: float):
+        time.sleep(latency())
+        self._failed = random.random() < error_rate
+        if self._failed:
+            status = random.choice([429, 500, 503])
+            self._send_json(status, {"error": {"message": "stub upstream injected error", "code": status}})
+
+    def _handle_chat(self, body: Dict[str, Any]):
+        messages = body.get("messages", [])
+        system_prompt = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+        user_prompt = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        content = _stub_llm_reply(str(system_prompt), str(user_prompt))
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages)
+        completion_tokens = len(content)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:16]}"
+        model = body.get("model", "stub-model")
+
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            step = 64
+            for start in range(0, len(content), step):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": content[start:start + step]}, "finish_reason": None}]
+                }
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            final = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens
+                }
+            }
+            self.wfile.write(f"data: {json.dumps(final, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+            return
+
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        })
+
+    def _handle_search(self, body: Dict[str, Any]):
+        query = body.get("query", "")
+        max_results = int(body.get("max_results") or 5)
+        self._send_json(200, {
+            "query": query,
+            "answer": None,
+            "images": [],
+            "results": _stub_search_results(query, max_results),
+            "response_time": 0.1
+        })
+
+    def _send_json(self, status: int, payload: Dict[str, Any]):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def create_stub_server(host: str, port: int, llm_latency: str = "fixed:0.5",
+                       search_latency: str = "fixed:0.3", error_rate: float = 0.0) -> ThreadingHTTPServer:
+    """
+    创建上游替身服务
+
+    Args:
+        host: 监听地址
+        port: 监听端口
+        llm_latency: LLM 延迟分布
+        search_latency: 搜索延迟分布
+        error_rate: 注入错误的概率（0~1）
+
+    Returns:
+        ThreadingHTTPServer 实例（调用 serve_forever 启动）
+    """
+    server = ThreadingHTTPServer((host, port), StubUpstreamHandler)
+    server.daemon_threads = True
+    server.stub_config = {
+        "llm_latency": parse_latency(llm_latency),
+        "search_latency": parse_latency(search_latency),
+        "error_rate": error_rate
+    }
+    server.stats = {}
+    server.stats_lock = threading.Lock()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 LLM / 搜索上游替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7001)
+    parser.add_argument("--llm-latency", default="lognormal:0.8,0.5", help="LLM 延迟分布")
+    parser.add_argument("--search-latency", default="uniform:0.2,0.8", help="搜索延迟分布")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="注入错误的概率")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    server = create_stub_server(args.host, args.port, args.llm_latency, args.search_latency, args.error_rate)
+    print(f"上游替身服务已启动: http://{args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+"""
+TimelineService 微基准测试
+生成包含 1k~100k 条搜索结果的合成 state_data，分阶段统计耗时与内存分配，并与保存的基线比较
+
+运行方式:
+    python benchmarks/timeline_bench.py                      # 与基线比较
+    python benchmarks/timeline_bench.py --save-baseline      # 更新基线
+    python benchmarks/timeline_bench.py --sizes 1000 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Callable, Optional, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "backend"))
+
+from loguru import logger
+from timeline_service import TimelineService
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baselines", "timeline_service.json")
+
+# 搜索结果中常见的日期格式及其占比
+DATE_FORMATS: List[Tuple[float, Callable[[datetime], Any]]] = [
+    (0.25, lambda dt: dt.strftime("%Y-%m-%dT%H:%M:%S")),
+    (0.10, lambda dt: dt.strftime("%Y-%m-%d %H:%M:%S")),
+    (0.10, lambda dt: dt.strftime("%Y-%m-%d")),
+    (0.15, lambda dt: dt.strftime("%a, %d %b %Y %H:%M:%S GMT")),
+    (0.10, lambda dt: dt.strftime("%Y-%m-%dT%H:%M:%S+08:00")),
+    (0.05, lambda dt: dt.strftime("%Y-%m-%dT%H:%M:%SZ")),
+    (0.05, lambda dt: dt.strftime("%Y/%m/%d %H:%M")),
+    (0.05, lambda dt: dt.strftime("%Y.%m.%d")),
+    (0.10, lambda dt: f"{dt.year}年{dt.month}月{dt.day}日"),
+    (0.05, lambda dt: None),
+]
+
+# 报道正文的句式，{0}/{1} 处填入所属事件的专有名词，使不同事件的报道用词不同
+SAMPLE_SENTENCES = [
+    "据多家媒体报道，{0}于当日正式宣布了与{1}有关的消息。",
+    "市场分析人士认为，{0}事件可能对{1}的格局产生深远影响。",
+    "官方发言人表示，目前针对{0}的调查仍在进行中，将适时公布{1}的进展。",
+    "业内专家指出，{0}与{1}之间类似的情况在过去几年中已多次出现。",
+    "The announcement about {0} was confirmed by several independent sources on Monday.",
+    "截至发稿时，{0}与{1}尚未对此作出进一步回应。",
+]
+
+# 每个事件的报道数量范围，以及其中由其他媒体原样转载（标题与正文开头相同、链接不同）的比例
+STORY_SIZE = (1, 12)
+SYNDICATION_RATIO = 0.3
+
+# 带 LRU 缓存的函数：(模块, 函数名)；每次重复前清空，计时反映新任务（冷缓存）的耗时，
+# 否则第 2 次及以后的重复直接命中上一次留下的缓存，中位数会高估优化效果
+CACHED_FUNCTIONS = [
+    ("date_normalizer", "_normalize_string"),
+    ("url_utils", "canonicalize_url"),
+]
+
+SITES = ["新华网", "人民网", "财新网", "澎湃新闻", "Reuters", "Bloomberg", "界面新闻", "第一财经"]
+
+
+def _pick_format(rng: random.Random) -> Callable[[datetime], Any]:
+    point = rng.random()
+    cumulative = 0.0
+    for weight, formatter in DATE_FORMATS:
+        cumulative += weight
+        if point < cumulative:
+            return formatter
+    return DATE_FORMATS[-1][1]
+
+
+def _story_terms(rng: random.Random) -> List[str]:
+    """一个事件的专有名词（随机汉字组成的 2~3 字词）"""
+    return ["".join(chr(rng.randint(0x4E00, 0x9FA5)) for _ in range(rng.randint(2, 3))) for _ in range(4)]
+
+
+def generate_state_data(num_searches: int, num_paragraphs: int = 5, duplicate_ratio: float = 0.2,
+                        seed: int = 42) -> Dict[str, Any]:
+    """
+    生成合成的 state_data
+
+    搜索结果来自若干事件：同一事件的报道共享专有名词、发布时间相近，其中一部分是其他媒体的转载；
+    每条搜索结果的 story 字段记录所属事件，用于检查故事线是否把不同事件合并在一起
+
+    Args:
+        num_searches: 搜索结果总数
+        num_paragraphs: 段落数
+        duplicate_ratio: 跨段落重复出现的搜索结果比例
+        seed: 随机种子
+
+    Returns:
+        与 Agent 状态结构一致的字典
+    """
+    rng = random.Random(seed)
+    base_time = datetime(2025, 11, 10, 12, 0, 0, tzinfo=timezone.utc)
+    unique_count = max(1, int(num_searches * (1 - duplicate_ratio)))
+
+    unique_items = []
+    story = 0
+    while len(unique_items) < unique_count:
+        terms = _story_terms(rng)
+        story_time = base_time - timedelta(days=rng.randint(0, 90), minutes=rng.randint(0, 1440))
+        reports = []
+        for _ in range(min(rng.randint(*STORY_SIZE), unique_count - len(unique_items))):
+            i = len(unique_items)
+            site = rng.choice(SITES)
+            dt = story_time + timedelta(minutes=rng.randint(0, 180))
+            if reports and rng.random() < SYNDICATION_RATIO:
+                # 转载：标题与正文相同（末尾注明出处），来源与链接不同
+                original = rng.choice(reports)
+                title, content = original["title"], f"{original['content']}（来源：{original['website_name']}）"
+            else:
+                title = f"{terms[0]}{rng.choice(['宣布', '回应', '启动', '暂停'])}{terms[1]}，{terms[2]}{terms[3]}受关注"
+                content = "".join(
+                    rng.choice(SAMPLE_SENTENCES).format(*rng.sample(terms, 2)) for _ in range(rng.randint(5, 40))
+                )
+            report = {
+                "query": f"搜索关键词 {i % 50}",
+                "url": f"https://news{i % 97}.example.com/article/{i}?utm_source=feed",
+                "title": title,
+                "content": content,
+                "score": round(rng.uniform(0.2, 0.99), 4),
+                "published_date": _pick_format(rng)(dt),
+                "timestamp": base_time.isoformat(),
+                "website_name": site,
+                "story": story,
+            }
+            reports.append(report)
+            unique_items.append(report)
+        story += 1
+
+    all_items = unique_items + [rng.choice(unique_items) for _ in range(num_searches - unique_count)]
+    rng.shuffle(all_items)
+
+    paragraphs = []
+    chunk = (len(all_items) + num_paragraphs - 1) // num_paragraphs
+    for p in range(num_paragraphs):
+        paragraphs.append({
+            "title": f"段落 {p + 1}",
+            "content": "段落预期内容",
+            "research": {
+                "search_history": [dict(item) for item in all_items[p * chunk:(p + 1) * chunk]],
+                "latest_summary": "段落总结",
+                "reflection_iteration": 2,
+                "is_completed": True,
+            },
+        })
+
+    return {"query": "合成查询", "report_title": "合成报告", "paragraphs": paragraphs}
+
+
+def clear_caches():
+    """清空服务内部的 LRU 缓存（尚未实现缓存的模块或函数会被跳过）"""
+    for module_name, function_name in CACHED_FUNCTIONS:
+        function = getattr(sys.modules.get(module_name), function_name, None)
+        if hasattr(function, "cache_clear"):
+            function.cache_clear()
+
+
+def run_pipeline(service: TimelineService, state_data: Dict[str, Any],
+                 context: Optional[Dict[str, Any]] = None) -> List[Tuple[str, Callable[[], Any]]]:
+    """
+    按 generate_timeline 的阶段顺序构造可单独计时的步骤
+
+    Args:
+        context: 保存中间结果的字典（searches/unique/processed/grouped/timeline），None 时使用内部字典
+
+    Returns:
+        [(阶段名, 执行函数)]，执行函数依次调用且共享中间结果
+    """
+    context = {} if context is None else context
+
+    def extract():
+        context["searches"] = service._extract_all_searches(state_data)
+
+    def deduplicate():
+        context["unique"] = service._deduplicate_sources(context["searches"])
+
+    def process_dates():
+        context["processed"] = service._process_dates(context.get("unique", context["searches"]))
+
+    def group_by_date():
+        context["grouped"] = service._group_by_date(context["processed"])
+
+    def build_timeline():
+        context["timeline"] = service._build_timeline(context["grouped"])
+
+    def format_markdown():
+        service.format_timeline_markdown({
+            "timeline": context["timeline"],
+            "total_sources": len(context["processed"]),
+            "date_range": service._calculate_date_range(context["processed"]),
+        })
+
+    steps = [("_extract_all_searches", extract)]
+    if hasattr(service, "_deduplicate_sources"):
+        # 没有去重阶段的旧版本（用于生成基线）直接处理全部搜索结果
+        steps.append(("_deduplicate_sources", deduplicate))
+    return steps + [
+        ("_process_dates", process_dates),
+        ("_group_by_date", group_by_date),
+        ("_build_timeline", build_timeline),
+        ("format_timeline_markdown", format_markdown),
+    ]
+
+
+def storyline_quality(state_data: Dict[str, Any], timeline: List[Dict[str, Any]]) -> Tuple[float, float]:
+    """
+    用生成数据中的 story 字段检查事件聚合的质量
+
+    Returns:
+        (纯度：每个事件中占多数的事件的来源数之和 / 来源总数，低于 1 说明把不同事件合并在了一起,
+         碎片度：同一日期的同一事件平均被拆成几个事件，越接近 1 越好)
+    """
+    story_of = {
+        search["url"]: search["story"]
+        for paragraph in state_data["paragraphs"]
+        for search in paragraph["research"]["search_history"]
+    }
+    majority = total = 0
+    pieces: Dict[Tuple[str, int], int] = {}
+    for item in timeline:
+        for event in item["events"]:
+            counts = Counter(story_of[source["url"]] for source in event["sources"])
+            majority += max(counts.values(), default=0)
+            total += sum(counts.values())
+            for story in counts:
+                pieces[(item["date_key"], story)] = pieces.get((item["date_key"], story), 0) + 1
+    purity = majority / total if total else 1.0
+    fragmentation = sum(pieces.values()) / len(pieces) if pieces else 1.0
+    return purity, fragmentation
+
+
+def measure(size: int, repeat: int, seed: int) -> Dict[str, Any]:
+    """对一个数据规模分阶段计时（每次重复前清空缓存），并单独测量每个阶段的内存分配峰值"""
+    service = TimelineService()
+    state_data = generate_state_data(size, seed=seed)
+
+    timings: Dict[str, List[float]] = {}
+    for _ in range(repeat):
+        clear_caches()
+        steps = run_pipeline(service, state_data)
+        for name, step in steps:
+            start = time.perf_counter()
+            step()
+            timings.setdefault(name, []).append(time.perf_counter() - start)
+
+    # 统计未能解析日期的比例（归入“未知日期”）、事件数与事件聚合的质量
+    context: Dict[str, Any] = {}
+    clear_caches()
+    for _, step in run_pipeline(service, state_data, context):
+        step()
+    searches = context["processed"]
+    unknown_dates = sum(1 for s in searches if not s.get("normalized_date"))
+    events = sum(len(item["events"]) for item in context["timeline"])
+    purity, fragmentation = storyline_quality(state_data, context["timeline"])
+
+    allocations: Dict[str, int] = {}
+    clear_caches()
+    tracemalloc.start()
+    for name, step in run_pipeline(service, state_data):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        step()
+        _, peak = tracemalloc.get_traced_memory()
+        allocations[name] = peak - before
+    tracemalloc.stop()
+
+    phases = {
+        name: {
+            "median": statistics.median(values),
+            "min": min(values),
+            "peak_alloc_bytes": allocations[name],
+        }
+        for name, values in timings.items()
+    }
+    total = sum(phase["median"] for phase in phases.values())
+    return {
+        "size": size,
+        "repeat": repeat,
+        "total_median": total,
+        "unknown_date_ratio": round(unknown_dates / len(searches), 4),
+        "unique_sources": len(searches),
+        "events": events,
+        "storyline_purity": round(purity, 4),
+        "storyline_fragmentation": round(fragmentation, 4),
+        "phases": phases,
+    }
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """与基线比较，返回超出容差的阶段列表"""
+    regressions = []
+    baseline_by_size = {str(entry["size"]): entry for entry in baseline.get("results", [])}
+    for result in results:
+        base = baseline_by_size.get(str(result["size"]))
+        if not base:
+            continue
+        for name, phase in result["phases"].items():
+            base_phase = base["phases"].get(name)
+            if not base_phase:
+                continue
+            ratio = phase["median"] / base_phase["median"] if base_phase["median"] else 1.0
+            alloc_ratio = (phase["peak_alloc_bytes"] / base_phase["peak_alloc_bytes"]
+                           if base_phase["peak_alloc_bytes"] else 1.0)
+            marker = ""
+            if ratio > tolerance or alloc_ratio > tolerance:
+                marker = "  <-- 回归"
+                regressions.append(f"size={result['size']} {name}: 耗时 x{ratio:.2f}, 内存 x{alloc_ratio:.2f}")
+            print(f"  size={result['size']:<7} {name:<26} 耗时 x{ratio:5.2f}  内存 x{alloc_ratio:5.2f}{marker}")
+        # 总耗时包含基线中没有的阶段（如新增的去重），只输出供参考，不参与判定
+        if base.get("total_median"):
+            print(f"  size={result['size']:<7} {'（总计，仅供参考）':<22} 耗时 x{result['total_median'] / base['total_median']:5.2f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TimelineService 微基准测试")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="搜索结果数量（逗号分隔）")
+    parser.add_argument("--repeat", type=int, default=3, help="每个规模的重复次数（取中位数）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线文件路径")
+    parser.add_argument("--save-baseline", action="store_true", help="将本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=1.3, help="判定回归的倍数阈值")
+    parser.add_argument("--output", default=None, help="将本次结果写入 JSON 文件")
+    parser.add_argument("--min-purity", type=float, default=0.95,
+                        help="事件纯度下限，低于该值说明故事线把不同事件合并在了一起")
+    args = parser.parse_args()
+
+    # 基准测试时关闭服务日志，避免干扰计时
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    results = []
+    for size in [int(s) for s in args.sizes.split(",")]:
+        result = measure(size, args.repeat, args.seed)
+        results.append(result)
+        print(f"\n=== {size} 条搜索结果（总计 {result['total_median'] * 1000:.1f} ms，"
+              f"未知日期 {result['unknown_date_ratio']:.1%}，去重后 {result['unique_sources']} 篇 / "
+              f"{result['events']} 个事件，纯度 {result['storyline_purity']:.2%}，"
+              f"碎片度 {result['storyline_fragmentation']:.2f}）===")
+        for name, phase in result["phases"].items():
+            print(f"  {name:<26} 中位数 {phase['median'] * 1000:9.2f} ms   "
+                  f"峰值分配 {phase['peak_alloc_bytes'] / 1024:10.1f} KB")
+
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    # 事件纯度与基线无关，任何时候都检查；过度合并时不保存基线
+    impure = [
+        f"size={result['size']}: 事件纯度 {result['storyline_purity']:.2%}，低于 {args.min_purity:.0%}"
+        for result in results if result["storyline_purity"] < args.min_purity
+    ]
+    if impure and args.save_baseline:
+        print("\n故事线过度合并，未保存基线:")
+        for line in impure:
+            print(f"  {line}")
+        sys.exit(1)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已保存到: {args.baseline}")
+        return
+
+    regressions = list(impure)
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\n与基线比较（{args.baseline}，容差 x{args.tolerance}）:")
+        regressions += compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\n发现回归:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print("\n未发现回归")
+
+
+if __name__ == "__main__":
+    main()
@@ -62,6 +62,20 @@ class VerificationData:
     verdict: str  # 真/假/部分真实/无法确定
     summary: str
     timestamp: Optional[str] = None
+    ensemble: Optional[Dict] = None  # 多模型集成判别时各模型的结论与达成一致的模型
+    evidence: Optional[Dict] = None  # 报告经过证据压缩时压缩前后的 token 数等统计
+
+
+@dataclass
+class VerificationMatch:
+    """检索到的已有判别结果"""
+    query: str
+    verdict: str
+    summary: str
+    timestamp: Optional[str] = None
+    task_id: Optional[str] = None
+    score: Optional[float] = None  # 匹配度（命中的检索词占比）
+    exact: bool = False  # 查询内容是否完全相同
 
 
 # 时间线
@@ -92,6 +106,7 @@ class TimelineItem:
     date_key: str
     events: List[TimelineEvent]
     source_count: int
+    event_count: Optional[int] = None  # 该日期的事件总数（分页时 events 可能只是其中一部分）
 
 
 @dataclass
@@ -100,4 +115,7 @@ class TimelineData:
     timeline: List[TimelineItem]
     total_sources: int
     date_range: Optional[Dict] = None
+    total_events: Optional[int] = None  # 符合过滤条件的事件总数
+    has_more: bool = False  # 是否还有下一页
+    next_cursor: Optional[str] = None  # 获取下一页的游标
 
@@ -1,6 +1,7 @@
 """结果展示页面"""
 import streamlit as st
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from api.mock_api import MockAPI
 from api.api_client import api_client
 from components.sidebar import render_sidebar
@@ -89,6 +90,15 @@ def render_verdict_section(verification):
         st.caption(verification.summary)
 
 
+def load_verification(task_id):
+    """获取任务的判别结果：查询流水线已经完成判别时直接读取，没有结果时才请求判别（服务端按报告去重）"""
+    try:
+        return api_client.get_verification_by_task(task_id)
+    except Exception as e:
+        logger.info(f"任务暂无判别结果，发起判别: {str(e)}")
+        return api_client.create_verification(task_id=task_id)
+
+
 def render_report_tabs(report_text, current_query, generation_time=None):
     """渲染报告标签页"""
     
@@ -527,49 +537,61 @@ def main():
                 st.markdown('</div>', unsafe_allow_html=True)
             return
     
-    # 加载真假判别（如果报告已加载但判别还没加载）
-    if task_id and report_text and not verification:
-        try:
-            logger.info(f"开始判别: {task_id}")
-            verification = api_client.create_verification(task_id=task_id)
-            set_verification_data(verification)
-            logger.info("判别完成")
-            with verdict_placeholder.container():
-                render_verdict_section(verification)
-        except Exception as e:
-            logger.error(f"判别失败: {str(e)}")
-            with verdict_placeholder.container():
-                st.markdown('<div class="verdict-container">❌ 判别失败，请稍后重试</div>', unsafe_allow_html=True)
-            return
-
-    
-    # 加载时间线（如果判别已加载但时间线还没加载）
-    if task_id and verification and not timeline_data:
-        try:
-            logger.info(f"开始生成时间线: {task_id}")
-            timeline_data = api_client.create_timeline(task_id=task_id)
-            set_timeline_data(timeline_data)
-            logger.info("时间线生成完成")
-            with timeline_placeholder.container():
-                render_reference_section(timeline_data)
-        except Exception as e:
-            logger.error(f"生成时间线失败: {str(e)}")
-            with timeline_placeholder.container():
-                st.markdown('<div class="timeline-container">❌ 时间线生成失败，请稍后重试</div>', unsafe_allow_html=True)
-    
-    # 加载 Mermaid Timeline（如果报告已加载但 Mermaid Timeline 还没加载）
-    if task_id and report_text and not mermaid_timeline_data:
-        try:
-            logger.info(f"开始生成 Mermaid Timeline: {task_id}")
-            mermaid_timeline_data = api_client.create_mermaid_timeline(task_id=task_id)
-            set_mermaid_timeline_data(mermaid_timeline_data)
-            logger.info("Mermaid Timeline 生成完成")
-            with mermaid_placeholder.container():
-                render_timeline_mermaid(mermaid_timeline_data)
-        except Exception as e:
-            logger.error(f"生成 Mermaid Timeline 失败: {str(e)}")
-            with mermaid_placeholder.container():
-                st.error(f"❌ Mermaid Timeline 生成失败: {str(e)}")
+    # 报告就绪后并发加载真假判别、时间线与 Mermaid Timeline（时间线只依赖任务的状态数据，不必等待判别）
+    # 请求在线程池中执行，页面只在脚本线程中更新：哪个模块的数据先到达就先更新哪个容器
+    if task_id and report_text:
+        loaders = {}
+        if not verification:
+            loaders["verification"] = lambda: load_verification(task_id)
+        if not timeline_data:
+            loaders["timeline"] = lambda: api_client.create_timeline(task_id=task_id)
+        if not mermaid_timeline_data:
+            loaders["mermaid"] = lambda: api_client.create_mermaid_timeline(task_id=task_id)
+        
+        if loaders:
+            logger.info(f"开始并发加载: {', '.join(loaders)} ({task_id})")
+            start_time = time.time()
+            with ThreadPoolExecutor(max_workers=len(loaders)) as executor:
+                futures = {executor.submit(loader): stage for stage, loader in loaders.items()}
+                for future in as_completed(futures):
+                    stage = futures[future]
+                    elapsed = time.time() - start_time
+                    
+                    if stage == "verification":
+                        try:
+                            verification = future.result()
+                            set_verification_data(verification)
+                            logger.info(f"判别完成，耗时: {elapsed:.2f}秒")
+                            with verdict_placeholder.container():
+                                render_verdict_section(verification)
+                        except Exception as e:
+                            logger.error(f"判别失败: {str(e)}")
+                            with verdict_placeholder.container():
+                                st.markdown('<div class="verdict-container">❌ 判别失败，请稍后重试</div>', unsafe_allow_html=True)
+                    
+                    elif stage == "timeline":
+                        try:
+                            timeline_data = future.result()
+                            set_timeline_data(timeline_data)
+                            logger.info(f"时间线生成完成，耗时: {elapsed:.2f}秒")
+                            with timeline_placeholder.container():
+                                render_reference_section(timeline_data)
+                        except Exception as e:
+                            logger.error(f"生成时间线失败: {str(e)}")
+                            with timeline_placeholder.container():
+                                st.markdown('<div class="timeline-container">❌ 时间线生成失败，请稍后重试</div>', unsafe_allow_html=True)
+                    
+                    else:
+                        try:
+                            mermaid_timeline_data = future.result()
+                            set_mermaid_timeline_data(mermaid_timeline_data)
+                            logger.info(f"Mermaid Timeline 生成完成，耗时: {elapsed:.2f}秒")
+                            with mermaid_placeholder.container():
+                                render_timeline_mermaid(mermaid_timeline_data)
+                        except Exception as e:
+                            logger.error(f"生成 Mermaid Timeline 失败: {str(e)}")
+                            with mermaid_placeholder.container():
+                                st.error(f"❌ Mermaid Timeline 生成失败: {str(e)}")
 
 
 if __name__ == "__main__":